@@ -1,155 +1,558 @@
-from flask import Flask, request, jsonify, send_from_directory
+import logging
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+from flask import Blueprint, Flask, Response, abort, current_app, request, jsonify, redirect, send_file, send_from_directory, g, stream_with_context, url_for
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from werkzeug.local import LocalProxy
 import os
 import uuid
 import json
-from werkzeug.utils import secure_filename
+import mimetypes
+import re
+from itertools import islice
+from urllib.parse import urljoin
 from dotenv import load_dotenv
 
-# Import LangChain components
-from langchain_openai import OpenAI
-# from langchain_community.llms import OllamaLLM
-# from langchain.chains import ConversationChain # Deprecated
-from langchain.memory import ConversationBufferMemory
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.messages import HumanMessage, AIMessage
+from app_state import AppState
+from blob_store import is_blob_name
+import image_variants
+from llm_gateway import LLMUnavailable
+from local_recommender import recommend as local_recommendation
+from menu_cache import content_etag
+from itsdangerous import BadSignature
+from menu_import import ASSET_FILE_COLUMNS, MenuImportError, ModelArchive, chunked, parse_rows, rows_from_json, upload_limits
+from metrics import LLM_FALLBACKS
+from observability import init_observability, observe_llm_call
+from response_cache import normalize_question
+from single_flight import FlightAbandoned
+from storage_backends import IMMUTABLE_CACHE_CONTROL, TENANTS_DIR, UploadNotFound, UploadTooLarge, is_upload_id
+from tenants import TenantIdConverter, UnknownTenant
+from uploads import GLB_MAGIC, MODEL_EXTENSIONS, StreamingUploadRequest, file_extension, upload_stats
+
+# Firebase, LangChain and OpenAI are imported lazily by services.py, on first
+# use or by the background warm-up, so importing this module stays fast.
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-
-# Initialize Firebase
-try:
-    # Print the current working directory and check if the file exists
-    print(f"Current working directory: {os.getcwd()}")
-    key_path = 'serviceAccountKey.json'
-    print(f"Looking for service account key at: {os.path.abspath(key_path)}")
-    print(f"File exists: {os.path.exists(key_path)}")
-    
-    # Read and print the first few characters of the key file (safely)
-    if os.path.exists(key_path):
-        with open(key_path, 'r') as f:
-            key_content = f.read()
-            print(f"Key file starts with: {key_content[:50]}...")
-    
-    # Initialize Firebase with your service account key file
-    cred = credentials.Certificate(key_path)
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': 'ar-food-menu.appspot.com'
-    })
-    
-    # Get Firestore and Storage clients
-    db = firestore.client()
-    bucket = storage.bucket()
-    
-    print("Firebase initialized successfully")
-except Exception as e:
-    print(f"Error initializing Firebase: {str(e)}")
-    print(f"Error type: {type(e)}")
-    import traceback
-    print(f"Full traceback: {traceback.format_exc()}")
-    # For demo purposes, we'll continue even if Firebase initialization fails
-    db = None
-    bucket = None
-
-# Configure OpenAI API key
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    print("Error: OPENAI_API_KEY environment variable not set.")
-    # Depending on requirements, you might want to raise an error or disable AI features
-
-# Initialize LangChain LLM
-llm = None
-if openai_api_key:
-    llm = OpenAI(openai_api_key=openai_api_key, temperature=0.7)
-    print("OpenAI LLM initialized.")
-else:
-    print("OpenAI API key not set. LLM will not be initialized.")
-
-# Define a prompt template
-template = """You are an AI food recommender chatbot for a restaurant.
-Your goal is to help the customer choose a food item from the provided menu.
-You should be friendly, engaging, and helpful.
-
-Current conversation:
-{history}
-Customer: {input}
-AI:
-"""
-PROMPT = PromptTemplate(input_variables=["history", "input"], template=template)
-
-# In-memory storage for conversation history (for demonstration purposes)
-# In a real application, you might use a database or other persistent storage
-store = {}
-
-def get_session_history(session_id: str) -> ConversationBufferMemory:
-    if session_id not in store:
-        store[session_id] = ConversationBufferMemory()
-    return store[session_id]
-
-# Create the runnable chain
-conversation_chain = None # Initialize as None
-if llm:
-    # Define the core runnable (prompt + llm)
-    runnable = PROMPT | llm
-
-    # Wrap the runnable with message history capability
-    conversation_chain = RunnableWithMessageHistory(
-        runnable,
-        get_session_history,
-        input_messages_key="input",
-        history_messages_key="history",
-    )
-    print("RunnableWithMessageHistory initialized.")
-else:
-     print("RunnableWithMessageHistory not initialized due to missing LLM.")
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger(__name__)
+
+def default_config():
+    # App settings from the environment; create_app(config) can override any of them
+    model_mb = int(os.getenv('MAX_MODEL_UPLOAD_MB', '50'))
+    image_mb = int(os.getenv('MAX_IMAGE_UPLOAD_MB', '10'))
+    import_mb = int(os.getenv('MAX_IMPORT_UPLOAD_MB', '500'))
+    return {
+        'FIREBASE_KEY_PATH': os.getenv('FIREBASE_KEY_PATH', 'serviceAccountKey.json'),
+        'FIREBASE_STORAGE_BUCKET': os.getenv('FIREBASE_STORAGE_BUCKET', 'ar-food-menu.appspot.com'),
+        'FIRESTORE_CLIENT': None,  # injected client (e.g. fakes.FakeFirestore) instead of Firebase
+        'FIRESTORE_MIRROR': os.getenv('FIRESTORE_MIRROR', '1') != '0',
+        'LLM_PROVIDER': os.getenv('LLM_PROVIDER', 'openai'),
+        'LLM': None,  # injected LangChain LLM instead of LLM_PROVIDER
+        'WARM_ON_START': os.getenv('WARM_ON_START', '1') != '0',
+        'STARTUP_BUDGET_MS': float(os.getenv('STARTUP_BUDGET_MS', '1000')),
+        'UPLOAD_FOLDER': os.path.join(BACKEND_DIR, 'uploads'),
+        # The reference-count index lives outside UPLOAD_FOLDER so it is never served
+        'BLOB_INDEX_PATH': os.getenv('BLOB_INDEX_PATH', os.path.join(BACKEND_DIR, 'blob_index.sqlite3')),
+        'ASSET_WORKERS': int(os.getenv('ASSET_WORKERS', '2')),
+        # Uploads no menu item references after this long are deleted (0 keeps them)
+        'UPLOAD_ORPHAN_GRACE_SECONDS': float(os.getenv('UPLOAD_ORPHAN_GRACE_SECONDS', '86400')),
+        # Where uploads are published: 'local' (served by this app) or 'bucket' (the Firebase
+        # Storage bucket). ASSET_BASE_URL replaces the origin in asset URLs, e.g. with a CDN.
+        'STORAGE_BACKEND': os.getenv('STORAGE_BACKEND', 'local'),
+        'BUCKET': None,  # injected bucket (e.g. fakes.FakeBucket) instead of Firebase Storage
+        'ASSET_BASE_URL': os.getenv('ASSET_BASE_URL') or None,
+        'UPLOAD_URL_EXPIRY': int(os.getenv('UPLOAD_URL_EXPIRY', '900')),
+        # Signs direct-upload URLs of the local backend; set it when running several workers
+        'UPLOAD_SIGNING_KEY': os.getenv('UPLOAD_SIGNING_KEY') or os.urandom(32).hex(),
+        # Resized copies of item photos made after upload (formats Pillow can't write are skipped);
+        # other widths up to IMAGE_MAX_WIDTH are rendered on first request
+        'IMAGE_WIDTHS': tuple(int(width) for width in os.getenv('IMAGE_WIDTHS', '320,640,1280').split(',') if width.strip()),
+        'IMAGE_FORMATS': tuple(fmt.strip() for fmt in os.getenv('IMAGE_FORMATS', 'avif,webp,jpeg').split(',') if fmt.strip()),
+        'IMAGE_MAX_WIDTH': int(os.getenv('IMAGE_MAX_WIDTH', '2048')),
+        'UPLOAD_CONCURRENCY': int(os.getenv('UPLOAD_CONCURRENCY', '4')),
+        # Per-type upload limits. A request may carry one model and one image, so the
+        # overall cap (checked against Content-Length before reading the body) is their
+        # sum, or the import limit if that is larger.
+        'MAX_MODEL_UPLOAD_BYTES': model_mb * 1024 * 1024,
+        'MAX_IMAGE_UPLOAD_BYTES': image_mb * 1024 * 1024,
+        'MAX_IMPORT_UPLOAD_BYTES': import_mb * 1024 * 1024,
+        'MAX_CONTENT_LENGTH': (max(model_mb + image_mb, import_mb) + 1) * 1024 * 1024,
+        'MENU_CACHE_TTL': float(os.getenv('MENU_CACHE_TTL', '300')),
+        'MENU_CHANGE_LOG_SIZE': int(os.getenv('MENU_CHANGE_LOG_SIZE', '1000')),
+        # Shared by every worker process, so any of them can answer /api/menu/changes
+        'MENU_CHANGES_DB_PATH': os.getenv('MENU_CHANGES_DB_PATH', os.path.join(BACKEND_DIR, 'menu_changes.sqlite3')),
+        # Rough cap on the menu section of the recommendation prompt (~4 characters
+        # per token). 0 means the whole menu is always included.
+        'MENU_CONTEXT_MAX_TOKENS': int(os.getenv('MENU_CONTEXT_MAX_TOKENS', '0')),
+        # Large menus are too big to paste into every prompt. Above MENU_RETRIEVAL_MIN_ITEMS
+        # items, only the MENU_RETRIEVAL_TOP_K items most relevant to the conversation are sent.
+        # MENU_RETRIEVER picks a keyword (bm25) or embedding index; MENU_EMBEDDER plugs in a
+        # local embedding model as 'module:factory' (the default hashing embedder needs no model).
+        'MENU_RETRIEVAL_MIN_ITEMS': int(os.getenv('MENU_RETRIEVAL_MIN_ITEMS', '40')),
+        'MENU_RETRIEVAL_TOP_K': int(os.getenv('MENU_RETRIEVAL_TOP_K', '15')),
+        'MENU_RETRIEVER': os.getenv('MENU_RETRIEVER', 'bm25'),
+        'MENU_EMBEDDER': os.getenv('MENU_EMBEDDER', 'hashing'),
+        # Cache-Control for the menu/category reads. The default lets browsers and CDN
+        # edges keep a copy but makes them revalidate it, which is cheap thanks to ETags.
+        'READ_CACHE_CONTROL': os.getenv('READ_CACHE_CONTROL', 'public, no-cache'),
+        'RESPONSE_CACHE_MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '500')),
+        'RESPONSE_CACHE_TTL': float(os.getenv('RESPONSE_CACHE_TTL', '600')),
+        'RESPONSE_CACHE_SIMILARITY': float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0')),
+        'SESSION_MAX_SESSIONS': int(os.getenv('SESSION_MAX_SESSIONS', '1000')),
+        'SESSION_TTL_SECONDS': float(os.getenv('SESSION_TTL_SECONDS', '3600')),
+        'SESSION_HISTORY_MAX_TOKENS': int(os.getenv('SESSION_HISTORY_MAX_TOKENS', '1000')),
+        'SESSION_DB_PATH': os.getenv('SESSION_DB_PATH') or None,
+        'LOG_FORMAT': os.getenv('LOG_FORMAT', 'json'),
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
+        # Requests slower than this dump cProfile stats to PROFILE_DIR (0 = profiling off)
+        'PROFILE_SLOW_REQUESTS_MS': float(os.getenv('PROFILE_SLOW_REQUESTS_MS', '0')),
+        'PROFILE_DIR': os.getenv('PROFILE_DIR', os.path.join(BACKEND_DIR, 'profiles')),
+        # Concurrent identical Firestore loads and opening-question LLM calls share one call
+        'SINGLE_FLIGHT': os.getenv('SINGLE_FLIGHT', '1') != '0',
+        'SINGLE_FLIGHT_TIMEOUT': float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '60')),
+        # LLM gateway: concurrent calls, callers waiting for one (and for how long),
+        # per-call timeout, and the circuit breaker's failure count and cool-down
+        'LLM_MAX_CONCURRENCY': int(os.getenv('LLM_MAX_CONCURRENCY', '4')),
+        'LLM_MAX_QUEUE': int(os.getenv('LLM_MAX_QUEUE', '16')),
+        'LLM_QUEUE_TIMEOUT': float(os.getenv('LLM_QUEUE_TIMEOUT', '2')),
+        'LLM_TIMEOUT': float(os.getenv('LLM_TIMEOUT', '30')),
+        'LLM_BREAKER_FAILURES': int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+        'LLM_BREAKER_RESET_SECONDS': float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30')),
+        # ASGI mode (asgi.py): LLM calls in flight and waiting on the event loop, and
+        # threads running the routes still served by Flask there
+        'ASYNC_LLM_MAX_CONCURRENCY': int(os.getenv('ASYNC_LLM_MAX_CONCURRENCY', '256')),
+        'ASYNC_LLM_MAX_QUEUE': int(os.getenv('ASYNC_LLM_MAX_QUEUE', '2048')),
+        'ASGI_WSGI_WORKERS': int(os.getenv('ASGI_WSGI_WORKERS', '32')),
+        # Restaurants served under /api/<id>/...: their collections live under
+        # TENANT_COLLECTION/<id>/, TENANTS optionally lists the ids allowed, and idle
+        # ones are evicted past TENANT_MAX_ACTIVE or the cache memory budget
+        'TENANT_COLLECTION': os.getenv('TENANT_COLLECTION', 'restaurants'),
+        'TENANTS': tuple(tenant.strip() for tenant in os.getenv('TENANTS', '').split(',') if tenant.strip()),
+        'TENANT_MAX_ACTIVE': int(os.getenv('TENANT_MAX_ACTIVE', '100')),
+        'TENANT_MEMORY_BUDGET_BYTES': int(float(os.getenv('TENANT_MEMORY_BUDGET_MB', '0')) * 1024 * 1024),
+        'TENANT_MIN_IDLE_SECONDS': float(os.getenv('TENANT_MIN_IDLE_SECONDS', '60')),
+    }
+
+api = Blueprint('api', __name__)
+
+def state():
+    return current_app.extensions['menuart']
+
+def tenant():
+    # The restaurant this request is for; the default one on untenanted routes
+    if 'tenant_state' not in g:
+        g.tenant_state = state().tenant(g.get('tenant_id'))
+    return g.tenant_state
+
+# Request-scoped views of the app's state, so handlers read like plain globals
+db = LocalProxy(lambda: tenant().db)
+conversation_chain = LocalProxy(lambda: state().conversation_chain)
+session_store = LocalProxy(lambda: tenant().session_store)
+menu_cache = LocalProxy(lambda: tenant().menu_cache)
+menu_changes = LocalProxy(lambda: tenant().menu_changes)
+menu_index = LocalProxy(lambda: tenant().menu_index)
+menu_search = LocalProxy(lambda: tenant().menu_search)
+response_cache = LocalProxy(lambda: tenant().response_cache)
+mirrors = LocalProxy(lambda: tenant().mirrors)
+blob_store = LocalProxy(lambda: tenant().blob_store)
+storage = LocalProxy(lambda: tenant().storage)
+asset_pipeline = LocalProxy(lambda: tenant().asset_pipeline)
+upload_slots = LocalProxy(lambda: state().upload_slots)
+firestore_flights = LocalProxy(lambda: tenant().firestore_flights)
+llm_flights = LocalProxy(lambda: tenant().llm_flights)
+llm_gateway = LocalProxy(lambda: state().llm_gateway)
+
+def get_session_history(session_id: str):
+    return session_store.get(session_id)
+
+def tenant_rule(rule):
+    # /api/menu -> /api/<restaurant_id>/menu, /uploads/<f> -> /uploads/tenants/<restaurant_id>/<f>
+    if rule.startswith('/api/'):
+        return '/api/<tenant:restaurant_id>/' + rule[len('/api/'):]
+    return f"/uploads/{TENANTS_DIR}/<tenant:restaurant_id>/" + rule[len('/uploads/'):]
+
+def tenant_route(rule, **options):
+    # Serve a route for the default restaurant and, under the same endpoint, for every tenant
+    def decorator(view):
+        api.add_url_rule(rule, view_func=view, **options)
+        api.add_url_rule(tenant_rule(rule), view_func=view, **options)
+        return view
+    return decorator
+
+@api.url_value_preprocessor
+def pull_tenant(endpoint, values):
+    g.tenant_id = (values or {}).pop('restaurant_id', None)
+
+@api.before_app_request
+def check_tenant():
+    # A hook rather than part of pull_tenant, so the 404 gets a request ID and is
+    # logged like any other response; runs before uploads are read
+    tenant_id = g.get('tenant_id')
+    if not tenant_id:
+        return
+    allowed = current_app.config['TENANTS']
+    if allowed and tenant_id not in allowed:
+        abort(404)
+    try:
+        g.tenant_state = state().tenant(tenant_id)
+    except UnknownTenant:
+        abort(404)
+
+@api.url_defaults
+def add_tenant(endpoint, values):
+    # url_for() inside a tenant's request links to that tenant's routes
+    tenant_id = g.get('tenant_id')
+    if tenant_id and 'restaurant_id' not in values and current_app.url_map.is_endpoint_expecting(endpoint, 'restaurant_id'):
+        values['restaurant_id'] = tenant_id
+
+def in_tenant_context(fn):
+    # Wrap a callback that runs later on a worker thread, outside any request, so
+    # it still reads and writes the current request's restaurant
+    app = current_app._get_current_object()
+    tenant_id = g.get('tenant_id')
+
+    def run(*args):
+        with app.app_context():
+            g.tenant_id = tenant_id
+            return fn(*args)
+
+    return run
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
 
-# Create uploads directory if it doesn't exist
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER # Add UPLOAD_FOLDER to app.config
+def resolve_session_id(data):
+    # Clients keep the id we hand out and send it back with every message
+    session_id = data.get('sessionId') or request.headers.get('X-Session-Id')
+    if session_id and SESSION_ID_RE.match(session_id):
+        return session_id
+    return uuid.uuid4().hex
+
+# Menu item fields that may reference stored blobs (a URL or a map of URLs)
+ASSET_URL_FIELDS = ('modelUrl', 'imageUrl', 'modelLods')
+
+# Fields the asset pipeline derives from uploads; never accepted from the client
+DERIVED_ASSET_FIELDS = ('modelLods', 'imageSrcset')
 
 # Configure allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'glb', 'gltf'}
 
+@api.before_app_request
+def stream_uploads():
+    if request.mimetype != 'multipart/form-data' and request.endpoint != 'api.direct_upload':
+        return None
+    if not upload_slots.acquire(blocking=False):
+        response = jsonify({"error": "Too many uploads in progress. Please retry shortly."})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    g.upload_slot = True
+    # Parse the body here so size/type rejections surface as 413/415 responses
+    # instead of being swallowed by the handlers' generic error handling.
+    request.files
+
+@api.teardown_app_request
+def release_upload_slot(exc):
+    if g.pop('upload_slot', False):
+        upload_slots.release()
+
+@api.app_errorhandler(413)
+@api.app_errorhandler(415)
+def upload_rejected(e):
+    return jsonify({"error": e.description}), e.code
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/')
+def conditional_json(payload, etag=None):
+    # Answer If-None-Match with a 304 so repeat visitors skip the body entirely
+    response = current_app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag or content_etag(payload))
+    response.headers['Cache-Control'] = current_app.config['READ_CACHE_CONTROL']
+    return response.make_conditional(request)
+
+def load_menu_items():
+    menu_ref = db.collection('menu')
+    docs = menu_ref.stream()
+    # The snapshot is keyed by `id`; documents created in the console may lack the field
+    return [{'id': doc.id, **doc.to_dict()} for doc in docs]
+
+def collection_documents(name):
+    # Served from the mirror when it is live, read from Firestore otherwise
+    mirror = mirrors.get(name)
+    docs = mirror.documents() if mirror else None
+    if docs is None:
+        # Concurrent reads of the same collection share one stream
+        docs, _ = firestore_flights.do(('collection', name), lambda: [{'id': doc.id, **doc.to_dict()} for doc in db.collection(name).stream()])
+    return docs
+
+def category_names():
+    # Assuming categories are stored as documents with a 'name' field
+    return [cat.get('name') for cat in collection_documents('categories') if cat.get('name')]
+
+def subcategory_tree():
+    # Subcategory names by category. The admin endpoints keep one document per
+    # category (named after it) with a `names` array; older data has one
+    # document per subcategory with 'category' and 'name' fields.
+    tree = {}
+    for doc in collection_documents('subcategories'):
+        if doc.get('category') and doc.get('name'):
+            tree.setdefault(doc['category'], []).append(doc['name'])
+        else:
+            tree.setdefault(doc.get('id'), []).extend(doc.get('names') or [])
+    return tree
+
+def get_menu_item(item_id):
+    item = menu_cache.get_item(item_id)
+    if item is None:
+        doc = db.collection('menu').document(item_id).get()
+        item = {'id': doc.id, **doc.to_dict()} if doc.exists else None
+    return item
+
+def asset_url(blob_name):
+    # Where clients download the blob: this app, the bucket, or ASSET_BASE_URL (a CDN)
+    return storage.url(blob_name)
+
+def asset_blobs(item):
+    if not item:
+        return set()
+    urls = []
+    for field in ASSET_URL_FIELDS:
+        value = item.get(field)
+        urls.extend(value.values() if isinstance(value, dict) else [value])
+    names = (blob_store.name_from_url(url) for url in urls)
+    return {name for name in names if name}
+
+def sync_asset_refs(old_item, new_item):
+    # Take references for newly attached blobs before dropping the old ones,
+    # so a blob shared by both versions is never deleted in between.
+    old_blobs, new_blobs = asset_blobs(old_item), asset_blobs(new_item)
+    for name in new_blobs - old_blobs:
+        blob_store.retain(name)
+    for name in old_blobs - new_blobs:
+        blob_store.release(name)
+
+def schedule_model_lods(item_id, old_item, new_item):
+    # Only (re)build LODs when the item points at a different GLB blob than before
+    model_blob = blob_store.name_from_url(new_item.get('modelUrl'))
+    old_model_blob = blob_store.name_from_url((old_item or {}).get('modelUrl'))
+    if model_blob and model_blob != old_model_blob and model_blob.endswith('.glb'):
+        # Runs on a pipeline worker, outside any request
+        on_done = in_tenant_context(lambda source, lods: record_model_lods(item_id, source, lods))
+        asset_pipeline.submit_model_lods(model_blob, on_done)
+
+def image_variant_url(blob_name, width, fmt):
+    return f"{asset_url(blob_name)}/{width}.{fmt}"
+
+def schedule_image_variants(item_id, old_item, new_item):
+    # Like schedule_model_lods, for a newly attached photo
+    image_blob = blob_store.name_from_url(new_item.get('imageUrl'))
+    old_image_blob = blob_store.name_from_url((old_item or {}).get('imageUrl'))
+    formats = image_variants.available_formats(current_app.config['IMAGE_FORMATS'])
+    widths = current_app.config['IMAGE_WIDTHS']
+    if image_blob and image_blob != old_image_blob and file_extension(image_blob) in image_variants.SOURCE_EXTENSIONS and formats and widths:
+        on_done = in_tenant_context(lambda source, rendered: record_image_variants(item_id, source, rendered, formats))
+        asset_pipeline.submit_image_variants(image_blob, widths, formats, on_done)
+
+def record_image_variants(item_id, source_blob, widths, formats):
+    # Variants are cached files derived from the image blob (and deleted with it),
+    # so only their URLs need recording. Each format maps to a srcset string.
+    item = get_menu_item(item_id)
+    if not item or blob_store.name_from_url(item.get('imageUrl')) != source_blob:
+        return
+    srcset = {
+        fmt: ', '.join(f"{image_variant_url(source_blob, width, fmt)} {width}w" for width in widths)
+        for fmt in formats
+    }
+    db.collection('menu').document(item_id).update({'imageSrcset': srcset})
+    menu_cache.merge(item_id, {'imageSrcset': srcset})
+
+def record_model_lods(item_id, source_blob, lods):
+    # Runs on an asset pipeline worker once the LOD variants are stored
+    item = get_menu_item(item_id)
+    if not item or blob_store.name_from_url(item.get('modelUrl')) != source_blob:
+        # The item was deleted or got a different model while we were working
+        for name in lods.values():
+            blob_store.discard(name)
+        return
+    lod_urls = {level: asset_url(name) for level, name in lods.items()}
+    db.collection('menu').document(item_id).update({'modelLods': lod_urls})
+    menu_cache.merge(item_id, {'modelLods': lod_urls})
+    sync_asset_refs(item, {**item, 'modelLods': lod_urls})
+
+@api.route('/')
 def index():
     return jsonify({"message": "AR Food Menu API is running"})
 
-@app.route('/api/menu', methods=['GET'])
+@tenant_route('/api/menu', methods=['GET'])
 def get_menu():
     try:
         if db:
-            # Get all menu items from Firestore
-            menu_ref = db.collection('menu')
-            docs = menu_ref.stream()
-            menu_items = [doc.to_dict() for doc in docs]
-            return jsonify(menu_items)
+            # Serve the cached snapshot; Firestore is only read on a cold or expired cache.
+            # The revision is read first so it never claims changes the payload lacks.
+            revision = menu_changes.revision
+            payload, etag = menu_cache.get_payload(load_menu_items)
+            response = conditional_json(payload, etag)
+            response.headers['X-Menu-Epoch'] = menu_changes.epoch
+            response.headers['X-Menu-Revision'] = str(revision)
+            return response
         else:
             # Fallback to local storage if Firebase is not available
-            print("Firebase not available for fetching menu items. Returning empty array.")
+            logger.warning("Firebase not available for fetching menu items. Returning empty array.")
             return jsonify([]) # Return an empty array when db is not available
     except Exception as e:
-        print(f"Error fetching menu items: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+        logger.exception("Error fetching menu items")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/menu', methods=['POST'])
+@tenant_route('/api/menu/changes', methods=['GET'])
+def get_menu_changes():
+    # Items changed since the client's revision (from the X-Menu-Revision header or a
+    # previous call), or {"resync": true} when it has to fetch the full menu again
+    try:
+        since = request.args.get('since', type=int)
+        if since is None:
+            return jsonify({"error": "A numeric 'since' revision is required."}), 400
+        if not db or not menu_cache.enabled:
+            return jsonify({"epoch": menu_changes.epoch, "revision": menu_changes.revision, "resync": True})
+        # Make sure the log has caught up with an expired snapshot first
+        menu_cache.get_payload(load_menu_items)
+        return jsonify(menu_changes.changes_since(since, request.args.get('epoch')))
+    except Exception as e:
+        logger.exception("Error fetching menu changes")
+        return jsonify({"error": str(e)}), 500
+
+# Largest result page /api/menu/search will return
+SEARCH_MAX_LIMIT = 100
+
+@tenant_route('/api/menu/search', methods=['GET'])
+def search_menu():
+    # Query parameters:
+    #   q=chiken burg               words match exactly, with one typo, or (the last one) as a prefix
+    #   q=pizza price<15            price filters may be written into the query...
+    #   minPrice=5&maxPrice=15      ...or passed separately (inclusive)
+    #   category=Mains&subcategory=Burgers, limit=20 (up to 100)
+    try:
+        if not db:
+            logger.warning("Firebase not available for menu search. Returning no results.")
+            return jsonify({"items": [], "total": 0})
+        price_filters = []
+        for name, op in (('minPrice', '>='), ('maxPrice', '<=')):
+            value = request.args.get(name, type=float)
+            if value is not None:
+                price_filters.append((op, value))
+        limit = min(max(request.args.get('limit', 20, type=int), 1), SEARCH_MAX_LIMIT)
+
+        menu_items = menu_cache.get_items(load_menu_items)
+        if not menu_search.ready:
+            # Only happens with the snapshot cache disabled
+            menu_search.reset(menu_items)
+        items, total = menu_search.search(
+            request.args.get('q', ''),
+            limit=limit,
+            category=request.args.get('category'),
+            subcategory=request.args.get('subcategory'),
+            price_filters=price_filters,
+        )
+        return jsonify({"items": items, "total": total})
+    except Exception as e:
+        logger.exception("Error searching menu items")
+        return jsonify({"error": str(e)}), 500
+
+# Largest page /api/bootstrap will return when a limit is given
+BOOTSTRAP_MAX_PAGE_SIZE = 500
+
+def project_item(item, fields):
+    if not fields:
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+def menu_page(category, subcategory, fields, cursor, limit):
+    # Returns (items, next cursor) in id order, filtered and projected
+    if menu_cache.enabled:
+        # Served from the snapshot; the id-ordered list is built once per menu version
+        items = menu_cache.get_derived(
+            'items_by_id', lambda items: sorted(items, key=lambda item: str(item.get('id'))), load_menu_items
+        )
+        matches = (
+            item for item in items
+            if (not category or item.get('category') == category)
+            and (not subcategory or item.get('subcategory') == subcategory)
+            and (cursor is None or str(item.get('id')) > cursor)
+        )
+        page = list(islice(matches, limit + 1)) if limit else list(matches)
+    else:
+        # No snapshot to page through, so let Firestore filter, order and project
+        from firebase_admin import firestore
+        query = db.collection('menu')
+        if category:
+            query = query.where(filter=firestore.FieldFilter('category', '==', category))
+        if subcategory:
+            query = query.where(filter=firestore.FieldFilter('subcategory', '==', subcategory))
+        query = query.order_by('__name__')
+        if cursor is not None:
+            query = query.start_after({'__name__': cursor})
+        if fields:
+            query = query.select(fields)
+        if limit:
+            query = query.limit(limit + 1)
+        page = [{'id': doc.id, **doc.to_dict()} for doc in query.stream()]
+    next_cursor = None
+    if limit and len(page) > limit:
+        page = page[:limit]
+        next_cursor = str(page[-1].get('id'))
+    return [project_item(item, fields) for item in page], next_cursor
+
+@tenant_route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    # Menu items, categories and the subcategory tree in one response. Optional:
+    #   fields=id,name,price        only these item fields (id is always included)
+    #   category=..., subcategory=  only matching items
+    #   limit=N, cursor=...         page through items; pass back `nextCursor`
+    # Categories, subcategories and the sync revision come with the first page only.
+    try:
+        if not db:
+            logger.warning("Firebase not available for bootstrap. Returning empty menu.")
+            return jsonify({"items": [], "nextCursor": None, "categories": [], "subcategories": {}})
+
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        if fields and 'id' not in fields:
+            fields.insert(0, 'id')
+        limit = request.args.get('limit', type=int)
+        if limit is not None and not 0 < limit <= BOOTSTRAP_MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {BOOTSTRAP_MAX_PAGE_SIZE}."}), 400
+        cursor = request.args.get('cursor') or None
+
+        revision = menu_changes.revision
+        items, next_cursor = menu_page(
+            request.args.get('category'), request.args.get('subcategory'), fields, cursor, limit
+        )
+        payload = {"items": items, "nextCursor": next_cursor}
+        if cursor is None:
+            payload.update({
+                "categories": category_names(),
+                "subcategories": subcategory_tree(),
+                "epoch": menu_changes.epoch,
+                "revision": revision,
+            })
+        return conditional_json(jsonify(payload).get_data())
+    except Exception:
+        logger.exception("Error fetching bootstrap data")
+        return jsonify({"error": "An error occurred while fetching the menu."}), 500
+
+@tenant_route('/api/menu', methods=['POST'])
 def add_menu_item():
     try:
         # Get form data
         data = request.form.to_dict()
         
+        for field in DERIVED_ASSET_FIELDS:
+            data.pop(field, None)
+        
         # Generate a unique ID if not provided
+        replaces_existing = bool(data.get('id'))
         if 'id' not in data or not data['id']:
             data['id'] = str(uuid.uuid4())
         
@@ -159,41 +562,57 @@ def add_menu_item():
         
         # Process model file
         if model_file and allowed_file(model_file.filename):
-            model_filename = secure_filename(f"{data['id']}_{model_file.filename}")
-            model_path = os.path.join(UPLOAD_FOLDER, model_filename)
-            model_file.save(model_path)
-            # Use local URL for the model file, including backend origin
-            data['modelUrl'] = f"http://localhost:5000/uploads/{model_filename}"
+            model_filename = blob_store.put(model_file)
+            data['modelUrl'] = asset_url(model_filename)
         
         # Process image file (if provided)
         if image_file and allowed_file(image_file.filename):
-            image_filename = secure_filename(f"{data['id']}_{image_file.filename}")
-            image_path = os.path.join(UPLOAD_FOLDER, image_filename)
-            image_file.save(image_path)
-            # Use local URL for the image file, including backend origin
-            data['imageUrl'] = f"http://localhost:5000/uploads/{image_filename}"
+            image_filename = blob_store.put(image_file)
+            data['imageUrl'] = asset_url(image_filename)
         
         # Save to Firestore if available, otherwise log a message (local storage handled by frontend fallback)
         if db:
+            # A client-supplied id may overwrite an existing item and its asset references
+            old_item = get_menu_item(data['id']) if replaces_existing else None
             menu_ref = db.collection('menu').document(data['id'])
             menu_ref.set(data)
+            menu_cache.upsert(data)
+            sync_asset_refs(old_item, data)
+            schedule_model_lods(data['id'], old_item, data)
+            schedule_image_variants(data['id'], old_item, data)
         else:
-            print("Firebase not initialized. Item will not be saved to Firestore.")
+            logger.warning("Firebase not initialized. Item will not be saved to Firestore.")
             # Frontend should handle local storage fallback for getting items
         
         return jsonify({"message": "Menu item added successfully", "item": data})
     except Exception as e:
-        print(f"Error adding menu item: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+        logger.exception("Error adding menu item")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/menu/<item_id>', methods=['PUT'])
+def save_item_update(item_id, old_item, data):
+    # Apply a partial update, which may point the item at new asset blobs
+    if 'modelUrl' in data and data['modelUrl'] != (old_item or {}).get('modelUrl'):
+        # LODs of the previous model no longer apply; new ones are built below
+        data['modelLods'] = {}
+    if 'imageUrl' in data and data['imageUrl'] != (old_item or {}).get('imageUrl'):
+        data['imageSrcset'] = {}
+    menu_ref = db.collection('menu').document(item_id)
+    menu_ref.update(data)
+    menu_cache.merge(item_id, data)
+    new_item = {**(old_item or {}), **data}
+    sync_asset_refs(old_item, new_item)
+    schedule_model_lods(item_id, old_item, new_item)
+    schedule_image_variants(item_id, old_item, new_item)
+    return new_item
+
+@tenant_route('/api/menu/<item_id>', methods=['PUT'])
 def update_menu_item(item_id):
     try:
         # Get form data
         data = request.form.to_dict()
         data['id'] = item_id
+        for field in DERIVED_ASSET_FIELDS:
+            data.pop(field, None)
         
         # Handle file uploads
         model_file = request.files.get('modelFile')
@@ -201,42 +620,135 @@ def update_menu_item(item_id):
         
         # Process model file if provided
         if model_file and allowed_file(model_file.filename):
-            model_filename = secure_filename(f"{item_id}_{model_file.filename}")
-            model_path = os.path.join(UPLOAD_FOLDER, model_filename)
-            model_file.save(model_path)
-            # Use local URL for the model file, including backend origin
-            data['modelUrl'] = f"http://localhost:5000/uploads/{model_filename}"
+            model_filename = blob_store.put(model_file)
+            data['modelUrl'] = asset_url(model_filename)
         
         # Process image file if provided
         if image_file and allowed_file(image_file.filename):
-            image_filename = secure_filename(f"{item_id}_{image_file.filename}")
-            image_path = os.path.join(UPLOAD_FOLDER, image_filename)
-            image_file.save(image_path)
-            # Use local URL for the image file, including backend origin
-            data['imageUrl'] = f"http://localhost:5000/uploads/{image_filename}"
+            image_filename = blob_store.put(image_file)
+            data['imageUrl'] = asset_url(image_filename)
         
         # Update in Firestore if available
         if db:
-            menu_ref = db.collection('menu').document(item_id)
-            menu_ref.update(data)
+            save_item_update(item_id, get_menu_item(item_id), data)
         
         return jsonify({"message": "Menu item updated successfully", "item": data})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    except Exception:
+        logger.exception("Error updating menu item")
+        return jsonify({"error": "An error occurred while updating the menu item."}), 500
 
-@app.route('/api/menu/<item_id>', methods=['DELETE'])
+@tenant_route('/api/menu/<item_id>', methods=['DELETE'])
 def delete_menu_item(item_id):
     try:
         # Delete from Firestore if available
         if db:
+            old_item = get_menu_item(item_id)
             menu_ref = db.collection('menu').document(item_id)
             menu_ref.delete()
+            menu_cache.remove(item_id)
+            sync_asset_refs(old_item, None)
         
         return jsonify({"message": "Menu item deleted successfully", "id": item_id})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    except Exception:
+        logger.exception("Error deleting menu item")
+        return jsonify({"error": "An error occurred while deleting the menu item."}), 500
+
+# Firestore accepts at most 500 writes per batch
+IMPORT_BATCH_SIZE = 500
+
+def prepare_import_row(row, archive, stored):
+    # Returns the menu item for one import row, storing any files it names from
+    # the archive (`stored` maps archive names to blobs so shared files are read once)
+    if not isinstance(row, dict):
+        raise MenuImportError("Row must be an object.")
+    item = {
+        key: value for key, value in row.items()
+        if key not in DERIVED_ASSET_FIELDS and key not in ASSET_FILE_COLUMNS
+    }
+    if not item.get('name'):
+        raise MenuImportError("'name' is required.")
+    item['id'] = str(item.get('id') or uuid.uuid4())
+    for column, field in ASSET_FILE_COLUMNS.items():
+        name = row.get(column)
+        if not name:
+            continue
+        if archive is None:
+            raise MenuImportError(f"'{column}' needs a models archive.")
+        if name not in stored:
+            stream, ext = archive.open(name)
+            with stream:
+                stored[name] = blob_store.put_stream(stream, ext)
+        item[field] = asset_url(stored[name])
+    return item
 
-@app.route('/api/upload', methods=['POST'])
+@tenant_route('/api/menu/import', methods=['POST'])
+def import_menu_items():
+    # Bulk-add menu items from a JSON array (request body or an `items` .json file) or
+    # an `items` .csv file. Model/image files named in `modelFile`/`imageFile` columns
+    # come from an optional `models` .zip. Items are written in Firestore batches, and
+    # bad rows are reported per row without stopping the import.
+    archive = None
+    stored = {}
+    try:
+        if not db:
+            return jsonify({"error": "Database not available."}), 503
+
+        if request.mimetype == 'multipart/form-data':
+            items_file = request.files.get('items')
+            if not items_file:
+                return jsonify({"error": "No items file provided."}), 400
+            rows = parse_rows(items_file)
+            models_file = request.files.get('models')
+            if models_file:
+                archive = ModelArchive(models_file, upload_limits(current_app.config, ALLOWED_EXTENSIONS))
+        else:
+            rows = rows_from_json(request.get_json(silent=True))
+
+        errors = []
+        prepared = []  # (row number, item)
+        for number, row in enumerate(rows, start=1):
+            try:
+                prepared.append((number, prepare_import_row(row, archive, stored)))
+            except MenuImportError as e:
+                errors.append({"row": number, "error": str(e)})
+
+        # One snapshot read up front instead of a lookup per row for replaced items
+        existing = {item.get('id'): item for item in menu_cache.get_items(load_menu_items)}
+        imported = []
+        for chunk in chunked(prepared, IMPORT_BATCH_SIZE):
+            batch = db.batch()
+            for _, item in chunk:
+                batch.set(db.collection('menu').document(item['id']), item)
+            try:
+                batch.commit()
+            except Exception:
+                logger.exception("Error committing import batch")
+                errors.extend({"row": number, "id": item['id'], "error": "Failed to save item."} for number, item in chunk)
+                continue
+            for _, item in chunk:
+                old_item = existing.get(item['id'])
+                menu_cache.upsert(item)
+                sync_asset_refs(old_item, item)
+                schedule_model_lods(item['id'], old_item, item)
+                schedule_image_variants(item['id'], old_item, item)
+                existing[item['id']] = item
+                imported.append(item['id'])
+
+        errors.sort(key=lambda error: error['row'])
+        return jsonify({"imported": len(imported), "failed": len(errors), "items": imported, "errors": errors})
+    except MenuImportError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception:
+        logger.exception("Error importing menu items")
+        return jsonify({"error": "An error occurred while importing menu items."}), 500
+    finally:
+        if archive:
+            archive.close()
+        # Files only used by rows that failed are not referenced by anything
+        for name in stored.values():
+            blob_store.discard(name)
+
+@tenant_route('/api/upload', methods=['POST'])
 def upload_file():
     try:
         # Check if the post request has the file part
@@ -251,137 +763,501 @@ def upload_file():
             return jsonify({"error": "No selected file"}), 400
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
+            # Stored unreferenced; the blob is retained once a menu item points at its URL,
+            # and swept after UPLOAD_ORPHAN_GRACE_SECONDS if none ever does
+            filename = blob_store.put(file)
             
-            # Use local URL for the uploaded file
             return jsonify({
                 "message": "File uploaded successfully",
                 "filename": filename,
-                "url": f"/uploads/{filename}"
+                "url": asset_url(filename)
             })
         else:
             return jsonify({"error": "File type not allowed"}), 400
+    except Exception:
+        logger.exception("Error uploading file")
+        return jsonify({"error": "An error occurred while uploading the file."}), 500
+
+@tenant_route('/api/uploads/sign', methods=['POST'])
+def sign_upload():
+    # Step 1 of a direct upload: {"filename": "dish.glb", "contentType": ...} returns
+    # an `uploadId` and where to PUT the file (`url`, `method`, `headers`). With the
+    # bucket backend the bytes go straight to storage, never through this app.
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '')
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    ext = file_extension(filename)
+    content_type = data.get('contentType') or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    max_bytes = upload_limits(current_app.config, ALLOWED_EXTENSIONS)[ext]
+    size = data.get('size')
+    if isinstance(size, int) and size > max_bytes:
+        return jsonify({"error": f"'.{ext}' uploads are limited to {max_bytes / (1024 * 1024):g} MB."}), 413
+    upload_id = f"{uuid.uuid4().hex}.{ext}"
+    expires_in = current_app.config['UPLOAD_URL_EXPIRY']
+    try:
+        upload = storage.sign_upload(upload_id, content_type, max_bytes, expires_in)
+    except Exception:
+        logger.exception("Error signing direct upload")
+        return jsonify({"error": "Direct uploads are not available."}), 503
+    upload['url'] = urljoin(request.host_url, upload['url'])
+    return jsonify({"uploadId": upload_id, "expiresIn": expires_in, "maxBytes": max_bytes, **upload})
+
+@tenant_route('/api/uploads/direct/<token>', methods=['PUT'])
+def direct_upload(token):
+    # Step 2 with the local backend: the signed URL from /api/uploads/sign
+    if storage.remote:
+        return jsonify({"error": "Uploads go to the storage bucket."}), 404
+    try:
+        claims = storage.verify_token(token, max_age=current_app.config['UPLOAD_URL_EXPIRY'])
+    except BadSignature:
+        return jsonify({"error": "Upload URL is invalid or has expired."}), 403
+    started = time.perf_counter()
+    try:
+        size = storage.receive(claims['id'], request.stream, claims['max'])
+    except UploadTooLarge as e:
+        upload_stats.reject()
+        return jsonify({"error": str(e)}), 413
+    upload_stats.record(size, time.perf_counter() - started)
+    return jsonify({"uploadId": claims['id'], "size": size})
+
+@tenant_route('/api/uploads/finalize', methods=['POST'])
+def finalize_upload():
+    # Step 3: {"uploadId": ..., "itemId": optional} turns the uploaded file into a blob.
+    # With an itemId the file becomes that item's model (.glb/.gltf) or photo, as if it
+    # had been sent to PUT /api/menu/<itemId>; otherwise it is kept until an item uses it.
+    data = request.get_json(silent=True) or {}
+    upload_id = data.get('uploadId')
+    if not is_upload_id(upload_id):
+        return jsonify({"error": "Invalid uploadId."}), 400
+    ext = file_extension(upload_id)
+    item_id = data.get('itemId')
+    try:
+        if item_id and not db:
+            return jsonify({"error": "Database not available."}), 503
+        old_item = get_menu_item(str(item_id)) if item_id else None
+        if item_id and old_item is None:
+            return jsonify({"error": "Menu item not found."}), 404
+        if ext not in ALLOWED_EXTENSIONS:
+            storage.delete_staged(upload_id)
+            return jsonify({"error": "File type not allowed"}), 400
+        max_bytes = upload_limits(current_app.config, ALLOWED_EXTENSIONS)[ext]
+        if storage.staged_size(upload_id) > max_bytes:
+            storage.delete_staged(upload_id)
+            return jsonify({"error": f"'.{ext}' uploads are limited to {max_bytes / (1024 * 1024):g} MB."}), 413
+        with storage.open_staged(upload_id) as stream:
+            filename = blob_store.put_stream(stream, ext)
+        storage.delete_staged(upload_id)
+        if ext == 'glb':
+            with open(blob_store.path(filename), 'rb') as f:
+                if f.read(len(GLB_MAGIC)) != GLB_MAGIC:
+                    blob_store.discard(filename)
+                    return jsonify({"error": "File is not a binary glTF (.glb) model."}), 415
+
+        result = {"message": "File uploaded successfully", "filename": filename, "url": asset_url(filename)}
+        if item_id:
+            field = 'modelUrl' if ext in MODEL_EXTENSIONS else 'imageUrl'
+            result["item"] = save_item_update(str(item_id), old_item, {field: asset_url(filename)})
+        return jsonify(result)
+    except UploadNotFound:
+        return jsonify({"error": "Upload not found. It may have expired or already been finalized."}), 404
     except Exception as e:
+        logger.exception("Error finalizing upload")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/uploads/<filename>')
+@tenant_route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    if not is_blob_name(filename):
+        # Legacy uploads aren't content-addressed, so they are only revalidated
+        return send_from_directory(blob_store.root, filename)
+    if storage.remote and not os.path.exists(blob_store.path(filename)):
+        # Stored by another replica; the bucket (or CDN) serves it
+        return redirect(asset_url(filename))
+
+    # Serve a precompressed sidecar when the client accepts one. Range requests
+    # (resumed model downloads) always get the identity bytes so offsets match
+    # the original file.
+    served_name, encoding = filename, None
+    if 'Range' not in request.headers:
+        served_name, encoding = blob_store.encoded_variant(filename, request.accept_encodings)
+
+    # The blob name is the SHA-256 of its content, which makes a strong ETag
+    content_hash = filename.split('.', 1)[0]
+    response = send_from_directory(
+        blob_store.root,
+        served_name,
+        download_name=filename,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        etag=f"{content_hash}-{encoding}" if encoding else content_hash,
+        conditional=True,
+    )
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@tenant_route('/uploads/<filename>/<int:width>.<fmt>')
+def image_variant(filename, width, fmt):
+    # A photo scaled down to `width` px as `fmt` (avif, webp or jpeg). The widths in
+    # items' imageSrcset are rendered after upload; any other width is rendered on
+    # first request and cached on disk. Those are rounded up to a multiple of 32 px
+    # and capped at the photo's own width (redirecting to that URL), so one photo
+    # has a bounded number of variants.
+    if not is_blob_name(filename) or file_extension(filename) not in image_variants.SOURCE_EXTENSIONS:
+        return jsonify({"error": "Not a resizable image."}), 404
+    try:
+        source = blob_store.local_path(filename)
+    except FileNotFoundError:
+        source = None
+    if not source or not os.path.exists(source):
+        return jsonify({"error": "Image not found."}), 404
+    formats = image_variants.available_formats(current_app.config['IMAGE_FORMATS'])
+    if not formats:
+        # Without Pillow every variant is the original
+        return redirect(url_for('api.uploaded_file', filename=filename))
+    if fmt not in formats:
+        return jsonify({"error": f"Images are available as {', '.join(formats)}."}), 404
+    try:
+        source_width = image_variants.image_width(source)
+        if width not in current_app.config['IMAGE_WIDTHS'] and width != source_width:
+            width_limit = min(current_app.config['IMAGE_MAX_WIDTH'], source_width)
+            canonical = min(max(image_variants.round_width(width), image_variants.WIDTH_STEP), width_limit)
+            if canonical != width:
+                return redirect(url_for('api.image_variant', filename=filename, width=canonical, fmt=fmt), 301)
+        width = min(width, source_width)
+        path = asset_pipeline.image_variant(filename, width, fmt)
+    except image_variants.ImageError:
+        return jsonify({"error": "Image could not be resized."}), 415
+
+    response = send_file(
+        path,
+        mimetype=image_variants.MIMETYPES[fmt],
+        etag=f"{filename.split('.', 1)[0]}-{width}.{fmt}",
+        conditional=True,
+    )
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def recent_user_messages(session_id, limit=2):
+    messages = session_store.peek(session_id)
+    return [message.content for message in messages if message.type == 'human'][-limit:]
+
+def select_menu_context(user_message, session_id):
+    menu_items = menu_cache.get_items(load_menu_items)
+    if len(menu_items) <= current_app.config['MENU_RETRIEVAL_MIN_ITEMS']:
+        return menu_cache.get_derived('menu_context', build_menu_context, load_menu_items)
+    if not menu_index.ready:
+        # Only happens with the snapshot cache disabled
+        menu_index.reset(menu_items)
+    query = " ".join(recent_user_messages(session_id) + [user_message])
+    item_ids = menu_index.search(query, current_app.config['MENU_RETRIEVAL_TOP_K'])
+    if not item_ids:
+        # Nothing matched (e.g. "surprise me"); fall back to the (budgeted) full menu
+        return menu_cache.get_derived('menu_context', build_menu_context, load_menu_items)
+    items_by_id = {item.get('id'): item for item in menu_items}
+    return build_menu_context([items_by_id[item_id] for item_id in item_ids if item_id in items_by_id])
+
+def format_menu_item(item):
+    return f"- Name: {item.get('name', 'N/A')}, Category: {item.get('category', 'N/A')}, Subcategory: {item.get('subcategory', 'N/A')}, Description: {item.get('description', 'N/A')}, Price: {item.get('price', 'N/A')}\n"
+
+def build_menu_context(menu_items):
+    if not menu_items:
+        return "No menu items available.\n"
+    char_budget = current_app.config['MENU_CONTEXT_MAX_TOKENS'] * 4
+    lines = []
+    used = 0
+    for index, item in enumerate(menu_items):
+        line = format_menu_item(item)
+        if char_budget and used + len(line) > char_budget:
+            lines.append(f"- ...and {len(menu_items) - index} more items not listed.\n")
+            break
+        lines.append(line)
+        used += len(line)
+    return "".join(lines)
+
+@tenant_route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "menu": menu_cache.stats(),
+        "changes": menu_changes.stats(),
+        "sessions": session_store.stats(),
+        "responses": response_cache.stats(),
+        "mirrors": {name: mirror.stats() for name, mirror in mirrors.items()},
+        "coalescing": {"firestore": firestore_flights.stats(), "llm": llm_flights.stats(), "async": tenant().async_flights.stats()},
+        "llmGateway": llm_gateway.stats(),
+        "tenants": state().tenants.stats(),
+    })
+
+@api.route('/api/uploads/stats', methods=['GET'])
+def upload_throughput_stats():
+    return jsonify(upload_stats.stats())
 
-@app.route('/api/recommend', methods=['POST'])
+# Replies to opening questions ("what's vegetarian?") only depend on the question and
+# the menu, so they are cached and reused across diners until the menu changes.
+def cached_reply(session_id, user_message):
+    # Returns (reply or None, whether the reply may be cached)
+    if get_session_history(session_id).messages:
+        # Later turns depend on the conversation so far
+        return None, False
+    reply = response_cache.get(user_message)
+    if reply is not None:
+        record_exchange(session_id, user_message, reply)
+    return reply, True
+
+def record_exchange(session_id, user_message, reply):
+    # Record a reply the LLM didn't make for this session, so follow-ups have context
+    from langchain_core.messages import AIMessage, HumanMessage
+    get_session_history(session_id).add_messages([HumanMessage(content=user_message), AIMessage(content=reply)])
+
+def fallback_reply(session_id, user_message, reason):
+    # Answered from the menu alone when the LLM gateway sheds the call
+    LLM_FALLBACKS.inc(reason=reason)
+    logger.warning("LLM unavailable, using local recommender", extra={"reason": reason, "sessionId": session_id})
+    menu_items = menu_cache.get_items(load_menu_items) if db else []
+    reply = local_recommendation(menu_items, user_message)
+    record_exchange(session_id, user_message, reply)
+    return reply
+
+def reply_flight_key(user_message):
+    # Opening questions that would share a response cache entry share an LLM call in flight
+    return ('reply', normalize_question(user_message))
+
+def prepare_recommendation(user_message, session_id):
+    # Returns (chain input, chain config) for a chat message
+
+    # Small menus are sent whole (formatted once per menu version); large ones
+    # are narrowed down to the items relevant to this conversation
+    menu_context = build_menu_context([])
+    try:
+        if db:
+            menu_context = select_menu_context(user_message, session_id)
+        else:
+            logger.warning("Firebase not available for fetching menu items. Cannot fetch menu items for AI.")
+    except Exception:
+        logger.exception("Error fetching menu items for AI")
+
+    # Construct the input for the runnable, including menu_context in the prompt
+    # The RunnableWithMessageHistory handles the history based on the session_id
+    full_prompt_input = {"history": "", "input": user_message, "menu_context": menu_context}
+    config = {
+        "configurable": {
+            "session_id": session_id,
+            "tenant_id": g.get('tenant_id'),
+        }
+    }
+    return full_prompt_input, config
+
+def prompt_text(full_prompt_input, session_id):
+    # What the LLM is sent, for token accounting: menu, history and message
+    history = get_session_history(session_id).messages
+    return "\n".join([full_prompt_input["menu_context"], *(str(message.content) for message in history), full_prompt_input["input"]])
+
+@tenant_route('/api/recommend', methods=['POST'])
 def recommend():
     try:
         if not conversation_chain:
             return jsonify({"error": "AI recommendations are not available."}), 503
 
         data = request.get_json()
-        user_message = data.get('message')
-        # Using a fixed session ID for this example. In a real app, use a user-specific ID.
-        session_id = "fixed-session-id"
-
-        if not user_message:
+        if not data.get('message'):
             return jsonify({"error": "No message provided."}), 400
 
-        # Fetch the current menu data (same logic as before)
-        menu_items = []
-        try:
-            if db:
-                menu_ref = db.collection('menu')
-                docs = menu_ref.stream()
-                menu_items = [doc.to_dict() for doc in docs]
-            else:
-                print("Firebase not available for fetching menu items. Cannot fetch menu items for AI.")
-                pass
-        except Exception as menu_fetch_error:
-            print(f"Error fetching menu items for AI: {str(menu_fetch_error)}")
-
-        # Prepare menu data for the AI (same logic as before)
-        menu_context = ""
-        if menu_items:
-            for item in menu_items:
-                menu_context += f"- Name: {item.get('name', 'N/A')}, Category: {item.get('category', 'N/A')}, Subcategory: {item.get('subcategory', 'N/A')}, Description: {item.get('description', 'N/A')}, Price: {item.get('price', 'N/A')}\n"
-        else:
-            menu_context += "No menu items available.\n"
-
-        # Construct the input for the runnable, including menu_context in the prompt
-        # The RunnableWithMessageHistory handles the history based on the session_id
-        full_prompt_input = {"history": "", "input": user_message, "menu_context": menu_context}
-
-        # Invoke the runnable with message history
-        # The session_id is passed via the config
-        response = conversation_chain.invoke(
-            full_prompt_input,
-            config={
-                "configurable": {
-                    "session_id": session_id
-                }
-            }
-        )
+        user_message = data['message']
+        session_id = resolve_session_id(data)
+        ai_response_text, cacheable = cached_reply(session_id, user_message)
+        fallback = False
+
+        if ai_response_text is None:
+            full_prompt_input, config = prepare_recommendation(user_message, session_id)
+
+            def invoke():
+                # Invoke the runnable with message history
+                # The session_id is passed via the config
+                prompt = prompt_text(full_prompt_input, session_id)
+                started = time.perf_counter()
+                chain = state().conversation_chain  # Resolved here: the call runs on the gateway's pool
+                response = llm_gateway.invoke(lambda: chain.invoke(full_prompt_input, config=config))
 
-        # The response is the AIMessage object, extract the content
-        ai_response_text = response.content
+                # Chat models return an AIMessage, completion models (like OpenAI) a plain string
+                text = getattr(response, 'content', response)
+                observe_llm_call('invoke', time.perf_counter() - started, prompt, text, session_id)
+                return text
+
+            try:
+                if cacheable:
+                    # Diners opening with the same question at the same moment share one LLM call
+                    ai_response_text, shared = llm_flights.do(reply_flight_key(user_message), invoke)
+                    if shared:
+                        record_exchange(session_id, user_message, ai_response_text)
+                    else:
+                        response_cache.put(user_message, ai_response_text)
+                else:
+                    ai_response_text = invoke()
+            except LLMUnavailable as e:
+                ai_response_text, fallback = fallback_reply(session_id, user_message, e.reason), True
 
         ai_response = {
-            "response": ai_response_text
+            "response": ai_response_text,
+            "sessionId": session_id
         }
+        if fallback:
+            ai_response["fallback"] = True  # Answered by the local recommender, not the LLM
 
         return jsonify(ai_response)
-    except Exception as e:
-        print(f"Error in recommendations endpoint: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error in recommendations endpoint")
         return jsonify({"error": "An error occurred while processing your request."}), 500
 
-@app.route('/api/categories', methods=['GET'])
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@tenant_route('/api/recommend/stream', methods=['POST'])
+def recommend_stream():
+    # Same as /api/recommend, but pushes tokens to the client as Server-Sent Events:
+    #   event: session  {"sessionId": ...}   first, so the client can keep it
+    #   event: token    {"token": ...}       for every chunk from the LLM
+    #   event: done     {}                   once the reply is complete (history saved);
+    #                                         {"fallback": true} if the local recommender answered
+    #   event: error    {"error": ...}       if the LLM fails mid-stream
+    try:
+        if not conversation_chain:
+            return jsonify({"error": "AI recommendations are not available."}), 503
+
+        data = request.get_json()
+        if not data.get('message'):
+            return jsonify({"error": "No message provided."}), 400
+
+        user_message = data['message']
+        session_id = resolve_session_id(data)
+        reply, cacheable = cached_reply(session_id, user_message)
+        if reply is None:
+            full_prompt_input, config = prepare_recommendation(user_message, session_id)
+    except Exception:
+        logger.exception("Error in streaming recommendations endpoint")
+        return jsonify({"error": "An error occurred while processing your request."}), 500
+
+    def generate_cached():
+        yield sse_event("session", {"sessionId": session_id})
+        yield sse_event("token", {"token": reply})
+        yield sse_event("done", {})
+
+    def generate():
+        if not (cacheable and llm_flights.enabled):
+            yield from generate_llm()
+            return
+        # Diners opening with the same question at the same moment share one LLM
+        # stream; the others receive the reply in one piece once it is complete
+        key = reply_flight_key(user_message)
+        call, leader = llm_flights.join(key)
+        if not leader:
+            yield from generate_shared(call)
+            return
+        outcome = {}
+        try:
+            yield from generate_llm(outcome)
+        finally:
+            if 'reply' in outcome:
+                llm_flights.finish(key, call, value=outcome['reply'])
+            else:
+                llm_flights.finish(key, call, error=outcome.get('error') or FlightAbandoned("Client disconnected"))
+
+    def generate_shared(call):
+        try:
+            shared_reply = llm_flights.wait(call)
+        except FlightAbandoned:
+            # The stream we were waiting on was cut short; make our own call
+            yield from generate_llm()
+            return
+        except LLMUnavailable as e:
+            yield from generate_fallback(e.reason)
+            return
+        except Exception:
+            logger.exception("Error streaming recommendation")
+            yield sse_event("session", {"sessionId": session_id})
+            yield sse_event("error", {"error": "An error occurred while processing your request."})
+            return
+        record_exchange(session_id, user_message, shared_reply)
+        yield sse_event("session", {"sessionId": session_id})
+        yield sse_event("token", {"token": shared_reply})
+        yield sse_event("done", {})
+
+    def generate_fallback(reason):
+        yield sse_event("session", {"sessionId": session_id})
+        yield sse_event("token", {"token": fallback_reply(session_id, user_message, reason)})
+        yield sse_event("done", {"fallback": True})
+
+    def generate_llm(outcome=None):
+        # Streams the LLM reply; `outcome` receives 'reply' or 'error' for sharing
+        outcome = {} if outcome is None else outcome
+        prompt = prompt_text(full_prompt_input, session_id)
+        started = time.perf_counter()
+        chain = state().conversation_chain  # Resolved here: chunks are pulled on the gateway's pool
+        chunks = llm_gateway.stream(lambda: chain.stream(full_prompt_input, config=config))
+        tokens = []
+        try:
+            yield sse_event("session", {"sessionId": session_id})
+            try:
+                for chunk in chunks:
+                    token = getattr(chunk, 'content', chunk)
+                    if token:
+                        tokens.append(token)
+                        yield sse_event("token", {"token": token})
+            except LLMUnavailable as e:
+                if tokens:
+                    raise
+                # Nothing sent yet, so the local recommender can still answer
+                outcome['error'] = e
+                yield sse_event("token", {"token": fallback_reply(session_id, user_message, e.reason)})
+                yield sse_event("done", {"fallback": True})
+                return
+            outcome['reply'] = "".join(tokens)
+            observe_llm_call('stream', time.perf_counter() - started, prompt, outcome['reply'], session_id)
+            if cacheable:
+                response_cache.put(user_message, outcome['reply'])
+            yield sse_event("done", {})
+        except GeneratorExit:
+            # The client went away; closing `chunks` below stops pulling tokens
+            # from the LLM (and the reply is not added to the session history)
+            logger.info("Client disconnected from recommendation stream", extra={"sessionId": session_id})
+            raise
+        except Exception as e:
+            outcome['error'] = e
+            logger.exception("Error streaming recommendation")
+            yield sse_event("error", {"error": "An error occurred while processing your request."})
+        finally:
+            chunks.close()
+
+    response = Response(stream_with_context(generate() if reply is None else generate_cached()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+@tenant_route('/api/categories', methods=['GET'])
 def get_categories():
     try:
         if db:
-            categories_ref = db.collection('categories')
-            docs = categories_ref.stream()
-            # Assuming categories are stored as documents with a 'name' field
-            categories = [doc.to_dict() for doc in docs]
-            # Extract just the category names
-            category_names = [cat.get('name') for cat in categories if cat.get('name')]
-            return jsonify(category_names)
+            return conditional_json(jsonify(category_names()).get_data())
         else:
-            print("Firebase not available for fetching categories. Returning empty array.")
+            logger.warning("Firebase not available for fetching categories. Returning empty array.")
             return jsonify([])
-    except Exception as e:
-        print(f"Error fetching categories: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error fetching categories")
         return jsonify({"error": "An error occurred while fetching categories."}), 500
 
-@app.route('/api/subcategories', methods=['GET'])
+@tenant_route('/api/subcategories', methods=['GET'])
 def get_subcategories():
     try:
         if db:
-            subcategories_ref = db.collection('subcategories')
-            docs = subcategories_ref.stream()
-            # Assuming subcategories are stored as documents with 'category' and 'name' fields
-            subcategories_list = [doc.to_dict() for doc in docs]
-            # Organize subcategories by category
-            subcategories_dict = {}
-            for subcat in subcategories_list:
-                category = subcat.get('category')
-                name = subcat.get('name')
-                if category and name:
-                    if category not in subcategories_dict:
-                        subcategories_dict[category] = []
-                    subcategories_dict[category].append(name)
-            return jsonify(subcategories_dict)
+            return conditional_json(jsonify(subcategory_tree()).get_data())
         else:
-            print("Firebase not available for fetching subcategories. Returning empty object.")
+            logger.warning("Firebase not available for fetching subcategories. Returning empty object.")
             return jsonify({})
-    except Exception as e:
-        print(f"Error fetching subcategories: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error fetching subcategories")
         return jsonify({"error": "An error occurred while fetching subcategories."}), 500
 
-@app.route('/api/categories', methods=['POST'])
+@tenant_route('/api/categories', methods=['POST'])
 def add_category():
     try:
         if not db:
@@ -393,49 +1269,47 @@ def add_category():
         if not category_name:
             return jsonify({"error": "Category name is required."}), 400
 
+        # Both writes go in one batch: a single round-trip, and never half-applied
+        batch = db.batch()
+
         # Add the new category to the 'categories' collection
         # Using the category name as the document ID for uniqueness
         category_ref = db.collection('categories').document(category_name)
-        category_ref.set({'name': category_name})
+        batch.set(category_ref, {'name': category_name})
 
-        # Also initialize an empty list for this category in the subcategories collection structure (optional but helpful for structure)
-        # This assumes a document in 'subcategories' collection keyed by category name, storing a list of subcategory names
+        # Also make sure this category has a document in the subcategories collection,
+        # keyed by category name and storing a list of subcategory names. An empty
+        # merge creates it if needed without wiping names that are already there.
         subcategories_doc_ref = db.collection('subcategories').document(category_name)
-        # Use merge=True to avoid overwriting other categories if the document exists
-        subcategories_doc_ref.set({'names': []}, merge=True)
+        batch.set(subcategories_doc_ref, {}, merge=True)
+        batch.commit()
 
         return jsonify({"message": "Category added successfully", "category": category_name}), 201
-    except Exception as e:
-        print(f"Error adding category: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error adding category")
         return jsonify({"error": "An error occurred while adding the category."}), 500
 
-@app.route('/api/categories/<category_name>', methods=['DELETE'])
+@tenant_route('/api/categories/<category_name>', methods=['DELETE'])
 def delete_category(category_name):
     try:
         if not db:
             return jsonify({"error": "Database not available."}), 503
 
-        # Delete the category document from the 'categories' collection
-        category_ref = db.collection('categories').document(category_name)
-        category_ref.delete()
-
-        # Also delete the corresponding subcategories document (if it exists)
-        subcategories_doc_ref = db.collection('subcategories').document(category_name)
-        subcategories_doc_ref.delete()
+        # Delete the category document and its subcategories document (if it exists) together
+        batch = db.batch()
+        batch.delete(db.collection('categories').document(category_name))
+        batch.delete(db.collection('subcategories').document(category_name))
+        batch.commit()
 
         # Note: This does NOT automatically update menu items that used this category.
         # A more robust solution might involve updating or flagging those menu items.
 
         return jsonify({"message": "Category deleted successfully", "category": category_name})
-    except Exception as e:
-        print(f"Error deleting category: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error deleting category")
         return jsonify({"error": "An error occurred while deleting the category."}), 500
 
-@app.route('/api/subcategories', methods=['POST'])
+@tenant_route('/api/subcategories', methods=['POST'])
 def add_subcategory():
     try:
         if not db:
@@ -448,57 +1322,80 @@ def add_subcategory():
         if not category_name or not subcategory_name:
             return jsonify({"error": "Category name and subcategory name are required."}), 400
 
-        # Get the document for the category from the 'subcategories' collection
+        from firebase_admin import firestore
+
+        # ArrayUnion adds the name atomically in one write (no read-modify-write, so
+        # concurrent admins can't overwrite each other), creating the document if needed
         subcategories_doc_ref = db.collection('subcategories').document(category_name)
-        subcategories_doc = subcategories_doc_ref.get()
-
-        if subcategories_doc.exists:
-            # If the document exists, update the 'names' array
-            current_subcategories = subcategories_doc.to_dict().get('names', [])
-            if subcategory_name not in current_subcategories:
-                current_subcategories.append(subcategory_name)
-                subcategories_doc_ref.update({'names': current_subcategories})
-                return jsonify({"message": "Subcategory added successfully", "category": category_name, "subcategory": subcategory_name}), 201
-            else:
-                return jsonify({"message": "Subcategory already exists", "category": category_name, "subcategory": subcategory_name}), 200
-        else:
-            # If the category document does not exist in the subcategories collection, create it with the new subcategory
-            subcategories_doc_ref.set({'names': [subcategory_name]})
-            return jsonify({"message": "Subcategory added successfully and new category entry created", "category": category_name, "subcategory": subcategory_name}), 201
+        subcategories_doc_ref.set({'names': firestore.ArrayUnion([subcategory_name])}, merge=True)
+        return jsonify({"message": "Subcategory added successfully", "category": category_name, "subcategory": subcategory_name}), 201
 
-    except Exception as e:
-        print(f"Error adding subcategory: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error adding subcategory")
         return jsonify({"error": "An error occurred while adding the subcategory."}), 500
 
-@app.route('/api/subcategories/<category_name>/<subcategory_name>', methods=['DELETE'])
+@tenant_route('/api/subcategories/<category_name>/<subcategory_name>', methods=['DELETE'])
 def delete_subcategory(category_name, subcategory_name):
     try:
         if not db:
             return jsonify({"error": "Database not available."}), 503
 
-        # Get the document for the category from the 'subcategories' collection
+        from firebase_admin import firestore
+        from google.api_core.exceptions import NotFound
+
+        # ArrayRemove drops the name atomically; update() fails if the category has no document
         subcategories_doc_ref = db.collection('subcategories').document(category_name)
-        subcategories_doc = subcategories_doc_ref.get()
-
-        if subcategories_doc.exists:
-            current_subcategories = subcategories_doc.to_dict().get('names', [])
-            if subcategory_name in current_subcategories:
-                # Remove the subcategory from the list
-                updated_subcategories = [sub for sub in current_subcategories if sub != subcategory_name]
-                subcategories_doc_ref.update({'names': updated_subcategories})
-                return jsonify({"message": "Subcategory deleted successfully", "category": category_name, "subcategory": subcategory_name})
-            else:
-                return jsonify({"message": "Subcategory not found"}), 404
-        else:
+        try:
+            subcategories_doc_ref.update({'names': firestore.ArrayRemove([subcategory_name])})
+        except NotFound:
             return jsonify({"message": "Category for subcategory not found"}), 404
+        return jsonify({"message": "Subcategory deleted successfully", "category": category_name, "subcategory": subcategory_name})
 
-    except Exception as e:
-        print(f"Error deleting subcategory: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error deleting subcategory")
         return jsonify({"error": "An error occurred while deleting the subcategory."}), 500
 
+@api.route('/api/ready', methods=['GET'])
+def readiness():
+    # 200 once every subsystem has been initialized (or found unavailable), 503 while
+    # the background warm-up is still running; cold subsystems are not started here
+    ready, subsystems = state().readiness()
+    return jsonify({
+        "ready": ready,
+        "subsystems": subsystems,
+        "startupSeconds": round(current_app.config['STARTUP_SECONDS'], 3),
+    }), 200 if ready else 503
+
+def create_app(config=None):
+    """Build the Flask app; `config` overrides the environment-derived defaults."""
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_mapping(default_config())
+    app.config.update(config or {})
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    app.url_map.converters['tenant'] = TenantIdConverter  # Restaurant ids in /api/<id>/... routes
+    app.request_class = StreamingUploadRequest  # Stream file parts to disk with per-type size limits
+    CORS(app, expose_headers=['ETag', 'X-Menu-Epoch', 'X-Menu-Revision', 'X-Request-Id'])  # Enable CORS for all routes; expose the sync and request ID headers
+    app.extensions['menuart'] = AppState(app.config, dumps=app.json.dumps)
+    init_observability(app)  # Request IDs, JSON logs, /metrics; registered first so its hooks wrap the API's
+    app.register_blueprint(api)
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+
+    if app.config['WARM_ON_START']:
+        # Firebase and the LLM chain load in the background; requests that need
+        # them before then initialize them on demand
+        app.extensions['menuart'].warm_in_background()
+    return app
+
+app = create_app()
+
+# Importing this module and building the default app should stay well under
+# STARTUP_BUDGET_MS; anything heavy belongs in services.py
+STARTUP_SECONDS = time.perf_counter() - IMPORT_STARTED
+app.config['STARTUP_SECONDS'] = STARTUP_SECONDS
+if STARTUP_SECONDS * 1000 > app.config['STARTUP_BUDGET_MS']:
+    logger.warning("Startup over budget", extra={"startupMs": round(STARTUP_SECONDS * 1000), "budgetMs": app.config['STARTUP_BUDGET_MS']})
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asset_pipeline import AssetPipeline
+from blob_store import BlobStore
+from firestore_mirror import CollectionMirror
+from llm_gateway import CircuitBreaker, LLMGateway
+from menu_cache import MenuCache
+from menu_changes import MenuChangeLog
+from menu_index import BM25Index, HashingEmbedder, VectorIndex, load_embedder
+from menu_search import MenuSearchIndex
+from response_cache import ResponseCache
+from services import Services
+from single_flight import AsyncSingleFlight, SingleFlight
+from storage_backends import TENANTS_DIR, BucketStorage, LocalStorage
+from tenants import TenantFirestore, TenantRegistry
+
+# Collections behind the read endpoints that are mirrored in memory
+MIRRORED_COLLECTIONS = ('menu', 'categories', 'subcategories')
+
+
+class TenantState:
+    """Caches, indexes, stores and mirrors of one restaurant (`tenant_id`; None for the default).
+
+    A tenant reads its own Firestore collections (`restaurants/<id>/menu`,
+    ... or the top-level ones for the default), keeps uploads in its own
+    namespace and has its own bounded caches and chat sessions. Everything
+    here is cheap to create; mirrors start once a Firestore client exists.
+    """
+
+    def __init__(self, app_state, tenant_id=None):
+        config = app_state.config
+        self.config = config
+        self.tenant_id = tenant_id
+        self.services = app_state.services
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._db = None
+        self._async_db = None
+        self._session_store = None
+        self.mirrors = {}
+        self._mirrors_started = False
+
+        # Concurrent identical Firestore reads and LLM calls share one call in flight
+        self.firestore_flights = SingleFlight(timeout=config['SINGLE_FLIGHT_TIMEOUT'], enabled=config['SINGLE_FLIGHT'])
+        self.llm_flights = SingleFlight(timeout=config['SINGLE_FLIGHT_TIMEOUT'], enabled=config['SINGLE_FLIGHT'])
+        # The same for coroutines, in the ASGI app
+        self.async_flights = AsyncSingleFlight(timeout=config['SINGLE_FLIGHT_TIMEOUT'], enabled=config['SINGLE_FLIGHT'])
+
+        # Snapshot of the menu collection, patched in place by the menu write endpoints
+        self.menu_cache = MenuCache(ttl=config['MENU_CACHE_TTL'], dumps=app_state.dumps, flight=self.firestore_flights)
+
+        # Revisioned change log behind GET /api/menu/changes, shared by the worker processes
+        self.menu_changes = MenuChangeLog(
+            config['MENU_CHANGES_DB_PATH'], max_entries=config['MENU_CHANGE_LOG_SIZE'], namespace=tenant_id)
+        self.menu_cache.subscribe(self.menu_changes)
+
+        # Retrieval index for large-menu prompts, updated incrementally on menu writes
+        if config['MENU_RETRIEVER'] == 'embedding':
+            self.menu_index = VectorIndex(load_embedder(config['MENU_EMBEDDER']))
+        else:
+            self.menu_index = BM25Index()
+        self.menu_cache.subscribe(self.menu_index)
+
+        # Inverted and price indexes behind GET /api/menu/search
+        self.menu_search = MenuSearchIndex()
+        self.menu_cache.subscribe(self.menu_search)
+
+        # Replies to opening questions, emptied by every menu change
+        self.response_cache = ResponseCache(
+            max_entries=config['RESPONSE_CACHE_MAX_ENTRIES'],
+            ttl=config['RESPONSE_CACHE_TTL'],
+            similarity_threshold=config['RESPONSE_CACHE_SIMILARITY'] or None,
+            embedder=HashingEmbedder(),
+        )
+        self.menu_cache.subscribe(self.response_cache)
+
+        # Where clients download uploads from and send direct uploads to
+        upload_root = config['UPLOAD_FOLDER']
+        if tenant_id:
+            upload_root = os.path.join(upload_root, TENANTS_DIR, tenant_id)
+        if config['STORAGE_BACKEND'] == 'bucket':
+            self.storage = BucketStorage(lambda: self.services.bucket, base_url=config['ASSET_BASE_URL'], tenant_id=tenant_id)
+        else:
+            self.storage = LocalStorage(
+                upload_root, config['ASSET_BASE_URL'] or 'http://localhost:5000', config['UPLOAD_SIGNING_KEY'], tenant_id=tenant_id)
+
+        # Content-addressed uploads; post-processing runs on the app's shared workers
+        self.blob_store = BlobStore(upload_root, config['BLOB_INDEX_PATH'], storage=self.storage, tenant_id=tenant_id)
+        self.asset_pipeline = AssetPipeline(
+            self.blob_store, executor=app_state.asset_executor, orphan_grace=config['UPLOAD_ORPHAN_GRACE_SECONDS'])
+        self.blob_store.on_placed = self.asset_pipeline.placed
+
+    @property
+    def session_store(self):
+        # Imported on first use: the history class pulls in LangChain
+        if self._session_store is None:
+            with self._lock:
+                if self._session_store is None:
+                    from session_store import SessionStore
+                    self._session_store = SessionStore(
+                        max_sessions=self.config['SESSION_MAX_SESSIONS'],
+                        ttl=self.config['SESSION_TTL_SECONDS'],
+                        max_history_tokens=self.config['SESSION_HISTORY_MAX_TOKENS'],
+                        db_path=self.config['SESSION_DB_PATH'],
+                        namespace=self.tenant_id,
+                    )
+        return self._session_store
+
+    @property
+    def db(self):
+        client = self.services.db
+        if client is None:
+            return None
+        if self._db is None:
+            self._db = TenantFirestore(client, self.config['TENANT_COLLECTION'], self.tenant_id) if self.tenant_id else client
+        if not self._mirrors_started:
+            self.start_mirrors(self._db)
+        return self._db
+
+    @property
+    def async_db(self):
+        """Async Firestore client for the ASGI app, scoped like `db`."""
+        client = self.services.async_db
+        if client is None:
+            return None
+        if self._async_db is None:
+            self._async_db = TenantFirestore(client, self.config['TENANT_COLLECTION'], self.tenant_id) if self.tenant_id else client
+        return self._async_db
+
+    def start_mirrors(self, db):
+        with self._lock:
+            if self._mirrors_started:
+                return
+            self._mirrors_started = True
+        if not self.config['FIRESTORE_MIRROR']:
+            return
+        for name in MIRRORED_COLLECTIONS:
+            self.mirrors[name] = CollectionMirror(db.collection(name), f"{self.tenant_id}/{name}" if self.tenant_id else name)
+        self.mirrors['menu'].subscribe(self.menu_cache)
+        for mirror in self.mirrors.values():
+            mirror.start()
+
+    def memory_estimate(self):
+        """Rough bytes held by this tenant's caches, for the cross-tenant memory budget."""
+        # The snapshot and both search indexes each hold about one copy of the
+        # menu, and the menu mirror another
+        menu_copies = 4 if 'menu' in self.mirrors else 3
+        sessions = self._session_store.memory_estimate() if self._session_store is not None else 0
+        return self.menu_cache.memory_estimate() * menu_copies + sessions + self.response_cache.memory_estimate()
+
+    def close(self):
+        """Stop the mirrors; the caches are dropped with this object."""
+        for mirror in self.mirrors.values():
+            mirror.stop()
+
+
+class AppState:
+    """Everything one app instance serves from, built from its config.
+
+    Firebase and the LLM chain come from `services` on first use and are
+    shared by every restaurant, as are the LLM gateway, the upload slots and
+    the asset workers. Per-restaurant caches and stores live in `TenantState`s:
+    `default` for the untenanted routes, `tenant(id)` for /api/<id>/...
+    """
+
+    def __init__(self, config, dumps):
+        self.config = config
+        self.dumps = dumps
+        self.services = Services(config, self.get_session_history)
+
+        # LLM calls run on a bounded pool; shed calls get the local recommender instead
+        self.llm_gateway = LLMGateway(
+            max_concurrency=config['LLM_MAX_CONCURRENCY'],
+            max_queue=config['LLM_MAX_QUEUE'],
+            queue_timeout=config['LLM_QUEUE_TIMEOUT'],
+            call_timeout=config['LLM_TIMEOUT'],
+            breaker=CircuitBreaker(config['LLM_BREAKER_FAILURES'], config['LLM_BREAKER_RESET_SECONDS']),
+            async_max_concurrency=config['ASYNC_LLM_MAX_CONCURRENCY'],
+            async_max_queue=config['ASYNC_LLM_MAX_QUEUE'],
+        )
+
+        # Uploads may only occupy UPLOAD_CONCURRENCY workers at a time
+        self.upload_slots = threading.BoundedSemaphore(config['UPLOAD_CONCURRENCY'])
+
+        # Workers post-processing uploads, shared by every tenant's asset pipeline
+        self.asset_executor = ThreadPoolExecutor(max_workers=config['ASSET_WORKERS'], thread_name_prefix='asset-pipeline')
+
+        self.default = TenantState(self)
+        self.tenants = TenantRegistry(
+            lambda tenant_id: TenantState(self, tenant_id),
+            self.default,
+            max_active=config['TENANT_MAX_ACTIVE'],
+            memory_budget=config['TENANT_MEMORY_BUDGET_BYTES'],
+            min_idle=config['TENANT_MIN_IDLE_SECONDS'],
+            # Without an allowlist, only restaurants with a document are served
+            exists=None if config['TENANTS'] else self.tenant_registered,
+        )
+
+    def tenant(self, tenant_id=None):
+        return self.tenants.get(tenant_id)
+
+    def tenant_registered(self, tenant_id):
+        """Whether `TENANT_COLLECTION/<tenant_id>` exists in Firestore."""
+        client = self.services.db
+        if client is None:
+            return False
+        return client.collection(self.config['TENANT_COLLECTION']).document(tenant_id).get().exists
+
+    def get_session_history(self, session_id, tenant_id=None):
+        return self.tenant(tenant_id).session_store.get(session_id)
+
+    @property
+    def db(self):
+        return self.default.db
+
+    @property
+    def conversation_chain(self):
+        return self.services.chain
+
+    def warm_in_background(self):
+        """Create the external clients (and start the default mirrors) off the request path."""
+        return self.services.warm_in_background(on_ready=lambda: self.db)
+
+    def readiness(self):
+        services = self.services.status()
+        ready = all(status['status'] != 'cold' for status in services.values())
+        return ready, {**services, "mirrors": {name: mirror.ready for name, mirror in self.default.mirrors.items()}}
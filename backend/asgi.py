@@ -0,0 +1,482 @@
+"""ASGI entry point: chat and menu reads on an event loop, every other route through Flask.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+GET /api/menu, POST /api/recommend and POST /api/recommend/stream (and
+their /api/<restaurant id>/... forms) are served natively: Firestore is read
+with the async client and the LLM is called with the chain's `ainvoke` /
+`astream`, so a chat session waiting on the provider holds no thread and one
+process can keep thousands of them open. They share the Flask app's state
+(caches, sessions, LLM gateway and breaker) and answer exactly like its
+routes. Everything else, including uploads and their file I/O, runs on the
+unchanged Flask app in a pool of ASGI_WSGI_WORKERS threads.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from contextlib import aclosing
+
+from a2wsgi import WSGIMiddleware
+from flask import current_app, g
+
+import app as backend
+from llm_gateway import LLMUnavailable
+from metrics import HTTP_REQUEST_SECONDS
+from observability import REQUEST_ID_RE, observe_llm_call
+from single_flight import FlightAbandoned
+from tenants import UnknownTenant, is_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Routes served on the event loop; anything else goes to the Flask app
+NATIVE_ROUTE_RE = re.compile(r'^/api/(?:(?P<tenant>[^/]+)/)?(?P<route>menu|recommend/stream|recommend)$')
+
+# Chat requests are a message and a session id; anything bigger is refused
+MAX_BODY_BYTES = 64 * 1024
+
+# Same CORS headers flask-cors adds to the Flask routes
+EXPOSE_HEADERS = 'ETag, X-Menu-Epoch, X-Menu-Revision, X-Request-Id'
+
+ERROR_MESSAGE = "An error occurred while processing your request."
+
+
+class RequestRejected(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class NativeRequest:
+    def __init__(self, scope, receive):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = b''
+        self._receive = receive
+
+    async def read(self):
+        body = bytearray()
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_BYTES:
+                raise RequestRejected(413, "Request body too large.")
+            if not message.get('more_body'):
+                break
+        self.body = bytes(body)
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+
+class NativeResponse:
+    """A complete body, or (`stream`) an async iterator of strings sent as they come."""
+
+    def __init__(self, body=b'', status=200, headers=None, media_type='application/json', stream=None):
+        self.body = body
+        self.status = status
+        self.headers = dict(headers or {})
+        if media_type:
+            self.headers['Content-Type'] = media_type
+        self.stream = stream
+
+    def _start(self):
+        headers = [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in self.headers.items()]
+        if self.stream is None:
+            headers.append((b'content-length', str(len(self.body)).encode('latin-1')))
+        return {'type': 'http.response.start', 'status': self.status, 'headers': headers}
+
+    async def send(self, send, receive):
+        await send(self._start())
+        if self.stream is None:
+            await send({'type': 'http.response.body', 'body': self.body})
+            return
+        # The request body has been read, so the next message is the client going away
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            async for chunk in self.stream:
+                if disconnected.done():
+                    # Closing the stream stops pulling tokens from the LLM
+                    return
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await self.stream.aclose()
+
+
+def json_response(payload, status=200, headers=None):
+    # Serialized by Flask, so bodies match jsonify() byte for byte
+    return NativeResponse(current_app.json.response(payload).get_data(), status, headers)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def resolve_session_id(request, data):
+    # Same rules as the Flask routes
+    session_id = data.get('sessionId') or request.headers.get('x-session-id')
+    if session_id and backend.SESSION_ID_RE.match(session_id):
+        return session_id
+    return uuid.uuid4().hex
+
+
+async def offload(fn, *args):
+    # Sessions persisted to SQLite (SESSION_DB_PATH) are read and written off the loop;
+    # in-memory ones are a dictionary lookup
+    if current_app.config['SESSION_DB_PATH']:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def firestore_client():
+    """The restaurant's (sync) Firestore client, or None; its mirrors feed the menu snapshot.
+
+    Importing firebase_admin and creating the clients takes seconds, so the
+    first request does that on a thread instead of stalling the loop.
+    """
+    services = backend.state().services
+    if not (services.ready('firebase') and services.ready('firestore_async')):
+        await asyncio.to_thread(lambda: services.async_db)
+    return backend.tenant().db
+
+
+async def conversation_chain():
+    services = backend.state().services
+    if not services.ready('chain'):
+        await asyncio.to_thread(lambda: services.chain)
+    return services.chain
+
+
+async def load_menu_items(tenant):
+    return [{'id': doc.id, **doc.to_dict()} async for doc in tenant.async_db.collection('menu').stream()]
+
+
+async def menu_payload(tenant):
+    """`(payload, etag)` of the menu; a cold snapshot is filled through the async client."""
+    cache = tenant.menu_cache
+    if cache.warm:
+        # Only calls the blocking loader if the snapshot expires in between
+        return cache.get_payload(backend.load_menu_items)
+    # Concurrent misses share one load, as in the Flask app
+    items, _ = await tenant.async_flights.do('menu', lambda: load_menu_items(tenant))
+    return cache.get_payload(lambda: items)
+
+
+async def prepare_recommendation(tenant, user_message, session_id):
+    # The Flask helper reads the menu from the snapshot; fill it first without
+    # blocking the loop. With the snapshot cache off it reads Firestore itself.
+    if await firestore_client() and tenant.menu_cache.enabled and not tenant.menu_cache.warm:
+        try:
+            await menu_payload(tenant)
+        except Exception:
+            logger.exception("Error fetching menu items for AI")
+    # Always on a thread: besides the session history it builds the menu context
+    # and may search the retrieval index, either of which can take a while
+    return await asyncio.to_thread(backend.prepare_recommendation, user_message, session_id)
+
+
+async def read_chat_request(request):
+    # Returns (error response or None, chain, message, session id)
+    chain = await conversation_chain()
+    if not chain:
+        return json_response({"error": "AI recommendations are not available."}, 503), None, None, None
+    data = request.json()
+    if not isinstance(data, dict) or not data.get('message'):
+        return json_response({"error": "No message provided."}, 400), None, None, None
+    return None, chain, data['message'], resolve_session_id(request, data)
+
+
+async def get_menu(request):
+    try:
+        tenant = backend.tenant()
+        if not await firestore_client():
+            logger.warning("Firebase not available for fetching menu items. Returning empty array.")
+            return json_response([])
+        # Revision first, so it never claims changes the payload lacks. It is read
+        # from the shared change log file, so off the loop.
+        revision = await asyncio.to_thread(lambda: tenant.menu_changes.revision)
+        payload, etag = await menu_payload(tenant)
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': current_app.config['READ_CACHE_CONTROL'],
+            'X-Menu-Epoch': tenant.menu_changes.epoch,
+            'X-Menu-Revision': str(revision),
+        }
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return NativeResponse(b'', 304, headers, media_type=None)
+        return NativeResponse(payload, 200, headers)
+    except Exception as e:
+        logger.exception("Error fetching menu items")
+        return json_response({"error": str(e)}, 500)
+
+
+async def recommend(request):
+    try:
+        error, chain, user_message, session_id = await read_chat_request(request)
+        if error:
+            return error
+        tenant = backend.tenant()
+        gateway = backend.state().llm_gateway
+        ai_response_text, cacheable = await offload(backend.cached_reply, session_id, user_message)
+        fallback = False
+
+        if ai_response_text is None:
+            full_prompt_input, config = await prepare_recommendation(tenant, user_message, session_id)
+
+            async def invoke():
+                prompt = await offload(backend.prompt_text, full_prompt_input, session_id)
+                started = time.perf_counter()
+                response = await gateway.ainvoke(lambda: chain.ainvoke(full_prompt_input, config=config))
+                text = getattr(response, 'content', response)
+                observe_llm_call('invoke', time.perf_counter() - started, prompt, text, session_id)
+                return text
+
+            try:
+                if cacheable:
+                    ai_response_text, shared = await tenant.async_flights.do(backend.reply_flight_key(user_message), invoke)
+                    if shared:
+                        await offload(backend.record_exchange, session_id, user_message, ai_response_text)
+                    else:
+                        tenant.response_cache.put(user_message, ai_response_text)
+                else:
+                    ai_response_text = await invoke()
+            except LLMUnavailable as e:
+                ai_response_text = await offload(backend.fallback_reply, session_id, user_message, e.reason)
+                fallback = True
+
+        ai_response = {"response": ai_response_text, "sessionId": session_id}
+        if fallback:
+            ai_response["fallback"] = True
+        return json_response(ai_response)
+    except Exception:
+        logger.exception("Error in recommendations endpoint")
+        return json_response({"error": ERROR_MESSAGE}, 500)
+
+
+async def recommend_stream(request):
+    # Same events as the Flask route; see recommend_stream() in app.py
+    try:
+        error, chain, user_message, session_id = await read_chat_request(request)
+        if error:
+            return error
+        tenant = backend.tenant()
+        flights = tenant.async_flights
+        reply, cacheable = await offload(backend.cached_reply, session_id, user_message)
+        if reply is None:
+            full_prompt_input, config = await prepare_recommendation(tenant, user_message, session_id)
+    except Exception:
+        logger.exception("Error in streaming recommendations endpoint")
+        return json_response({"error": ERROR_MESSAGE}, 500)
+
+    async def generate_cached():
+        yield backend.sse_event("session", {"sessionId": session_id})
+        yield backend.sse_event("token", {"token": reply})
+        yield backend.sse_event("done", {})
+
+    async def generate():
+        if not (cacheable and flights.enabled):
+            async with aclosing(generate_llm()) as events:
+                async for event in events:
+                    yield event
+            return
+        key = backend.reply_flight_key(user_message)
+        future, leader = flights.join(key)
+        if not leader:
+            async with aclosing(generate_shared(future)) as events:
+                async for event in events:
+                    yield event
+            return
+        outcome = {}
+        try:
+            async with aclosing(generate_llm(outcome)) as events:
+                async for event in events:
+                    yield event
+        finally:
+            if 'reply' in outcome:
+                flights.finish(key, future, value=outcome['reply'])
+            else:
+                flights.finish(key, future, error=outcome.get('error') or FlightAbandoned("Client disconnected"))
+
+    async def generate_shared(future):
+        try:
+            shared_reply = await flights.wait(future)
+        except FlightAbandoned:
+            # The stream we were waiting on was cut short; make our own call
+            async with aclosing(generate_llm()) as events:
+                async for event in events:
+                    yield event
+            return
+        except LLMUnavailable as e:
+            async with aclosing(generate_fallback(e.reason)) as events:
+                async for event in events:
+                    yield event
+            return
+        except Exception:
+            logger.exception("Error streaming recommendation")
+            yield backend.sse_event("session", {"sessionId": session_id})
+            yield backend.sse_event("error", {"error": ERROR_MESSAGE})
+            return
+        await offload(backend.record_exchange, session_id, user_message, shared_reply)
+        yield backend.sse_event("session", {"sessionId": session_id})
+        yield backend.sse_event("token", {"token": shared_reply})
+        yield backend.sse_event("done", {})
+
+    async def generate_fallback(reason):
+        yield backend.sse_event("session", {"sessionId": session_id})
+        yield backend.sse_event("token", {"token": await offload(backend.fallback_reply, session_id, user_message, reason)})
+        yield backend.sse_event("done", {"fallback": True})
+
+    async def generate_llm(outcome=None):
+        # Streams the LLM reply; `outcome` receives 'reply' or 'error' for sharing
+        outcome = {} if outcome is None else outcome
+        prompt = await offload(backend.prompt_text, full_prompt_input, session_id)
+        started = time.perf_counter()
+        chunks = backend.state().llm_gateway.astream(lambda: chain.astream(full_prompt_input, config=config))
+        tokens = []
+        try:
+            yield backend.sse_event("session", {"sessionId": session_id})
+            try:
+                async for chunk in chunks:
+                    token = getattr(chunk, 'content', chunk)
+                    if token:
+                        tokens.append(token)
+                        yield backend.sse_event("token", {"token": token})
+            except LLMUnavailable as e:
+                if tokens:
+                    raise
+                # Nothing sent yet, so the local recommender can still answer
+                outcome['error'] = e
+                yield backend.sse_event("token", {"token": await offload(backend.fallback_reply, session_id, user_message, e.reason)})
+                yield backend.sse_event("done", {"fallback": True})
+                return
+            outcome['reply'] = "".join(tokens)
+            observe_llm_call('stream', time.perf_counter() - started, prompt, outcome['reply'], session_id)
+            if cacheable:
+                tenant.response_cache.put(user_message, outcome['reply'])
+            yield backend.sse_event("done", {})
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client went away; closing `chunks` below cancels the LLM call
+            logger.info("Client disconnected from recommendation stream", extra={"sessionId": session_id})
+            raise
+        except Exception as e:
+            outcome['error'] = e
+            logger.exception("Error streaming recommendation")
+            yield backend.sse_event("error", {"error": ERROR_MESSAGE})
+        finally:
+            await chunks.aclose()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return NativeResponse(headers=headers, media_type='text/event-stream',
+                          stream=generate() if reply is None else generate_cached())
+
+
+class AsgiApp:
+    """Serves `flask_app` over ASGI, with the chat and menu read routes native to the event loop."""
+
+    ROUTES = {
+        ('GET', 'menu'): get_menu,
+        ('POST', 'recommend'): recommend,
+        ('POST', 'recommend/stream'): recommend_stream,
+    }
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_WORKERS'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        handler, tenant_id, route = self.resolve(scope)
+        if handler is None or not await self.registered(tenant_id):
+            await self.wsgi(scope, receive, send)
+            return
+        await self.serve(handler, tenant_id, route, scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        # Nothing to set up: the Flask app is built on import and warms up its clients itself
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def resolve(self, scope):
+        # Returns (handler, tenant id, route label); no handler means Flask serves it
+        match = NATIVE_ROUTE_RE.match(scope['path']) if scope['type'] == 'http' else None
+        handler = match and self.ROUTES.get((scope['method'], match['route']))
+        if not handler:
+            return None, None, None
+        tenant_id = match['tenant']
+        if tenant_id is None:
+            return handler, None, f"/api/{match['route']}"
+        allowed = self.flask_app.config['TENANTS']
+        if not is_tenant_id(tenant_id) or (allowed and tenant_id not in allowed):
+            # Flask answers these as it always has (404, or one of its own routes)
+            return None, None, None
+        return handler, tenant_id, f"/api/<tenant:restaurant_id>/{match['route']}"
+
+    async def registered(self, tenant_id):
+        # A restaurant's first request may look up its document in Firestore; unknown
+        # ids are left to Flask, which answers 404
+        tenants = self.flask_app.extensions['menuart'].tenants
+        if tenants.is_active(tenant_id):
+            return True
+        try:
+            await asyncio.to_thread(tenants.get, tenant_id)
+        except UnknownTenant:
+            return False
+        return True
+
+    async def serve(self, handler, tenant_id, route, scope, receive, send):
+        request = NativeRequest(scope, receive)
+        incoming = request.headers.get('x-request-id', '')
+        request_id = incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        started = time.perf_counter()
+        status = 500
+        # An app context makes the Flask helpers (and their LocalProxies) work here;
+        # it lives in this task's context, so concurrent requests don't share it
+        with self.flask_app.app_context():
+            g.tenant_id = tenant_id
+            g.request_id = request_id
+            try:
+                try:
+                    await request.read()
+                    response = await handler(request)
+                except RequestRejected as e:
+                    response = json_response({"error": str(e)}, e.status)
+                except Exception:
+                    logger.exception("Error serving %s", route)
+                    response = json_response({"error": ERROR_MESSAGE}, 500)
+                response.headers['X-Request-Id'] = request_id
+                if 'origin' in request.headers:
+                    response.headers['Access-Control-Allow-Origin'] = '*'
+                    response.headers['Access-Control-Expose-Headers'] = EXPOSE_HEADERS
+                status = response.status
+                await response.send(send, receive)
+            finally:
+                # Streamed responses are timed until their last chunk, as in Flask
+                seconds = time.perf_counter() - started
+                HTTP_REQUEST_SECONDS.observe(seconds, method=request.method, route=route, status=status)
+                logger.info("request", extra={
+                    "method": request.method, "path": request.path, "route": route,
+                    "status": status, "durationMs": round(seconds * 1000, 1),
+                })
+
+
+app = AsgiApp(backend.app)
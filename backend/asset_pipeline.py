@@ -0,0 +1,126 @@
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from blob_store import COMPRESSIBLE_EXTENSIONS
+from glb_optimizer import GLBError, build_lods
+from image_variants import ImageError, image_width, render_variant, variant_widths
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Unreferenced blobs are looked for at most this often (seconds)
+SWEEP_INTERVAL = 3600
+
+
+class AssetPipeline:
+    """Post-processes uploads on a worker pool, off the request thread.
+
+    Jobs read a stored blob, derive optimized variants from it, store those
+    variants in the blob store and hand their names to a callback. The
+    callback is responsible for attaching (and so retaining) the variants.
+
+    Pipelines of several blob stores (one per restaurant) can share one
+    `executor`, so the worker count stays fixed however many tenants are active.
+
+    With an `orphan_grace`, new uploads also trigger (at most hourly) a sweep
+    that deletes blobs nothing has referenced for that many seconds.
+    """
+
+    def __init__(self, blob_store, max_workers=2, executor=None, orphan_grace=0):
+        self.blob_store = blob_store
+        self.orphan_grace = orphan_grace
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = 0.0
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asset-pipeline')
+        # Concurrent requests for the same missing image variant render it once
+        self._renders = SingleFlight()
+
+    def submit_model_lods(self, blob_name, on_done):
+        """Build the LODs of a GLB blob (see build_lods); calls `on_done(blob_name, {level: blob})`."""
+        return self._executor.submit(self._build_model_lods, blob_name, on_done)
+
+    def _build_model_lods(self, blob_name, on_done):
+        try:
+            with open(self.blob_store.local_path(blob_name), 'rb') as f:
+                data = f.read()
+            lods = {}
+            for level, model in build_lods(data).items():
+                lods[level] = self.blob_store.put_stream(io.BytesIO(model), 'glb')
+            on_done(blob_name, lods)
+        except GLBError as e:
+            logger.info("Skipping LOD generation for %s: %s", blob_name, e)
+        except Exception:
+            logger.exception("Error generating LODs for %s", blob_name)
+
+    def placed(self, blob_name):
+        """Called by the blob store for every newly stored blob."""
+        if blob_name.rsplit('.', 1)[1] in COMPRESSIBLE_EXTENSIONS:
+            # Brotli/gzip at level 9 takes seconds on a large GLB; until the
+            # sidecars exist, the uncompressed file is served
+            self.submit_sidecars(blob_name)
+        self.submit_sweep()
+
+    def submit_sweep(self):
+        """Delete long-unreferenced blobs, unless that was done within SWEEP_INTERVAL."""
+        if not self.orphan_grace:
+            return None
+        with self._sweep_lock:
+            now = time.monotonic()
+            if now < self._next_sweep:
+                return None
+            self._next_sweep = now + min(SWEEP_INTERVAL, self.orphan_grace)
+        return self._executor.submit(self._sweep)
+
+    def _sweep(self):
+        try:
+            swept = self.blob_store.sweep(self.orphan_grace)
+            if swept:
+                logger.info("Deleted %d unreferenced uploads", len(swept))
+        except Exception:
+            logger.exception("Error deleting unreferenced uploads")
+
+    def submit_sidecars(self, blob_name):
+        """Precompress a GLB/glTF blob into its `.br`/`.gz` sidecars."""
+        return self._executor.submit(self._write_sidecars, blob_name)
+
+    def _write_sidecars(self, blob_name):
+        try:
+            self.blob_store.write_sidecars(blob_name)
+        except FileNotFoundError as e:
+            logger.info("Skipping sidecars for %s: %s", blob_name, e)
+        except Exception:
+            logger.exception("Error precompressing %s", blob_name)
+
+    def submit_image_variants(self, blob_name, widths, formats, on_done):
+        """Render an image blob at `widths` in `formats`; calls `on_done(blob_name, widths actually rendered)`."""
+        return self._executor.submit(self._build_image_variants, blob_name, widths, formats, on_done)
+
+    def _build_image_variants(self, blob_name, widths, formats, on_done):
+        try:
+            rendered = variant_widths(image_width(self.blob_store.local_path(blob_name)), widths)
+            for fmt in formats:
+                for width in rendered:
+                    self.image_variant(blob_name, width, fmt)
+            on_done(blob_name, rendered)
+        except (ImageError, FileNotFoundError) as e:
+            logger.info("Skipping image variants for %s: %s", blob_name, e)
+        except Exception:
+            logger.exception("Error generating image variants for %s", blob_name)
+
+    def image_variant(self, blob_name, width, fmt):
+        """Path of the cached `width` px `fmt` copy of an image blob, rendering it if needed."""
+        variant = f"{width}.{fmt}"
+        path = self.blob_store.derived_path(blob_name, variant)
+        if not os.path.exists(path):
+            self._renders.do(path, lambda: self.blob_store.write_derived(
+                blob_name, variant, render_variant(self.blob_store.local_path(blob_name), width, fmt)))
+        return path
+
+    def shutdown(self, wait=True):
+        if self._owns_executor:
+            self._executor.shutdown(wait=wait)
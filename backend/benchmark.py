@@ -0,0 +1,459 @@
+"""Reproducible benchmarks for the API, run in-process against local fakes.
+
+Each scenario builds its own app with `create_app()` on an in-memory
+FakeFirestore, a temporary uploads directory and the deterministic fake LLM,
+so results only depend on this code and the machine. Latencies are measured
+around Flask's test client, or calls straight into the ASGI app for async
+mode (no network or server in between).
+
+Run from the backend directory:
+    python benchmark.py [--only menu_read,upload] [--requests 200] [--output results.json]
+    python benchmark.py --compare baseline.json   # also print changes against an earlier run
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The default app built on import must not start warming up real Firebase/OpenAI clients
+os.environ.setdefault('WARM_ON_START', '0')
+
+import app as backend
+from fakes import FakeFirestore, fake_llm
+from glb_optimizer import write_glb
+from menu_search import MenuSearchIndex
+
+MENU_SIZES = (10, 100, 1000)
+UPLOAD_MB = 4
+PHOTO_SIZE = (3000, 2000)  # a 6 MP phone photo
+THUMBNAIL_WIDTH = 320
+CATEGORIES = ('Starters', 'Mains', 'Desserts', 'Drinks')
+SEARCH_ITEMS = 10000
+SEARCH_QUERIES = (
+    'chicken', 'chiken', 'spicy burg', 'grilled salmon', 'choc', 'vegan curry price<15',
+    'price<10', 'tofu noodles', 'lemonade', 'smoky brisket sandwich', 'garlic', 'pasta price>=12',
+)
+ADJECTIVES = ('Spicy', 'Grilled', 'Crispy', 'Smoky', 'Creamy', 'Roasted', 'Vegan', 'Garlic', 'Honey', 'Zesty', 'Classic', 'Tandoori')
+MAINS = ('Chicken', 'Beef', 'Salmon', 'Tofu', 'Brisket', 'Shrimp', 'Lamb', 'Mushroom', 'Halloumi', 'Pork', 'Falafel', 'Chocolate')
+DISHES = ('Burger', 'Curry', 'Noodles', 'Pasta', 'Salad', 'Sandwich', 'Tacos', 'Pizza', 'Bowl', 'Wrap', 'Lemonade', 'Risotto')
+CHAT_SESSIONS = (100, 1000)  # chat streams in flight at once in async mode
+CHAT_TOKEN_SECONDS = 0.01  # simulated provider latency per streamed character
+CHAT_REPLY = "Try the Dish 7, a customer favourite!"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(name, params, latencies, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "params": params,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "throughput": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def run_load(app, requests, concurrency, send):
+    """Call `send(client, i)` `requests` times from `concurrency` threads; return (latencies, errors, seconds)."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        nonlocal errors
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        response = send(local.client, i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def menu_item(i):
+    return {
+        "id": f"item-{i:05d}",
+        "name": f"Dish {i}",
+        "description": f"House special number {i} with seasonal sides and a signature sauce.",
+        "price": f"${5 + i % 30}.{i % 100:02d}",
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "modelUrl": "",
+        "imageUrl": "",
+    }
+
+
+def seeded_db(items):
+    db = FakeFirestore()
+    menu = db.collection('menu')
+    for i in range(items):
+        item = menu_item(i)
+        menu.document(item['id']).set(item)
+    for category in CATEGORIES:
+        db.collection('categories').document().set({"name": category})
+    return db
+
+
+def make_app(workdir, db, **config):
+    # Quiet logs: one JSON line per request would dominate the measurements
+    return backend.create_app({
+        'FIRESTORE_CLIENT': db,
+        'LLM': fake_llm(),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'BLOB_INDEX_PATH': os.path.join(workdir, 'blob_index.sqlite3'),
+        'MENU_CHANGES_DB_PATH': os.path.join(workdir, 'menu_changes.sqlite3'),
+        'WARM_ON_START': False,
+        'LOG_LEVEL': 'WARNING',
+        **config,
+    })
+
+
+def bench_menu_read(workdir, requests, concurrency):
+    results = []
+    for items in MENU_SIZES:
+        for cached in (True, False):
+            config = {} if cached else {'MENU_CACHE_TTL': 0, 'FIRESTORE_MIRROR': False}
+            app = make_app(workdir, seeded_db(items), **config)
+            app.test_client().get('/api/menu')  # warm-up
+            run = run_load(app, requests, concurrency, lambda client, i: client.get('/api/menu'))
+            results.append(summarize('menu_read', {"items": items, "cached": cached, "concurrency": concurrency}, *run))
+    return results
+
+
+def search_item(i, rng):
+    adjective, main, dish = rng.choice(ADJECTIVES), rng.choice(MAINS), rng.choice(DISHES)
+    return {
+        "id": f"item-{i:05d}",
+        "name": f"{adjective} {main} {dish}",
+        "description": f"{rng.choice(ADJECTIVES)} {main.lower()} with {rng.choice(MAINS).lower()} and house sauce, location {i % 97}.",
+        "price": f"${rng.randint(3, 40)}.{rng.randint(0, 99):02d}",
+        "category": CATEGORIES[i % len(CATEGORIES)],
+        "subcategory": dish,
+    }
+
+
+def bench_search(workdir, requests, concurrency):
+    rng = random.Random(42)
+    items = [search_item(i, rng) for i in range(SEARCH_ITEMS)]
+
+    # The index alone, single-threaded: the latency the endpoint adds on top of Flask
+    index = MenuSearchIndex()
+    started = time.perf_counter()
+    index.reset(items)
+    build_seconds = time.perf_counter() - started
+    latencies = []
+    started = time.perf_counter()
+    for i in range(max(requests, 1000)):
+        query = SEARCH_QUERIES[i % len(SEARCH_QUERIES)]
+        query_started = time.perf_counter()
+        index.search(query, limit=20)
+        latencies.append(time.perf_counter() - query_started)
+    result = summarize('search_index', {"items": SEARCH_ITEMS}, latencies, 0, time.perf_counter() - started)
+    result["build_ms"] = round(build_seconds * 1000, 1)
+
+    # Incremental updates: replace one item, then search the updated index
+    latencies = []
+    started = time.perf_counter()
+    for i in range(requests):
+        update_started = time.perf_counter()
+        index.upsert({**items[i], "name": f"Updated {items[i]['name']}"})
+        index.search(SEARCH_QUERIES[i % len(SEARCH_QUERIES)], limit=20)
+        latencies.append(time.perf_counter() - update_started)
+    update = summarize('search_index_update', {"items": SEARCH_ITEMS}, latencies, 0, time.perf_counter() - started)
+
+    db = FakeFirestore()
+    menu = db.collection('menu')
+    for item in items:
+        menu.document(item['id']).set(item)
+    app = make_app(workdir, db)
+    app.test_client().get('/api/menu/search?q=warm')
+    run = run_load(app, requests, concurrency, lambda client, i: client.get(
+        '/api/menu/search', query_string={'q': SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}))
+    endpoint = summarize('search', {"items": SEARCH_ITEMS, "concurrency": concurrency}, *run)
+    return [result, update, endpoint]
+
+
+def synthetic_glb(size, seed):
+    # Deterministic, unique per seed, so the blob store can't deduplicate uploads
+    binary = random.Random(seed).randbytes(size)
+    return write_glb({"asset": {"version": "2.0"}, "buffers": [{"byteLength": len(binary)}]}, binary)
+
+
+def bench_upload(workdir, requests, concurrency):
+    uploads = max(4, min(requests, 32))
+    size = UPLOAD_MB * 1024 * 1024
+    models = [synthetic_glb(size, seed) for seed in range(uploads)]
+    app = make_app(workdir, FakeFirestore(), UPLOAD_CONCURRENCY=concurrency)
+
+    def send(client, i):
+        return client.post('/api/upload', data={'file': (io.BytesIO(models[i]), f'model-{i}.glb')})
+
+    latencies, errors, seconds = run_load(app, uploads, concurrency, send)
+    result = summarize('upload', {"megabytes": UPLOAD_MB, "concurrency": concurrency}, latencies, errors, seconds)
+    result["megabytes_per_second"] = round(sum(len(model) for model in models) / (1024 * 1024) / seconds, 2)
+    return [result]
+
+
+def bench_recommend(workdir, requests, concurrency):
+    results = []
+    for cached in (False, True):
+        config = {} if cached else {'RESPONSE_CACHE_MAX_ENTRIES': 0}
+        app = make_app(workdir, seeded_db(100), SESSION_DB_PATH=None, **config)
+        app.test_client().post('/api/recommend', json={"message": "warm up"})
+
+        def send(client, i):
+            # Every request opens a new session; with the cache on, their shared
+            # first question is answered from it after the first call
+            return client.post('/api/recommend', json={"message": "What do you recommend?"})
+
+        run = run_load(app, requests, concurrency, send)
+        results.append(summarize('recommend', {"menuItems": 100, "responseCache": cached, "concurrency": concurrency}, *run))
+    return results
+
+
+def asgi_post(asgi_app, path, payload):
+    """POST `payload` as JSON straight to an ASGI app; return (status, body)."""
+    body = json.dumps(payload).encode('utf-8')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode('latin-1'), 'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1'))],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 5000),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    finished = asyncio.Event()
+    response = {'status': None, 'body': []}
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            return
+        response['body'].append(message.get('body', b''))
+        if not message.get('more_body'):
+            finished.set()
+
+    async def run():
+        await asgi_app(scope, receive, send)
+        finished.set()
+        return response['status'], b''.join(response['body'])
+
+    return run()
+
+
+def run_asgi_load(asgi_app, requests, concurrency, send):
+    """Like run_load, but with up to `concurrency` requests in flight on one event loop.
+
+    `send(asgi_app, i)` returns a coroutine resolving to (status, body).
+    """
+    async def run():
+        latencies, errors = [], 0
+        slots = asyncio.Semaphore(concurrency)
+        await send(asgi_app, -1)  # warm-up
+
+        async def one(i):
+            nonlocal errors
+            async with slots:
+                started = time.perf_counter()
+                status, _ = await send(asgi_app, i)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return latencies, errors, time.perf_counter() - started
+
+    return asyncio.run(run())
+
+
+def bench_chat(workdir, requests, concurrency):
+    # Streaming chat against a slow provider: the Flask app with one thread per
+    # session (`concurrency` of them) versus the ASGI app on a single event loop
+    from asgi import AsgiApp
+    config = {
+        'LLM': fake_llm([CHAT_REPLY], sleep=CHAT_TOKEN_SECONDS),
+        'RESPONSE_CACHE_MAX_ENTRIES': 0,
+        'SESSION_DB_PATH': None,
+        'LLM_MAX_CONCURRENCY': concurrency,
+        'ASYNC_LLM_MAX_CONCURRENCY': max(CHAT_SESSIONS),
+        'LLM_QUEUE_TIMEOUT': 60,
+    }
+    payload = {"message": "What do you recommend?"}
+    params = {"menuItems": 100, "replyChars": len(CHAT_REPLY), "tokenSeconds": CHAT_TOKEN_SECONDS}
+    results = []
+
+    app = make_app(workdir, seeded_db(100), **config)
+    app.test_client().post('/api/recommend/stream', json=payload).get_data()
+
+    def send(client, i):
+        # Timed until the last event: the test client only reads the stream on demand
+        response = client.post('/api/recommend/stream', json=payload)
+        response.get_data()
+        return response
+
+    run = run_load(app, requests, concurrency, send)
+    results.append(summarize('chat_stream', {**params, "mode": "wsgi", "sessions": concurrency}, *run))
+
+    for sessions in (concurrency, *CHAT_SESSIONS):
+        # A fresh app per run: asyncio primitives belong to the loop they were first used on
+        asgi_app = AsgiApp(make_app(workdir, seeded_db(100), **config))
+        run = run_asgi_load(asgi_app, max(requests, sessions), sessions,
+                            lambda asgi_app, i: asgi_post(asgi_app, '/api/recommend/stream', payload))
+        results.append(summarize('chat_stream', {**params, "mode": "asgi", "sessions": sessions}, *run))
+    return results
+
+
+def synthetic_photo(size, seed):
+    # Smooth gradients with blurred noise: compresses about like a real photo
+    from PIL import Image, ImageFilter
+    random.seed(seed)
+    gradient = Image.merge('RGB', [Image.linear_gradient('L').rotate(angle).resize(size) for angle in (0, 90, 45)])
+    noise = Image.effect_noise(size, 40).convert('RGB').filter(ImageFilter.GaussianBlur(0.6))
+    out = io.BytesIO()
+    Image.blend(gradient, noise, 0.5).save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def bench_images(workdir, requests, concurrency):
+    photo = synthetic_photo(PHOTO_SIZE, 0)
+    app = make_app(workdir, FakeFirestore())
+    with app.app_context():
+        blob = backend.state().default.blob_store.put_stream(io.BytesIO(photo), 'jpg')
+        formats = backend.image_variants.available_formats(app.config['IMAGE_FORMATS'])
+    client = app.test_client()
+    results = []
+    for fmt in formats:
+        # First request for a width renders it; distinct widths keep every request cold
+        widths = [THUMBNAIL_WIDTH + 32 * i for i in range(min(requests, 40))]
+        latencies = []
+        started = time.perf_counter()
+        for width in widths:
+            request_started = time.perf_counter()
+            response = client.get(f'/uploads/{blob}/{width}.{fmt}')
+            latencies.append(time.perf_counter() - request_started)
+        result = summarize('image_render', {"format": fmt, "source": f"{PHOTO_SIZE[0]}x{PHOTO_SIZE[1]}"},
+                           latencies, 0, time.perf_counter() - started)
+        thumbnail = client.get(f'/uploads/{blob}/{THUMBNAIL_WIDTH}.{fmt}').data
+        result["original_bytes"] = len(photo)
+        result[f"bytes_{THUMBNAIL_WIDTH}w"] = len(thumbnail)
+        result["reduction"] = round(len(photo) / len(thumbnail), 1)
+        results.append(result)
+
+    run = run_load(app, requests, concurrency, lambda client, i: client.get(f'/uploads/{blob}/{THUMBNAIL_WIDTH}.{formats[-1]}'))
+    results.append(summarize('image_cached', {"format": formats[-1], "concurrency": concurrency}, *run))
+    return results
+
+
+BENCHMARKS = {
+    'menu_read': bench_menu_read,
+    'upload': bench_upload,
+    'recommend': bench_recommend,
+    'search': bench_search,
+    'images': bench_images,
+    'chat': bench_chat,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=backend.BACKEND_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline):
+    """Print p95 and throughput changes against a previous run's results."""
+    previous = {result_key(result): result for result in baseline["results"]}
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+        throughput = (result["throughput"] / before["throughput"] - 1) * 100 if before["throughput"] else 0.0
+        print(f"{result['name']:<10} {json.dumps(result['params'], sort_keys=True):<60} "
+              f"p95 {before['p95_ms']:>9.3f} -> {result['p95_ms']:>9.3f} ms ({p95:+.1f}%)  "
+              f"throughput {throughput:+.1f}%", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario (default 200)")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads (default 8)")
+    parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = []
+    for name in names:
+        workdir = tempfile.mkdtemp(prefix=f'menuart-bench-{name}-')
+        try:
+            results.extend(BENCHMARKS[name](workdir, args.requests, args.concurrency))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "createdAt": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
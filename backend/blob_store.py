@@ -0,0 +1,315 @@
+import glob
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from werkzeug.utils import secure_filename
+
+from storage_backends import mkstemp, tenant_path
+from uploads import UploadSpool
+
+try:
+    import brotli
+except ImportError:  # optional; only the .gz sidecar is produced without it
+    brotli = None
+
+CHUNK_SIZE = 1024 * 1024
+
+# Not every platform's mimetypes table knows the glTF types
+mimetypes.add_type('model/gltf-binary', '.glb')
+mimetypes.add_type('model/gltf+json', '.gltf')
+
+# Formats worth precompressing. Images are already compressed, and GLBs with
+# embedded textures may not shrink either, so sidecars are only kept if smaller.
+COMPRESSIBLE_EXTENSIONS = {'glb', 'gltf'}
+
+# Content-Encoding -> sidecar suffix, in order of preference
+SIDECAR_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Files derived from a blob (resized images), deleted along with it
+DERIVED_DIR = 'derived'
+
+# Blob names are "<sha256 hex>.<ext>"
+BLOB_NAME_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+def is_blob_name(name):
+    return bool(name) and BLOB_NAME_RE.match(name) is not None
+
+
+class BlobStore:
+    """Content-addressed, deduplicated storage for uploaded models and images.
+
+    Files are stored once under the SHA-256 of their body. Menu items hold
+    references to blobs through their asset URLs; the reference counts live in
+    a small SQLite index (outside the served directory) so they are shared by
+    every worker process. A blob is deleted when its last reference goes away.
+
+    New blobs and derived files are published to `storage` (see
+    storage_backends.py), which decides where clients download them from.
+
+    Each restaurant (`tenant_id`) gets its own store rooted in its own folder.
+    The stores share the index file, with reference counts kept per tenant, so
+    one tenant's deletes never touch another's files.
+
+    The index also records when each blob was last stored. Blobs that are
+    never referenced (an upload nobody attached, an item that failed to save)
+    are deleted by `sweep` once they are older than a grace period.
+    """
+
+    def __init__(self, root, index_path, storage=None, tenant_id=None):
+        self.root = root
+        self.index_path = index_path
+        self.storage = storage
+        self.tenant_id = tenant_id
+        self._url_prefix = tenant_path(tenant_id)
+        self._lock = threading.Lock()
+        # Set by the asset pipeline, which post-processes new blobs off the request
+        # thread; without one (e.g. in scripts) sidecars are written inline.
+        self.on_placed = None
+        os.makedirs(os.path.join(root, DERIVED_DIR), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS blob_refs (name TEXT PRIMARY KEY, refs INTEGER NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS blob_stored (name TEXT PRIMARY KEY, stored REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=10)
+
+    def _ref_key(self, name):
+        # Row name in the shared index; untenanted blobs keep their bare names
+        return f"{self._url_prefix}{name}"
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def local_path(self, name):
+        """Path of a blob on this host, fetched from remote storage if another replica stored it."""
+        path = self.path(name)
+        if os.path.exists(path) or self.storage is None or not self.storage.remote:
+            return path
+        fd, tmp_path = mkstemp(self.root, '.fetch-')
+        os.close(fd)
+        try:
+            self.storage.fetch(name, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def publish(self, key, path):
+        """Make a local file available to clients at `storage.url(key)`."""
+        if self.storage is not None:
+            self.storage.publish(key, path, mimetypes.guess_type(key)[0])
+
+    def derived_path(self, name, variant):
+        """Where a file derived from blob `name` (e.g. variant `320.webp`) is cached."""
+        return os.path.join(self.root, DERIVED_DIR, f"{name}-{variant}")
+
+    def write_derived(self, name, variant, data):
+        path = self.derived_path(name, variant)
+        fd, tmp_path = mkstemp(os.path.dirname(path), '.derived-')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.replace(tmp_path, path)
+        self.publish(f"{name}/{variant}", path)
+        return path
+
+    def put(self, file_storage):
+        """Store an uploaded file and return its blob name.
+
+        The body is hashed while it is copied to a temp file, so the upload is
+        never held in memory; the temp file is renamed into place only if the
+        content isn't stored already.
+        """
+        filename = secure_filename(file_storage.filename or '')
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+        if isinstance(file_storage.stream, UploadSpool):
+            return self._adopt(file_storage.stream, ext)
+        return self.put_stream(file_storage.stream, ext)
+
+    def _adopt(self, spool, ext):
+        # The spool was hashed while the request body streamed in, so it only
+        # needs renaming into place (same directory, hence atomic).
+        spool.finish()
+        name = f"{spool.hexdigest()}.{ext}"
+        if self._place(spool.path, name):
+            spool.adopted = True
+            self._placed(name)
+        return name
+
+    def put_stream(self, stream, ext):
+        digest = hashlib.sha256()
+        fd, tmp_path = mkstemp(self.root, '.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            name = f"{digest.hexdigest()}.{ext}"
+            if self._place(tmp_path, name):
+                self._placed(name)
+            else:
+                os.remove(tmp_path)
+            return name
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _place(self, tmp_path, name):
+        """Rename a finished upload into place unless the blob exists; True if it was placed.
+
+        Either way the blob's stored time is refreshed, in the same transaction,
+        so a concurrent sweep can't delete a blob that was just uploaded again.
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT INTO blob_stored (name, stored) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET stored = excluded.stored',
+                (self._ref_key(name), time.time()),
+            )
+            if os.path.exists(self.path(name)):
+                return False
+            os.replace(tmp_path, self.path(name))
+            return True
+
+    def _placed(self, name):
+        self.publish(name, self.path(name))
+        if self.on_placed is not None:
+            self.on_placed(name)
+        elif name.rsplit('.', 1)[1] in COMPRESSIBLE_EXTENSIONS:
+            self.write_sidecars(name)
+
+    def write_sidecars(self, name):
+        """Precompress a blob into `.br`/`.gz` files served by Accept-Encoding."""
+        source = self.path(name)
+        original_size = os.path.getsize(source)
+        for encoding, suffix in SIDECAR_ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            with open(source, 'rb') as src:
+                fd, tmp_path = mkstemp(self.root, '.sidecar-')
+                with os.fdopen(fd, 'wb') as out:
+                    if encoding == 'br':
+                        compressor = brotli.Compressor(quality=9)
+                        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                            out.write(compressor.process(chunk))
+                        out.write(compressor.finish())
+                    else:
+                        # mtime=0 keeps the .gz bytes (and so its ETag) reproducible
+                        with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as gz:
+                            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                                gz.write(chunk)
+            with self._lock:
+                # The blob may have been released while it was compressing
+                keep = os.path.exists(source) and os.path.getsize(tmp_path) < original_size
+                if keep:
+                    os.replace(tmp_path, source + suffix)
+            if not keep:
+                os.remove(tmp_path)
+
+    def encoded_variant(self, name, accept_encodings):
+        """Pick the best precompressed sidecar the client accepts.
+
+        Returns `(filename, content_encoding)`; the encoding is None when the
+        original file should be served.
+        """
+        for encoding, suffix in SIDECAR_ENCODINGS:
+            if accept_encodings[encoding] and os.path.exists(self.path(name) + suffix):
+                return name + suffix, encoding
+        return name, None
+
+    def name_from_url(self, url):
+        """Return the blob name an asset URL points at, or None for other URLs."""
+        if not url or '/uploads/' not in url:
+            return None
+        name = url.rsplit('/uploads/', 1)[1].split('?', 1)[0]
+        if self._url_prefix:
+            # Only this tenant's blobs count; other namespaces never match
+            if not name.startswith(self._url_prefix):
+                return None
+            name = name[len(self._url_prefix):]
+        return name if is_blob_name(name) else None
+
+    def retain(self, name):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO blob_refs (name, refs) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET refs = refs + 1',
+                (self._ref_key(name),),
+            )
+
+    def release(self, name):
+        """Drop one reference; the blob is deleted when none are left."""
+        key = self._ref_key(name)
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute('SELECT refs FROM blob_refs WHERE name = ?', (key,)).fetchone()
+            if row is None:
+                # Not tracked (e.g. uploaded but never attached); leave it alone
+                return
+            if row[0] > 1:
+                conn.execute('UPDATE blob_refs SET refs = refs - 1 WHERE name = ?', (key,))
+                return
+            conn.execute('DELETE FROM blob_refs WHERE name = ?', (key,))
+            self._delete(conn, name)
+
+    def discard(self, name):
+        """Delete a blob nothing references (e.g. a derived variant that was never attached)."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute('SELECT refs FROM blob_refs WHERE name = ?', (self._ref_key(name),)).fetchone()
+            if row is None:
+                self._delete(conn, name)
+
+    def sweep(self, grace, dry_run=False):
+        """Delete blobs that have had no references for `grace` seconds since they were stored.
+
+        Blobs from before the index recorded stored times are dated by this
+        call, so they are collected by a sweep `grace` seconds later. Returns
+        the names deleted (or, with `dry_run`, those that would be).
+        """
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            stored = dict(conn.execute('SELECT name, stored FROM blob_stored'))
+            referenced = {row[0] for row in conn.execute('SELECT name FROM blob_refs')}
+            orphans = []
+            for name in os.listdir(self.root):
+                key = self._ref_key(name)
+                if not is_blob_name(name) or key in referenced:
+                    continue
+                if key not in stored:
+                    if not dry_run:
+                        conn.execute('INSERT INTO blob_stored (name, stored) VALUES (?, ?)', (key, now))
+                elif stored[key] <= now - grace:
+                    orphans.append(name)
+            if not dry_run:
+                for name in orphans:
+                    self._delete(conn, name)
+        return orphans
+
+    def _delete(self, conn, name):
+        # Caller holds the lock and an open transaction on the index
+        conn.execute('DELETE FROM blob_stored WHERE name = ?', (self._ref_key(name),))
+        for suffix in ('',) + tuple(suffix for _, suffix in SIDECAR_ENCODINGS):
+            if os.path.exists(self.path(name) + suffix):
+                os.remove(self.path(name) + suffix)
+        for path in glob.glob(glob.escape(self.derived_path(name, '')) + '*'):
+            os.remove(path)
+        if self.storage is not None:
+            self.storage.unpublish(name)
+
+    def refs(self, name):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT refs FROM blob_refs WHERE name = ?', (self._ref_key(name),)).fetchone()
+        return row[0] if row else 0
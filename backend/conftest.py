@@ -0,0 +1,3 @@
+# Lets `pytest` run from backend/: puts the modules on sys.path (rootdir conftest)
+# and skips test_api.py, a manual script against a running server.
+collect_ignore = ['test_api.py']
@@ -0,0 +1,439 @@
+"""Local stand-ins for external services, for tests, benchmarks and offline development."""
+import copy
+import hashlib
+import hmac
+import io
+import threading
+import time
+import urllib.parse
+import uuid
+from enum import Enum
+
+from google.api_core.exceptions import InvalidArgument, NotFound
+from google.cloud.firestore_v1.transforms import ArrayRemove, ArrayUnion
+from langchain_core.language_models.fake import FakeStreamingListLLM
+
+FAKE_LLM_RESPONSES = [
+    "I'd recommend our most popular dish - it's a customer favourite!",
+    "If you'd like something lighter, one of our starters would be a great choice.",
+]
+
+
+def fake_llm(responses=None, sleep=None):
+    """Deterministic LLM that cycles through canned replies and streams them per character."""
+    return FakeStreamingListLLM(responses=responses or FAKE_LLM_RESPONSES, sleep=sleep)
+
+
+class ChangeType(Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class FakeDocumentChange:
+    def __init__(self, type, document):
+        self.type = type
+        self.document = document
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, id, data):
+        self.id = id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeWatch:
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._collection.watches.discard(self)
+
+
+def _apply_write(old, data, merge):
+    # New document contents for a set/update, resolving ArrayUnion/ArrayRemove
+    new = dict(old) if merge and old is not None else {}
+    for field, value in copy.deepcopy(data).items():
+        current = new.get(field) if isinstance(new.get(field), list) else []
+        if isinstance(value, ArrayUnion):
+            value = current + [item for item in value.values if item not in current]
+        elif isinstance(value, ArrayRemove):
+            value = [item for item in current if item not in value.values]
+        new[field] = value
+    return new
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, id):
+        self._collection = collection
+        self.id = id
+
+    def get(self):
+        with self._collection.client.lock:
+            self._collection.client.reads += 1
+            return FakeDocumentSnapshot(self.id, self._collection.docs.get(self.id))
+
+    def set(self, data, merge=False):
+        batch = self._collection.client.batch()
+        batch.set(self, data, merge=merge)
+        batch.commit()
+
+    def update(self, data):
+        batch = self._collection.client.batch()
+        batch.update(self, data)
+        batch.commit()
+
+    def delete(self):
+        batch = self._collection.client.batch()
+        batch.delete(self)
+        batch.commit()
+
+    def collection(self, name):
+        # Subcollections are flat collections keyed by their full path
+        return self._collection.client.collection(f"{self._collection.name}/{self.id}/{name}")
+
+
+class FakeWriteBatch:
+    """Applies its writes all at once on commit, or none of them if one fails."""
+
+    MAX_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []  # (document reference, kind, data, merge)
+
+    def set(self, reference, data, merge=False):
+        self._writes.append((reference, 'set', data, merge))
+
+    def update(self, reference, data):
+        self._writes.append((reference, 'update', data, True))
+
+    def delete(self, reference):
+        self._writes.append((reference, 'delete', None, False))
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise InvalidArgument(f"maximum {self.MAX_WRITES} writes allowed per request")
+        with self._client.lock:
+            staged = {}  # (collection name, id) -> (collection, new contents or None)
+            for reference, kind, data, merge in self._writes:
+                collection = reference._collection
+                key = (collection.name, reference.id)
+                old = staged[key][1] if key in staged else collection.docs.get(reference.id)
+                if kind == 'delete':
+                    new = None
+                elif kind == 'update' and old is None:
+                    raise NotFound(f"No document to update: {collection.name}/{reference.id}")
+                else:
+                    new = _apply_write(old, data, merge)
+                staged[key] = (collection, new)
+            self._client.commits += 1
+            for (_, id), (collection, new) in staged.items():
+                if new is not None or id in collection.docs:
+                    collection.write(id, new)
+        self._writes = []
+
+
+FILTER_OPERATORS = {
+    '==': lambda value, operand: value == operand,
+    '!=': lambda value, operand: value != operand,
+    '<': lambda value, operand: value is not None and value < operand,
+    '<=': lambda value, operand: value is not None and value <= operand,
+    '>': lambda value, operand: value is not None and value > operand,
+    '>=': lambda value, operand: value is not None and value >= operand,
+    'in': lambda value, operand: value in operand,
+    'array_contains': lambda value, operand: isinstance(value, list) and operand in value,
+}
+
+
+class FakeQuery:
+    """Immutable query over a fake collection: where / order_by / start_after / limit / select."""
+
+    def __init__(self, collection, filters=(), order=None, cursor=None, count=None, fields=None):
+        self._collection = collection
+        self._filters = filters
+        self._order = order
+        self._cursor = cursor
+        self._count = count
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, cursor=self._cursor, count=self._count, fields=self._fields)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, FILTER_OPERATORS[op_string], value),))
+
+    def order_by(self, field_path):
+        return self._copy(order=field_path)
+
+    def start_after(self, values):
+        return self._copy(cursor=values)
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def stream(self):
+        collection = self._collection
+        with collection.client.lock:
+            docs = list(collection.docs.items())
+            docs = [
+                (id, data) for id, data in docs
+                if all(test(data.get(field), operand) for field, test, operand in self._filters)
+            ]
+            if self._order:
+                key = (lambda pair: pair[0]) if self._order == '__name__' else (lambda pair: pair[1].get(self._order))
+                docs.sort(key=key)
+                if self._cursor is not None:
+                    after = self._cursor[self._order]
+                    docs = [pair for pair in docs if key(pair) > after]
+            if self._count is not None:
+                docs = docs[:self._count]
+            if self._fields is not None:
+                docs = [(id, {field: data[field] for field in self._fields if field in data}) for id, data in docs]
+            collection.client.reads += len(docs) or 1
+            return [FakeDocumentSnapshot(id, data) for id, data in docs]
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(self)
+        self.client = client
+        self.name = name
+        self.docs = {}  # document id -> dict, in insertion order
+        self.watches = set()
+
+    def document(self, id=None):
+        return FakeDocumentReference(self, id or uuid.uuid4().hex[:20])
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(self, callback)
+        with self.client.lock:
+            self.watches.add(watch)
+            callback(self._snapshots(), [], None)
+        return watch
+
+    def write(self, id, data):
+        # Caller holds the client lock; listeners are notified synchronously
+        old = self.docs.get(id)
+        if data is None:
+            del self.docs[id]
+            change = ChangeType.REMOVED
+        else:
+            self.docs[id] = data
+            change = ChangeType.ADDED if old is None else ChangeType.MODIFIED
+        changes = [FakeDocumentChange(change, FakeDocumentSnapshot(id, data if data is not None else old))]
+        for watch in list(self.watches):
+            watch._callback(self._snapshots(), changes, None)
+
+    def _snapshots(self):
+        return [FakeDocumentSnapshot(id, data) for id, data in self.docs.items()]
+
+
+class FakeFirestore:
+    """In-memory Firestore client covering what the API uses.
+
+    Supports documents (get/set/update/delete, ArrayUnion/ArrayRemove),
+    subcollections, write batches, simple queries (`where`,
+    `order_by`, `start_after`, `limit`, `select`, `stream`) and
+    `collection.on_snapshot()`. Snapshot callbacks run synchronously on the
+    writing thread, which keeps tests deterministic. `reads` counts document
+    reads like Firestore billing does, and `drop_listeners()` simulates a
+    broken listen stream.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.collections = {}
+        self.reads = 0
+        self.commits = 0  # write requests (a batch counts once)
+
+    def collection(self, name):
+        with self.lock:
+            if name not in self.collections:
+                self.collections[name] = FakeCollectionReference(self, name)
+            return self.collections[name]
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def drop_listeners(self):
+        with self.lock:
+            for collection in self.collections.values():
+                for watch in list(collection.watches):
+                    watch.unsubscribe()
+
+
+class FakeAsyncFirestore:
+    """Async view of a FakeFirestore (or a reference, query or batch from one),
+    as `firestore_async.client()` is of `firestore.client()`.
+
+    Same data: reads and writes are awaited and `stream()` is an async
+    iterator, while references, queries and batch writes are built
+    synchronously, as with the real async client.
+    """
+
+    AWAITED = {'get', 'set', 'create', 'update', 'delete', 'commit'}
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            args = [arg._target if isinstance(arg, FakeAsyncFirestore) else arg for arg in args]
+            return attr(*args, **kwargs)
+
+        if name == 'stream':
+            async def stream(*args, **kwargs):
+                for snapshot in call(*args, **kwargs):
+                    yield snapshot
+            return stream
+        # A batch's writes are only queued; its commit is what's awaited
+        if name in self.AWAITED and (name == 'commit' or not isinstance(self._target, FakeWriteBatch)):
+            async def awaited(*args, **kwargs):
+                return call(*args, **kwargs)
+            return awaited
+        return lambda *args, **kwargs: FakeAsyncFirestore(call(*args, **kwargs))
+
+
+class FakeStorageBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control = None
+        self.content_type = None
+
+    @property
+    def size(self):
+        data = self.bucket.objects.get(self.name)
+        return None if data is None else len(data[0])
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, 'rb') as f:
+            self.upload_from_string(f.read(), content_type)
+
+    def upload_from_string(self, data, content_type=None):
+        with self.bucket.lock:
+            self.content_type = content_type or self.content_type
+            self.bucket.objects[self.name] = (bytes(data), {
+                'contentType': self.content_type, 'cacheControl': self.cache_control})
+            self.bucket.uploads += 1
+
+    def _data(self):
+        try:
+            return self.bucket.objects[self.name][0]
+        except KeyError:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}") from None
+
+    def download_to_filename(self, filename):
+        data = self._data()
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    def open(self, mode='rb'):
+        return io.BytesIO(self._data())
+
+    def delete(self):
+        with self.bucket.lock:
+            if self.bucket.objects.pop(self.name, None) is None:
+                raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+    def generate_signed_url(self, version='v4', expiration=None, method='GET', content_type=None, headers=None):
+        expires = int(time.time() + expiration.total_seconds())
+        query = {
+            'X-Goog-Expires': str(expires),
+            'X-Goog-Method': method,
+            'X-Goog-Content-Type': content_type or '',
+            'X-Goog-Length-Range': (headers or {}).get('x-goog-content-length-range', ''),
+        }
+        query['X-Goog-Signature'] = self.bucket.sign(self.name, query)
+        return f"https://storage.fake/{self.bucket.name}/{urllib.parse.quote(self.name)}?{urllib.parse.urlencode(query)}"
+
+
+class FakeBucket:
+    """In-memory Cloud Storage bucket covering what storage_backends.BucketStorage uses.
+
+    Objects are kept as bytes with their metadata. Signed URLs are HMACs over
+    the object name, method, expiry, content type and length range, and
+    `put_signed(url, data, headers)` plays the client's PUT to one: it checks
+    all of those like Cloud Storage would, raising PermissionError (403) or
+    ValueError (400).
+    """
+
+    def __init__(self, name='fake-bucket'):
+        self.name = name
+        self.lock = threading.RLock()
+        self.objects = {}  # object name -> (bytes, metadata)
+        self.uploads = 0
+        self._key = uuid.uuid4().bytes
+
+    def blob(self, name):
+        return FakeStorageBlob(self, name)
+
+    def get_blob(self, name):
+        with self.lock:
+            if name not in self.objects:
+                return None
+            blob = FakeStorageBlob(self, name)
+            blob.content_type = self.objects[name][1]['contentType']
+            blob.cache_control = self.objects[name][1]['cacheControl']
+            return blob
+
+    def list_blobs(self, prefix=''):
+        with self.lock:
+            return [self.blob(name) for name in sorted(self.objects) if name.startswith(prefix)]
+
+    def delete_blobs(self, blobs, on_error=None):
+        for blob in blobs:
+            try:
+                blob.delete()
+            except NotFound:
+                if on_error is None:
+                    raise
+                on_error(blob)
+
+    def sign(self, name, query):
+        fields = [name] + [query[key] for key in sorted(query) if key != 'X-Goog-Signature']
+        return hmac.new(self._key, '\n'.join(fields).encode(), hashlib.sha256).hexdigest()
+
+    def put_signed(self, url, data, headers=None):
+        parsed = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        prefix = f"/{self.name}/"
+        name = urllib.parse.unquote(parsed.path[len(prefix):]) if parsed.path.startswith(prefix) else None
+        if name is None or not hmac.compare_digest(query.get('X-Goog-Signature', ''), self.sign(name, query)):
+            raise PermissionError("SignatureDoesNotMatch")
+        if query['X-Goog-Method'] != 'PUT':
+            raise PermissionError("Signed for a different method")
+        if time.time() > int(query['X-Goog-Expires']):
+            raise PermissionError("Signed URL has expired")
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if query['X-Goog-Content-Type'] and headers.get('content-type') != query['X-Goog-Content-Type']:
+            raise PermissionError("Content-Type does not match the signature")
+        if query['X-Goog-Length-Range']:
+            if headers.get('x-goog-content-length-range') != query['X-Goog-Length-Range']:
+                raise PermissionError("Length range does not match the signature")
+            low, high = (int(value) for value in query['X-Goog-Length-Range'].split(','))
+            if not low <= len(data) <= high:
+                raise ValueError("EntityTooLarge" if len(data) > high else "EntityTooSmall")
+        self.blob(name).upload_from_string(data, query['X-Goog-Content-Type'] or None)
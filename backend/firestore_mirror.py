@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionMirror:
+    """In-memory copy of a Firestore collection, kept current by `on_snapshot`.
+
+    Reads are served from memory once the first snapshot has arrived, and
+    changes made anywhere (other replicas, the Firebase console) are applied
+    as Firestore pushes them. Listeners use the same interface as the menu
+    cache's: `reset(items)` after a full (re)sync or with None when the mirror
+    drops, then `upsert(item)` / `remove(item_id)` per changed document.
+
+    A supervisor thread watches the listen stream and re-subscribes with
+    exponential backoff if it dies; the first snapshot after reconnecting is
+    a full resync. While disconnected `ready` is False and callers fall back
+    to reading Firestore directly.
+    """
+
+    def __init__(self, collection_ref, name, check_interval=5.0, max_backoff=60.0):
+        self.collection_ref = collection_ref
+        self.name = name
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self._lock = threading.RLock()
+        self._docs = {}  # document id -> dict
+        self._listeners = []
+        self._watch = None
+        self._resync = True  # next snapshot replaces everything
+        self._stop = threading.Event()
+        self._thread = None
+        self.ready = False
+        self.version = 0  # bumped on every applied change
+        self.snapshots = 0
+        self.reconnects = 0
+        self.last_snapshot_at = None
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+            if self.ready:
+                listener.reset(list(self._docs.values()))
+
+    def documents(self):
+        """Return the mirrored documents, or None while the mirror is not ready."""
+        with self._lock:
+            return list(self._docs.values()) if self.ready else None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._supervise, name=f'mirror-{self.name}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._close_watch()
+
+    def _subscribe(self):
+        with self._lock:
+            self._resync = True
+        self._watch = self.collection_ref.on_snapshot(self._on_snapshot)
+
+    def _close_watch(self):
+        watch, self._watch = self._watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+
+    def _supervise(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            if self._watch is None or not getattr(self._watch, 'is_active', True):
+                if self._watch is not None:
+                    logger.warning("Firestore listener for '%s' stopped; resubscribing.", self.name)
+                    self.reconnects += 1
+                    self._close_watch()
+                    self._drop()
+                try:
+                    self._subscribe()
+                    backoff = 1.0
+                except Exception as e:
+                    logger.warning("Error subscribing to '%s': %s", self.name, e)
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+            self._stop.wait(self.check_interval)
+
+    def _drop(self):
+        with self._lock:
+            if not self.ready:
+                return
+            self.ready = False
+            self._docs = {}
+            self.version += 1
+            for listener in self._listeners:
+                listener.reset(None)
+
+    @staticmethod
+    def _data(doc):
+        # Documents created in the console may lack the `id` field the API writes
+        data = doc.to_dict()
+        data.setdefault('id', doc.id)
+        return data
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Runs on the Firestore listen thread
+        try:
+            with self._lock:
+                self.snapshots += 1
+                self.last_snapshot_at = time.time()
+                if self._resync:
+                    self._docs = {doc.id: self._data(doc) for doc in docs}
+                    self._resync = False
+                    self.ready = True
+                    self.version += 1
+                    items = list(self._docs.values())
+                    for listener in self._listeners:
+                        listener.reset(items)
+                    return
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == 'REMOVED':
+                        if self._docs.pop(doc.id, None) is None:
+                            continue
+                        for listener in self._listeners:
+                            listener.remove(doc.id)
+                    else:
+                        data = self._data(doc)
+                        if self._docs.get(doc.id) == data:
+                            continue
+                        self._docs[doc.id] = data
+                        for listener in self._listeners:
+                            listener.upsert(data)
+                    self.version += 1
+        except Exception:
+            logger.exception("Error applying '%s' snapshot", self.name)
+            # Every snapshot carries the full document set, so start over from the
+            # next one rather than serve a partial state
+            self._drop()
+            with self._lock:
+                self._resync = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": len(self._docs),
+                "snapshots": self.snapshots,
+                "reconnects": self.reconnects,
+                "lastSnapshotAt": self.last_snapshot_at,
+            }
@@ -0,0 +1,302 @@
+import hashlib
+import io
+import json
+import struct
+import sys
+from array import array
+
+try:
+    from PIL import Image
+except ImportError:  # optional; embedded textures are left as-is without Pillow
+    Image = None
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+FLOAT = 5126
+BYTE = 5120
+UNSIGNED_SHORT = 5123
+ARRAY_BUFFER = 34962
+
+# Extensions that store data we don't know how to rewrite
+UNSUPPORTED_EXTENSIONS = {'KHR_draco_mesh_compression', 'EXT_meshopt_compression'}
+
+# (level, max texture edge in px); None keeps the original texture resolution
+LOD_LEVELS = (('low', 256), ('medium', 1024), ('high', None))
+
+
+class GLBError(ValueError):
+    """Raised for files that aren't GLB 2.0 or use features we can't optimize."""
+
+
+def read_glb(data):
+    """Split a GLB file into its glTF JSON document and BIN chunk."""
+    if len(data) < 20 or data[:4] != GLB_MAGIC:
+        raise GLBError("not a GLB file")
+    version, length = struct.unpack_from('<II', data, 4)
+    if version != 2:
+        raise GLBError(f"unsupported GLB version {version}")
+
+    gltf, binary = None, b''
+    offset = 12
+    end = min(length, len(data))
+    while offset + 8 <= end:
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON and gltf is None:
+            gltf = json.loads(bytes(chunk).decode('utf-8'))
+        elif chunk_type == CHUNK_BIN and not binary:
+            binary = bytes(chunk)
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise GLBError("GLB has no JSON chunk")
+    return gltf, binary
+
+
+def write_glb(gltf, binary):
+    json_bytes = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_bytes += b' ' * (-len(json_bytes) % 4)
+    binary += b'\0' * (-len(binary) % 4)
+    chunks = struct.pack('<II', len(json_bytes), CHUNK_JSON) + json_bytes
+    if binary:
+        chunks += struct.pack('<II', len(binary), CHUNK_BIN) + binary
+    return struct.pack('<4sII', GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+
+def _check_supported(gltf):
+    buffers = gltf.get('buffers', [])
+    if len(buffers) > 1 or any('uri' in buffer for buffer in buffers):
+        raise GLBError("external or multiple buffers are not supported")
+    used = set(gltf.get('extensionsUsed', [])) | set(gltf.get('extensionsRequired', []))
+    blocked = used & UNSUPPORTED_EXTENSIONS
+    if blocked:
+        raise GLBError(f"unsupported extensions: {', '.join(sorted(blocked))}")
+
+
+def _split_views(gltf, binary):
+    views = []
+    for view in gltf.get('bufferViews', []):
+        start = view.get('byteOffset', 0)
+        views.append(binary[start:start + view['byteLength']])
+    return views
+
+
+def _add_view(gltf, views, data, **meta):
+    gltf.setdefault('bufferViews', []).append(dict(buffer=0, byteLength=len(data), **meta))
+    views.append(data)
+    return len(views) - 1
+
+
+def _read_floats(gltf, views, accessor, components):
+    view_index = accessor['bufferView']
+    view = gltf['bufferViews'][view_index]
+    data = views[view_index]
+    offset = accessor.get('byteOffset', 0)
+    count = accessor['count']
+    stride = view.get('byteStride') or 4 * components
+    values = array('f')
+    if stride == 4 * components:
+        values.frombytes(data[offset:offset + count * stride])
+        if sys.byteorder == 'big':
+            values.byteswap()
+    else:
+        # Interleaved vertex data: pull our attribute out of each vertex
+        fmt = f'<{components}f'
+        for i in range(count):
+            values.extend(struct.unpack_from(fmt, data, offset + i * stride))
+    return values
+
+
+def _accessor_usage(gltf):
+    """Map accessor index -> the roles it plays (attribute semantics or 'OTHER')."""
+    usage = {}
+
+    def use(index, role):
+        usage.setdefault(index, set()).add(role)
+
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh.get('primitives', []):
+            for semantic, index in primitive.get('attributes', {}).items():
+                use(index, semantic)
+            if 'indices' in primitive:
+                use(primitive['indices'], 'OTHER')
+            for target in primitive.get('targets', []):
+                for index in target.values():
+                    use(index, 'OTHER')
+    for skin in gltf.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            use(skin['inverseBindMatrices'], 'OTHER')
+    for animation in gltf.get('animations', []):
+        for sampler in animation.get('samplers', []):
+            use(sampler['input'], 'OTHER')
+            use(sampler['output'], 'OTHER')
+    return usage
+
+
+def _quantize_attributes(gltf, views):
+    """Store normals as normalized bytes and texcoords as normalized shorts.
+
+    Uses KHR_mesh_quantization, which every current glTF viewer (including
+    model-viewer) supports. Positions are left alone since quantizing them
+    needs a dequantization transform on every node using the mesh.
+    """
+    accessors = gltf.get('accessors', [])
+    quantized = False
+    for index, roles in _accessor_usage(gltf).items():
+        if len(roles) != 1:
+            continue
+        role = next(iter(roles))
+        accessor = accessors[index]
+        if accessor.get('componentType') != FLOAT or 'sparse' in accessor or 'bufferView' not in accessor:
+            continue
+
+        if role == 'NORMAL' and accessor.get('type') == 'VEC3':
+            values = _read_floats(gltf, views, accessor, 3)
+            # Vertex attributes must be 4-byte aligned, so pad each normal to 4 bytes
+            packed = array('b', [0]) * (accessor['count'] * 4)
+            for i, value in enumerate(values):
+                packed[(i // 3) * 4 + i % 3] = max(-127, min(127, round(value * 127)))
+            data, component_type = packed.tobytes(), BYTE
+        elif role.startswith('TEXCOORD_') and accessor.get('type') == 'VEC2':
+            values = _read_floats(gltf, views, accessor, 2)
+            if values and (min(values) < 0.0 or max(values) > 1.0):
+                # Wrapped UVs can't be represented as normalized integers
+                continue
+            packed = array('H', [round(value * 65535) for value in values])
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            data, component_type = packed.tobytes(), UNSIGNED_SHORT
+        else:
+            continue
+
+        accessor['bufferView'] = _add_view(gltf, views, data, byteStride=4, target=ARRAY_BUFFER)
+        accessor['componentType'] = component_type
+        accessor['normalized'] = True
+        accessor.pop('byteOffset', None)
+        # min/max are optional for these semantics and would be in the old domain
+        accessor.pop('min', None)
+        accessor.pop('max', None)
+        quantized = True
+
+    if quantized:
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            extensions = gltf.setdefault(key, [])
+            if 'KHR_mesh_quantization' not in extensions:
+                extensions.append('KHR_mesh_quantization')
+
+
+def _embedded_textures(gltf):
+    # Images stored in the BIN chunk in a format we can re-encode
+    for image in gltf.get('images', []):
+        if 'bufferView' in image and image.get('mimeType') in ('image/png', 'image/jpeg'):
+            yield image
+
+
+def _downscale_textures(gltf, views, max_size):
+    if Image is None or not max_size:
+        return
+    for image in _embedded_textures(gltf):
+        mime_type = image['mimeType']
+        with Image.open(io.BytesIO(views[image['bufferView']])) as texture:
+            if max(texture.size) <= max_size:
+                continue
+            texture.thumbnail((max_size, max_size), Image.LANCZOS)
+            out = io.BytesIO()
+            if mime_type == 'image/jpeg':
+                texture.convert('RGB').save(out, 'JPEG', quality=85, optimize=True)
+            else:
+                texture.save(out, 'PNG', optimize=True)
+        image['bufferView'] = _add_view(gltf, views, out.getvalue())
+
+
+def _view_references(gltf):
+    """Yield (owner dict, key) pairs that hold a bufferView index."""
+    for accessor in gltf.get('accessors', []):
+        if 'bufferView' in accessor:
+            yield accessor, 'bufferView'
+        sparse = accessor.get('sparse')
+        if sparse:
+            yield sparse['indices'], 'bufferView'
+            yield sparse['values'], 'bufferView'
+    for image in gltf.get('images', []):
+        if 'bufferView' in image:
+            yield image, 'bufferView'
+
+
+def _pack(gltf, views):
+    """Rebuild the BIN chunk, dropping unused views and merging identical ones."""
+    new_views, payloads = [], []
+    by_content = {}
+    remap = {}
+    for owner, key in _view_references(gltf):
+        old_index = owner[key]
+        if old_index not in remap:
+            view, data = gltf['bufferViews'][old_index], views[old_index]
+            content_key = (hashlib.sha256(data).digest(), view.get('byteStride'), view.get('target'))
+            if content_key not in by_content:
+                meta = {k: v for k, v in view.items() if k not in ('buffer', 'byteOffset', 'byteLength')}
+                by_content[content_key] = len(new_views)
+                new_views.append(meta)
+                payloads.append(data)
+            remap[old_index] = by_content[content_key]
+        owner[key] = remap[old_index]
+
+    binary = bytearray()
+    for meta, data in zip(new_views, payloads):
+        # Keep every view 4-byte aligned so vertex attributes stay aligned
+        binary += b'\0' * (-len(binary) % 4)
+        meta.update(buffer=0, byteOffset=len(binary), byteLength=len(data))
+        binary += data
+
+    if new_views:
+        gltf['bufferViews'] = new_views
+        gltf['buffers'] = [{'byteLength': len(binary)}]
+    else:
+        gltf.pop('bufferViews', None)
+        gltf.pop('buffers', None)
+    return write_glb(gltf, bytes(binary))
+
+
+def optimize_glb(data, max_texture_size=None):
+    """Return an optimized copy of a GLB file.
+
+    Identical buffer views are stored once, unused ones are dropped, normals
+    and texture coordinates are quantized, and embedded textures are
+    downscaled to `max_texture_size` (when given and Pillow is installed).
+    Geometry itself is not simplified.
+    """
+    gltf, binary = read_glb(data)
+    _check_supported(gltf)
+    views = _split_views(gltf, binary)
+    _quantize_attributes(gltf, views)
+    _downscale_textures(gltf, views, max_texture_size)
+    return _pack(gltf, views)
+
+
+def _largest_texture(data):
+    """Longest edge of the textures optimize_glb could downscale (0 if there are none)."""
+    if Image is None:
+        return 0
+    gltf, binary = read_glb(data)
+    views = _split_views(gltf, binary)
+    largest = 0
+    for image in _embedded_textures(gltf):
+        with Image.open(io.BytesIO(views[image['bufferView']])) as texture:
+            largest = max(largest, *texture.size)
+    return largest
+
+
+def build_lods(data):
+    """Return {level: glb bytes} for the entries in LOD_LEVELS.
+
+    Levels only differ in texture size, so a level whose cap is no smaller
+    than the largest texture would repeat the one above it and is left out;
+    a model without (downscalable) textures just gets `high`.
+    """
+    largest = _largest_texture(data)
+    return {
+        level: optimize_glb(data, max_texture_size)
+        for level, max_texture_size in LOD_LEVELS
+        if max_texture_size is None or max_texture_size < largest
+    }
@@ -0,0 +1,106 @@
+import io
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # optional; images are only served at their original size without Pillow
+    Image = None
+
+# Uploaded image types we derive resized variants from (animated GIFs are left alone)
+SOURCE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+# Output formats, best compression first. AVIF and WebP depend on how Pillow was built.
+FORMATS = ('avif', 'webp', 'jpeg')
+MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+_PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+_SAVE_OPTIONS = {
+    'avif': {'quality': 55, 'speed': 8},  # the default speed takes seconds per photo
+    'webp': {'quality': 80, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# EXIF orientations that turn the stored image on its side
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+_ORIENTATION_TAG = 0x0112
+
+# Widths requested on demand are rounded up to a multiple of this, so the disk
+# cache holds a bounded number of variants per image
+WIDTH_STEP = 32
+
+
+class ImageError(ValueError):
+    """Raised for files Pillow can't read, or when Pillow isn't installed."""
+
+
+def available_formats(formats=FORMATS):
+    """The formats in `formats` this Pillow build can write."""
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in formats if fmt == 'jpeg' or (fmt in _PIL_FORMATS and features.check(fmt)))
+
+
+def round_width(width):
+    return -(-width // WIDTH_STEP) * WIDTH_STEP
+
+
+def _open(path, width=None):
+    if Image is None:
+        raise ImageError("Pillow is not installed")
+    try:
+        image = Image.open(path)
+        if width and image.format == 'JPEG':
+            # Let the JPEG decoder scale down by up to 8x while decoding (never below
+            # the target size), which is much faster than decoding every pixel
+            stored_width, stored_height = image.size
+            if image.getexif().get(_ORIENTATION_TAG) in _ROTATED_ORIENTATIONS:
+                # Shown on its side: the displayed width is the stored height
+                image.draft('RGB', (stored_width * width // stored_height, width))
+            else:
+                image.draft('RGB', (width, stored_height * width // stored_width))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(str(e)) from e
+    # Phone photos are often stored sideways with an EXIF rotation
+    return ImageOps.exif_transpose(image)
+
+
+def image_width(path):
+    """Displayed width of an image file, after EXIF rotation. Only reads the header."""
+    if Image is None:
+        raise ImageError("Pillow is not installed")
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            rotated = image.getexif().get(_ORIENTATION_TAG) in _ROTATED_ORIENTATIONS
+    # Malformed EXIF raises ValueError; oversized headers a DecompressionBombError
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageError(str(e)) from e
+    return height if rotated else width
+
+
+def variant_widths(source_width, widths):
+    """Widths worth generating for a source image: never wider than the source itself."""
+    selected = [width for width in sorted(widths) if width < source_width]
+    if not selected or source_width <= max(widths):
+        selected.append(source_width)
+    return selected
+
+
+def render_variant(path, width, fmt):
+    """Return the image at `path` scaled down to `width` px and encoded as `fmt`."""
+    image = _open(path, width)
+    if width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    if fmt == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            if fmt == 'jpeg':
+                # No alpha in JPEG: flatten onto white like a browser would on a white page
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+        else:
+            image = image.convert('RGB')
+    out = io.BytesIO()
+    image.save(out, _PIL_FORMATS[fmt], **_SAVE_OPTIONS[fmt])
+    return out.getvalue()
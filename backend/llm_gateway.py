@@ -0,0 +1,337 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class LLMUnavailable(Exception):
+    """The gateway shed the call; `reason` is circuit_open, queue_full, queue_timeout or timeout."""
+
+    def __init__(self, reason):
+        super().__init__(f"LLM unavailable: {reason}")
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Stops calling the LLM after `failure_threshold` failures in a row.
+
+    While open, calls are refused for `reset_timeout` seconds; then a single
+    trial call is let through (half-open), and its outcome closes or re-opens
+    the breaker.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False  # half-open trial call in flight
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def cancel(self):
+        """An allowed call never ran (e.g. it was shed by the queue)."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial:
+                    self.trips += 1
+                self._opened_at = self._clock()
+            self._trial = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self._state(), "consecutiveFailures": self._failures, "trips": self.trips}
+
+
+class LLMGateway:
+    """Runs LLM calls on a bounded pool so a slow provider can't tie up every web worker.
+
+    At most `max_concurrency` calls run at once; up to `max_queue` more wait
+    for a slot, each for at most `queue_timeout` seconds. A call that takes
+    longer than `call_timeout` (for streams: between two chunks) is abandoned
+    by the caller and counted as a failure by the circuit breaker; its slot
+    is freed once the provider returns. Shed calls raise LLMUnavailable, so
+    the caller can answer some other way.
+
+    `ainvoke`/`astream` are the same gateway for coroutines on one event loop
+    (the ASGI app). A waiting or running call holds no thread there, so they
+    have their own, usually much larger, `async_max_concurrency` and
+    `async_max_queue`; timeouts and the circuit breaker are shared. A timed
+    out async call is cancelled rather than left running.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue=16, queue_timeout=2.0, call_timeout=30.0, breaker=None,
+                 async_max_concurrency=None, async_max_queue=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.async_max_concurrency = async_max_concurrency or max_concurrency
+        self.async_max_queue = max_queue if async_max_queue is None else async_max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._async_slots = None  # asyncio.Semaphore, created on the serving loop
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.shed = {}  # reason -> count
+
+    def _shed(self, reason):
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+        return LLMUnavailable(reason)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise self._shed('circuit_open')
+        # A free slot is taken at once; only callers that have to wait count against the queue
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                full = self._waiting >= self.max_queue
+                if not full:
+                    self._waiting += 1
+            if full:
+                self.breaker.cancel()
+                raise self._shed('queue_full')
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                self.breaker.cancel()
+                raise self._shed('queue_timeout')
+        with self._lock:
+            self._running += 1
+
+    def _submit(self, fn):
+        # Outcome is recorded when the call really ends; `abandoned` keeps a late
+        # success from closing a breaker the timeout already counted against
+        abandoned = threading.Event()
+
+        def done(future):
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
+            if abandoned.is_set():
+                return
+            succeeded = future.exception() is None
+            with self._lock:
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        future = self._executor.submit(fn)
+        future.add_done_callback(done)
+        return future, abandoned
+
+    def _timed_out(self, abandoned):
+        abandoned.set()
+        self.breaker.record_failure()
+        return self._shed('timeout')
+
+    def invoke(self, fn):
+        """Return `fn()`, run on the pool."""
+        self._admit()
+        future, abandoned = self._submit(fn)
+        try:
+            return future.result(timeout=self.call_timeout)
+        except FutureTimeout:
+            raise self._timed_out(abandoned) from None
+
+    def stream(self, fn):
+        """Yield the chunks of the iterator `fn()` returns, pulled on the pool.
+
+        Closing this generator early stops pulling chunks (and closes the
+        iterator) once the next one arrives.
+        """
+        self._admit()
+        chunks = queue.Queue()
+        cancelled = threading.Event()
+
+        def pump():
+            iterator = None
+            try:
+                iterator = iter(fn())
+                for chunk in iterator:
+                    if cancelled.is_set():
+                        return
+                    chunks.put(('chunk', chunk))
+                chunks.put(('done', None))
+            except Exception as e:
+                chunks.put(('error', e))
+                raise
+            finally:
+                close = getattr(iterator, 'close', None)
+                if close:
+                    close()
+
+        _, abandoned = self._submit(pump)
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=self.call_timeout)
+                except queue.Empty:
+                    raise self._timed_out(abandoned) from None
+                if kind == 'done':
+                    return
+                if kind == 'error':
+                    raise value
+                yield value
+        finally:
+            cancelled.set()
+
+    async def _aadmit(self):
+        if not self.breaker.allow():
+            raise self._shed('circuit_open')
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.async_max_concurrency)
+        if not self._async_slots.locked():
+            # A free slot; acquiring it doesn't wait
+            await self._async_slots.acquire()
+        else:
+            with self._lock:
+                full = self._waiting >= self.async_max_queue
+                if not full:
+                    self._waiting += 1
+            if full:
+                self.breaker.cancel()
+                raise self._shed('queue_full')
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.breaker.cancel()
+                raise self._shed('queue_timeout') from None
+            except BaseException:
+                self.breaker.cancel()
+                raise
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        with self._lock:
+            self._running += 1
+
+    def _arelease(self, succeeded):
+        # succeeded is None when the call timed out or its caller went away
+        with self._lock:
+            self._running -= 1
+            if succeeded is True:
+                self.completed += 1
+            elif succeeded is False:
+                self.failed += 1
+        self._async_slots.release()
+        if succeeded is True:
+            self.breaker.record_success()
+        elif succeeded is False:
+            self.breaker.record_failure()
+        else:
+            self.breaker.cancel()
+
+    def _atimed_out(self):
+        self.breaker.record_failure()
+        return self._shed('timeout')
+
+    async def ainvoke(self, make_coro):
+        """Return the result of awaiting `make_coro()`, like `invoke`."""
+        await self._aadmit()
+        succeeded = None
+        try:
+            result = await asyncio.wait_for(make_coro(), self.call_timeout)
+        except asyncio.TimeoutError:
+            raise self._atimed_out() from None
+        except Exception:
+            succeeded = False
+            raise
+        else:
+            succeeded = True
+            return result
+        finally:
+            self._arelease(succeeded)
+
+    async def astream(self, make_aiter):
+        """Yield the chunks of the async iterator `make_aiter()` returns, like `stream`."""
+        await self._aadmit()
+        succeeded = None
+        iterator = None
+        try:
+            iterator = aiter(make_aiter())
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(iterator), self.call_timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise self._atimed_out() from None
+                yield chunk
+            succeeded = True
+        except LLMUnavailable:
+            raise
+        except Exception:
+            succeeded = False
+            raise
+        finally:
+            try:
+                close = getattr(iterator, 'aclose', None)
+                if close:
+                    await close()
+            finally:
+                self._arelease(succeeded)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "maxConcurrency": self.max_concurrency,
+                "maxQueue": self.max_queue,
+                "asyncMaxConcurrency": self.async_max_concurrency,
+                "asyncMaxQueue": self.async_max_queue,
+                "running": self._running,
+                "waiting": self._waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+                "shed": dict(self.shed),
+                "breaker": self.breaker.stats(),
+            }
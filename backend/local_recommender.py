@@ -0,0 +1,117 @@
+"""Deterministic recommendations straight from the menu, for when the LLM can't answer.
+
+Scoring follows the client-side engine in src/components/AIRecommendationEngine.tsx:
+the question's category and price range filter the menu, and items are ranked
+by keyword matches, then popularity. Answers take milliseconds and need no API key.
+"""
+import math
+import re
+
+from menu_index import tokenize
+
+# Same bands as the price filter in AIRecommendationEngine.tsx
+PRICE_BANDS = {'low': (0.0, 10.0), 'medium': (10.0, 15.0), 'high': (15.0, math.inf)}
+PRICE_WORDS = {
+    'cheap': 'low', 'budget': 'low', 'inexpensive': 'low', 'affordable': 'low',
+    'expensive': 'high', 'premium': 'high', 'fancy': 'high', 'splurge': 'high',
+}
+PRICE_MAX_RE = re.compile(r'(?:under|below|less than|cheaper than|<(?!=))\s*\$?\s*(\d+(?:\.\d+)?)')
+PRICE_UP_TO_RE = re.compile(r'(?:up to|max(?:imum)?|at most|<=)\s*\$?\s*(\d+(?:\.\d+)?)')
+PRICE_MIN_RE = re.compile(r'(?:over|above|more than|at least|>)\s*\$?\s*(\d+(?:\.\d+)?)')
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+NO_MATCH_REPLY = (
+    "I couldn't find anything on the menu that matches that. "
+    "Could you tell me a bit more about what you're in the mood for?"
+)
+
+
+def parse_price(value):
+    match = NUMBER_RE.search(str(value or '').replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def _popularity(item):
+    # Form posts store every field as a string
+    return parse_price(item.get('popularity')) or 0.0
+
+
+def _tags_text(tags):
+    if isinstance(tags, str):
+        return tags
+    return ' '.join(str(tag) for tag in tags or [])
+
+
+def _stem(token):
+    # "desserts" should match a "Dessert" category
+    return token[:-1] if len(token) > 3 and token.endswith('s') else token
+
+
+def _terms(text):
+    return {_stem(token) for token in tokenize(text)}
+
+
+def price_range(question):
+    """`(low, high)` asked for in the question ("under $15", "something cheap"), or None."""
+    text = question.lower()
+    low, high = 0.0, math.inf
+    for match in PRICE_MAX_RE.finditer(text):
+        high = min(high, float(match.group(1)))
+    for match in PRICE_UP_TO_RE.finditer(text):
+        # The upper bound is exclusive, but "up to $15" includes $15 itself
+        high = min(high, math.nextafter(float(match.group(1)), math.inf))
+    for match in PRICE_MIN_RE.finditer(text):
+        low = max(low, float(match.group(1)))
+    if (low, high) != (0.0, math.inf):
+        return low, high
+    for token in tokenize(text):
+        if token in PRICE_WORDS:
+            return PRICE_BANDS[PRICE_WORDS[token]]
+    return None
+
+
+def recommend_items(items, question, limit=3):
+    """Return up to `limit` items for the question, best first."""
+    terms = _terms(question) - set(PRICE_WORDS)
+    bounds = price_range(question)
+    scored = []
+    for item in items:
+        price = parse_price(item.get('price'))
+        if bounds and (price is None or not bounds[0] <= price < bounds[1]):
+            continue
+        score = (
+            3 * len(terms & _terms(item.get('category')))
+            + 2 * len(terms & _terms(item.get('subcategory')))
+            + 2 * len(terms & _terms(item.get('name')))
+            + 2 * len(terms & _terms(_tags_text(item.get('tags'))))
+            + len(terms & _terms(item.get('description')))
+        )
+        scored.append((score, item, price))
+    if any(score for score, _, _ in scored):
+        # The question named something on the menu; don't pad with unrelated items
+        scored = [entry for entry in scored if entry[0]]
+    scored.sort(key=lambda entry: (
+        -entry[0],
+        -_popularity(entry[1]),
+        entry[2] if entry[2] is not None else math.inf,
+        str(entry[1].get('name') or ''),
+    ))
+    return [item for _, item, _ in scored[:limit]]
+
+
+def recommendation_text(items):
+    if not items:
+        return NO_MATCH_REPLY
+    lines = ["Here are a few dishes you might enjoy:"]
+    for item in items:
+        line = f"- {item.get('name', 'Unnamed dish')}"
+        if item.get('price'):
+            line += f" ({item['price']})"
+        if item.get('description'):
+            line += f": {item['description']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def recommend(items, question, limit=3):
+    return recommendation_text(recommend_items(items, question, limit))
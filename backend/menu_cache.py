@@ -0,0 +1,255 @@
+import hashlib
+import json
+import threading
+import time
+
+
+def content_etag(payload):
+    """Strong validator derived from the response body.
+
+    Hashing the content (rather than using a per-process revision) keeps the
+    ETag identical across workers and restarts, so CDN edges can revalidate
+    against any replica.
+    """
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+class MenuCache:
+    """In-process snapshot of the `menu` collection.
+
+    The snapshot is loaded from Firestore once and then patched in place by the
+    menu write endpoints, so the hot GET /api/menu path is a dictionary lookup
+    plus a pre-serialized payload. The TTL is only a safety net for edits made
+    outside this process (e.g. in the Firebase console); when a Firestore
+    mirror feeds the cache through `reset`/`upsert`/`remove`, it stays live
+    without expiring.
+    """
+
+    def __init__(self, ttl=300, dumps=json.dumps, flight=None):
+        # ttl <= 0 disables caching entirely (every read goes to Firestore)
+        self.ttl = ttl
+        self._dumps = dumps
+        self._flight = flight  # SingleFlight shared by concurrent misses, if any
+        self._lock = threading.RLock()
+        self._items = None  # item id -> item dict, None while cold
+        self._payload = None  # serialized list of items, rebuilt lazily
+        self._etag = None  # content hash of _payload
+        self._derived = {}  # name -> value computed from the current snapshot
+        self._version = 0  # bumped whenever the snapshot contents change
+        self._loaded_at = 0.0
+        self._generation = 0  # bumped on every write so stale loads are dropped
+        self._listeners = []  # indexes kept in sync with the snapshot
+        self._live = False  # fed by a snapshot listener, so the TTL doesn't apply
+        self.hits = 0
+        self.misses = 0
+
+    def subscribe(self, listener):
+        """Keep `listener` in sync with the snapshot.
+
+        Listeners get `reset(items)` whenever the snapshot is (re)loaded or
+        dropped (items is None then), and `upsert(item)` / `remove(item_id)`
+        for each write, so they can update incrementally instead of rebuilding.
+        A write while the snapshot is cold (or the cache is disabled) can't be
+        applied, so listeners get `reset(None)` for it instead.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            if self._items is not None:
+                listener.reset(list(self._items.values()))
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @property
+    def warm(self):
+        """Whether reads are served from the snapshot right now, without calling a loader."""
+        with self._lock:
+            return self.enabled and self._is_warm()
+
+    def _is_warm(self):
+        if self._items is None:
+            return False
+        return self._live or (time.monotonic() - self._loaded_at) < self.ttl
+
+    def _serialize(self):
+        if self._payload is None:
+            self._payload = f"{self._dumps(list(self._items.values()))}\n".encode('utf-8')
+            self._etag = content_etag(self._payload)
+        return self._payload, self._etag
+
+    def get_payload(self, loader):
+        """Return `(payload, etag)` for the serialized menu, calling `loader()` on a miss."""
+        with self._lock:
+            if self.enabled and self._is_warm():
+                self.hits += 1
+                return self._serialize()
+            self.misses += 1
+        if self._flight is None:
+            return self._load(loader)
+        # Concurrent misses (a burst of QR scans on a cold cache) share one load
+        return self._flight.do('menu', lambda: self._load(loader))[0]
+
+    def _load(self, loader):
+        with self._lock:
+            if self.enabled and self._is_warm():
+                # Filled by a load that finished while this one was waiting to start
+                return self._serialize()
+            generation = self._generation
+
+        # Load outside the lock so writers and other readers are not blocked
+        items = loader()
+
+        with self._lock:
+            if not self.enabled or generation != self._generation:
+                # A write landed while we were loading; serve what we read but
+                # don't let it overwrite the newer snapshot state.
+                payload = f"{self._dumps(items)}\n".encode('utf-8')
+                return payload, content_etag(payload)
+            self._fill(items)
+            return self._serialize()
+
+    def get_items(self, loader):
+        """Return a list of menu item dicts, calling `loader()` on a miss."""
+        with self._lock:
+            if self.enabled and self._is_warm():
+                self.hits += 1
+                return list(self._items.values())
+        self.get_payload(loader)
+        with self._lock:
+            if self._items is not None:
+                return list(self._items.values())
+        return loader()
+
+    def get_item(self, item_id):
+        """Return a cached item or None (also None while the cache is cold)."""
+        with self._lock:
+            if self._is_warm():
+                return self._items.get(item_id)
+        return None
+
+    def get_derived(self, name, build, loader):
+        """Return `build(items)`, computed once per snapshot version and reused.
+
+        Used for values that are expensive to derive from the menu (such as
+        the LLM menu context); any menu write drops them along with the payload.
+        """
+        with self._lock:
+            warm = self.enabled and self._is_warm()
+            if warm and name in self._derived:
+                self.hits += 1
+                return self._derived[name]
+        if not warm:
+            self.get_payload(loader)
+        with self._lock:
+            if not (self.enabled and self._is_warm()):
+                return build(loader())
+            items, version = list(self._items.values()), self._version
+        # Build outside the lock; only keep the result if no write landed meanwhile
+        value = build(items)
+        with self._lock:
+            if version == self._version:
+                self._derived[name] = value
+        return value
+
+    def _changed(self):
+        self._version += 1
+        self._payload = None
+        self._derived = {}
+
+    def _fill(self, items):
+        self._items = {item.get('id'): item for item in items}
+        self._changed()
+        self._loaded_at = time.monotonic()
+        for listener in self._listeners:
+            listener.reset(items)
+
+    def reset(self, items):
+        """Replace the snapshot with a live feed's full state (None when the feed drops)."""
+        with self._lock:
+            if items is None:
+                self._live = False
+                self.invalidate()
+                return
+            self._generation += 1
+            self._live = True
+            self._fill(list(items))
+
+    def _cold_write(self):
+        # Caller holds the lock. Nothing to patch, but listeners derived from the
+        # menu (e.g. cached replies) must still drop what they hold.
+        for listener in self._listeners:
+            listener.reset(None)
+
+    def upsert(self, item):
+        """Write-through for a full item document (POST /api/menu)."""
+        with self._lock:
+            self._generation += 1
+            if self._items is None:
+                self._cold_write()
+            elif self._items.get(item['id']) != item:
+                self._items[item['id']] = dict(item)
+                self._changed()
+                for listener in self._listeners:
+                    listener.upsert(self._items[item['id']])
+
+    def merge(self, item_id, fields):
+        """Write-through for a partial update (PUT /api/menu/<id>)."""
+        with self._lock:
+            self._generation += 1
+            if self._items is None:
+                self._cold_write()
+                return
+            if item_id in self._items:
+                merged = dict(self._items[item_id])
+                merged.update(fields)
+                if merged == self._items[item_id]:
+                    return  # e.g. the mirror already delivered this write
+                self._items[item_id] = merged
+                self._changed()
+                for listener in self._listeners:
+                    listener.upsert(merged)
+            else:
+                # Firestore update() on a missing doc fails, so we shouldn't
+                # get here; drop the snapshot rather than guess.
+                self.invalidate()
+
+    def remove(self, item_id):
+        """Write-through for DELETE /api/menu/<id>."""
+        with self._lock:
+            self._generation += 1
+            if self._items is None:
+                self._cold_write()
+            elif self._items.pop(item_id, None) is not None:
+                self._changed()
+                for listener in self._listeners:
+                    listener.remove(item_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._items = None
+            self._changed()
+            for listener in self._listeners:
+                listener.reset(None)
+
+    def memory_estimate(self):
+        """Rough bytes held by the snapshot: the size of its serialized payload."""
+        with self._lock:
+            if self._items is None:
+                return 0
+            return len(self._serialize()[0])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl": self.ttl,
+                "live": self._live,
+                "warm": self._is_warm(),
+                "items": len(self._items) if self._items is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+
+
+def _encode(item):
+    # Canonical form, so the same item seen by two workers compares equal
+    return json.dumps(item, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class MenuChangeLog:
+    """Revisioned log of menu changes, for clients that sync incrementally.
+
+    Subscribed to the menu snapshot like the search indexes, so it sees the
+    write endpoints, the Firestore mirror and TTL reloads alike. The log lives
+    in a SQLite file shared by every worker process (`db_path`): it holds the
+    latest state of each item with the revision it last changed at, and each
+    worker diffs what it sees against it, so a change is recorded once however
+    many workers observe it and any worker can answer a delta. Deleted items
+    are kept as tombstones; once more than `max_entries` changes are newer
+    than a tombstone it is dropped, and a client whose revision is older than
+    that has to fetch the full menu again.
+
+    `epoch` identifies the log file, so a client that synced against a
+    log that has since been deleted is told to resync. `revision` is what this
+    worker's snapshot has caught up with, which is what the menu endpoints
+    report next to the payload they serve from it.
+    """
+
+    def __init__(self, db_path, max_entries=1000, namespace=None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.namespace = namespace or ''
+        self._lock = threading.Lock()
+        self._items = None  # item id -> encoded item, this worker's snapshot
+        self._synced = 0  # revision this worker's snapshot has caught up with
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')  # readers don't wait for a writer
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS menu_logs '
+                '(namespace TEXT PRIMARY KEY, epoch TEXT NOT NULL, revision INTEGER NOT NULL, '
+                'floor INTEGER NOT NULL, loaded INTEGER NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS menu_changes '
+                '(namespace TEXT NOT NULL, item_id TEXT NOT NULL, revision INTEGER NOT NULL, item TEXT, '
+                'PRIMARY KEY (namespace, item_id))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS menu_changes_revision ON menu_changes (namespace, revision)')
+            conn.execute(
+                'INSERT OR IGNORE INTO menu_logs VALUES (?, ?, 0, 0, 0)', (self.namespace, uuid.uuid4().hex[:12])
+            )
+            self.epoch = conn.execute(
+                'SELECT epoch FROM menu_logs WHERE namespace = ?', (self.namespace,)).fetchone()[0]
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def reset(self, items):
+        if items is None:
+            # Keep the last known state; the next load is diffed against it
+            return
+        items = {item.get('id'): _encode(item) for item in items}
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            known = dict(conn.execute(
+                'SELECT item_id, item FROM menu_changes WHERE namespace = ? AND item IS NOT NULL', (self.namespace,)))
+            if not self._loaded(conn):
+                # The first load anywhere is the baseline clients fetch in full
+                conn.executemany(
+                    'INSERT OR REPLACE INTO menu_changes VALUES (?, ?, 0, ?)',
+                    [(self.namespace, item_id, item) for item_id, item in items.items()],
+                )
+                conn.execute('UPDATE menu_logs SET loaded = 1 WHERE namespace = ?', (self.namespace,))
+            else:
+                changed = [(item_id, item) for item_id, item in items.items() if known.get(item_id) != item]
+                changed += [(item_id, None) for item_id in known.keys() - items.keys()]
+                self._record(conn, changed)
+            self._items = items
+
+    def upsert(self, item):
+        self._observe(item.get('id'), _encode(item))
+
+    def remove(self, item_id):
+        self._observe(item_id, None)
+
+    def _observe(self, item_id, item):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if not self._loaded(conn):
+                return
+            if self._items is not None:
+                if item is None:
+                    self._items.pop(item_id, None)
+                else:
+                    self._items[item_id] = item
+            row = conn.execute(
+                'SELECT item FROM menu_changes WHERE namespace = ? AND item_id = ?', (self.namespace, item_id)
+            ).fetchone()
+            # Another worker may have recorded the same change already
+            if (row[0] if row else None) != item:
+                self._record(conn, [(item_id, item)])
+
+    def _loaded(self, conn):
+        return conn.execute('SELECT loaded FROM menu_logs WHERE namespace = ?', (self.namespace,)).fetchone()[0]
+
+    def _record(self, conn, changes):
+        if not changes:
+            return
+        revision, floor = conn.execute(
+            'SELECT revision, floor FROM menu_logs WHERE namespace = ?', (self.namespace,)).fetchone()
+        rows = []
+        for item_id, item in changes:
+            revision += 1
+            rows.append((self.namespace, item_id, revision, item))
+        conn.executemany('INSERT OR REPLACE INTO menu_changes VALUES (?, ?, ?, ?)', rows)
+        # Changes up to the max_entries-th newest are compacted: tombstones go
+        # and clients that synced before them resync
+        oldest = conn.execute(
+            'SELECT revision FROM menu_changes WHERE namespace = ? ORDER BY revision DESC LIMIT 1 OFFSET ?',
+            (self.namespace, self.max_entries),
+        ).fetchone()
+        if oldest and oldest[0] > floor:
+            floor = oldest[0]
+            conn.execute(
+                'DELETE FROM menu_changes WHERE namespace = ? AND item IS NULL AND revision <= ?',
+                (self.namespace, floor),
+            )
+        conn.execute(
+            'UPDATE menu_logs SET revision = ?, floor = ? WHERE namespace = ?', (revision, floor, self.namespace))
+
+    @property
+    def revision(self):
+        """The newest revision this worker's snapshot includes every change up to."""
+        with self._lock:
+            if self._items is None:
+                return self._synced
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    'SELECT item_id, revision, item FROM menu_changes '
+                    'WHERE namespace = ? AND revision > ? ORDER BY revision',
+                    (self.namespace, self._synced),
+                )
+                for item_id, revision, item in rows:
+                    # Stop at the first change this worker hasn't seen yet
+                    if self._items.get(item_id) != item:
+                        break
+                    self._synced = revision
+            return self._synced
+
+    def changes_since(self, since, epoch=None):
+        """Return `{epoch, revision, upserts, deletes}`, or `{resync: True, ...}` if the gap is unknown."""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN')  # one consistent read
+            revision, floor, loaded = conn.execute(
+                'SELECT revision, floor, loaded FROM menu_logs WHERE namespace = ?', (self.namespace,)).fetchone()
+            result = {"epoch": self.epoch, "revision": revision}
+            if epoch != self.epoch or not loaded or since < floor or since > revision:
+                return {**result, "resync": True}
+            upserts, deletes = [], []
+            rows = conn.execute(
+                'SELECT item_id, item FROM menu_changes WHERE namespace = ? AND revision > ? ORDER BY revision',
+                (self.namespace, since),
+            )
+            for item_id, item in rows:
+                if item is None:
+                    deletes.append(item_id)
+                else:
+                    upserts.append(json.loads(item))
+            return {**result, "resync": False, "upserts": upserts, "deletes": deletes}
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            revision, floor = conn.execute(
+                'SELECT revision, floor FROM menu_logs WHERE namespace = ?', (self.namespace,)).fetchone()
+            entries = conn.execute(
+                'SELECT COUNT(*) FROM menu_changes WHERE namespace = ? AND revision > ?', (self.namespace, floor)
+            ).fetchone()[0]
+        return {"epoch": self.epoch, "revision": revision, "synced": self.revision, "entries": entries}
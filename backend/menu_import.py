@@ -0,0 +1,88 @@
+import csv
+import io
+import json
+import zipfile
+
+from uploads import GLB_MAGIC, MODEL_EXTENSIONS, file_extension
+
+# Columns naming files inside the models archive rather than item fields
+ASSET_FILE_COLUMNS = {'modelFile': 'modelUrl', 'imageFile': 'imageUrl'}
+
+
+class MenuImportError(ValueError):
+    """A bulk import payload (or one of its rows) that can't be used."""
+
+
+def parse_rows(file_storage):
+    """Read menu rows from an uploaded .json (array of objects) or .csv file."""
+    ext = file_extension(file_storage.filename)
+    if ext == 'json':
+        try:
+            rows = json.load(file_storage.stream)
+        except ValueError as e:
+            raise MenuImportError(f"Invalid JSON: {str(e)}")
+        return rows_from_json(rows)
+    if ext == 'csv':
+        text = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+        try:
+            # Empty cells mean "not set", like an omitted form field
+            return [{key: value for key, value in row.items() if key and value} for row in csv.DictReader(text)]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise MenuImportError(f"Invalid CSV: {str(e)}")
+    raise MenuImportError("Items must be a .json or .csv file.")
+
+
+def rows_from_json(rows):
+    if isinstance(rows, dict):
+        rows = rows.get('items')
+    if not isinstance(rows, list):
+        raise MenuImportError("Expected a JSON array of menu items.")
+    return rows
+
+
+class ModelArchive:
+    """Zip of model/image files referenced by name from import rows."""
+
+    def __init__(self, file_storage, limits):
+        try:
+            self._zip = zipfile.ZipFile(file_storage.stream)
+        except zipfile.BadZipFile:
+            raise MenuImportError("Models must be a .zip archive.")
+        self._limits = limits  # extension -> max bytes
+        self._members = {}
+        for info in self._zip.infolist():
+            if not info.is_dir():
+                # Rows may name files with or without their folder inside the archive
+                self._members.setdefault(info.filename, info)
+                self._members.setdefault(info.filename.rsplit('/', 1)[-1], info)
+
+    def open(self, name):
+        """Return `(stream, ext)` for a member, validating its type and size."""
+        info = self._members.get(name)
+        if info is None:
+            raise MenuImportError(f"'{name}' is not in the models archive.")
+        ext = file_extension(info.filename)
+        if ext not in self._limits:
+            raise MenuImportError(f"'{name}' is not an allowed file type.")
+        if info.file_size > self._limits[ext]:
+            raise MenuImportError(f"'{name}' exceeds the {self._limits[ext] / (1024 * 1024):g} MB limit.")
+        if ext == 'glb':
+            with self._zip.open(info) as member:
+                if member.read(len(GLB_MAGIC)) != GLB_MAGIC:
+                    raise MenuImportError(f"'{name}' is not a binary glTF (.glb) model.")
+        return self._zip.open(info), ext
+
+    def close(self):
+        self._zip.close()
+
+
+def upload_limits(config, extensions):
+    return {
+        ext: config['MAX_MODEL_UPLOAD_BYTES'] if ext in MODEL_EXTENSIONS else config['MAX_IMAGE_UPLOAD_BYTES']
+        for ext in extensions
+    }
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,194 @@
+import hashlib
+import importlib
+import math
+import re
+import threading
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # optional; vector search falls back to pure Python
+    np = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'a', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'can', 'do', 'for', 'from', 'have', 'i', 'in',
+    'is', 'it', 'me', 'my', 'of', 'on', 'or', 'please', 'something', 'that', 'the', 'to', 'want',
+    'what', 'whats', 'with', 'you', 'your',
+}
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or '').lower()) if token not in STOPWORDS]
+
+
+def item_text(item):
+    # The name is repeated so it outweighs incidental description words
+    fields = ('name', 'name', 'category', 'subcategory', 'description')
+    return ' '.join(str(item.get(field) or '') for field in fields)
+
+
+class BM25Index:
+    """Keyword index over menu items, updated one item at a time."""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs = {}  # item id -> Counter of terms
+        self._df = Counter()  # term -> number of items containing it
+        self._total_length = 0
+        self.ready = False
+
+    def reset(self, items):
+        with self._lock:
+            self._docs, self._df, self._total_length = {}, Counter(), 0
+            for item in items or []:
+                self._add(item)
+            self.ready = items is not None
+
+    def upsert(self, item):
+        with self._lock:
+            self._remove(item.get('id'))
+            self._add(item)
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(item_id)
+
+    def _add(self, item):
+        terms = Counter(tokenize(item_text(item)))
+        self._docs[item.get('id')] = terms
+        self._df.update(terms.keys())
+        self._total_length += sum(terms.values())
+
+    def _remove(self, item_id):
+        terms = self._docs.pop(item_id, None)
+        if terms is None:
+            return
+        self._df.subtract(terms.keys())
+        self._total_length -= sum(terms.values())
+
+    def search(self, query, k):
+        """Return up to k item ids ranked by BM25 score (only items matching a term)."""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._docs)
+            if not count or not query_terms:
+                return []
+            avg_length = self._total_length / count
+            idf = {
+                term: math.log(1 + (count - self._df[term] + 0.5) / (self._df[term] + 0.5))
+                for term in query_terms if self._df[term] > 0
+            }
+            scores = []
+            for item_id, terms in self._docs.items():
+                length = sum(terms.values())
+                score = 0.0
+                for term, weight in idf.items():
+                    tf = terms.get(term)
+                    if tf:
+                        score += weight * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                if score > 0:
+                    scores.append((score, item_id))
+        scores.sort(key=lambda pair: pair[0], reverse=True)
+        return [item_id for _, item_id in scores[:k]]
+
+
+class HashingEmbedder:
+    """Deterministic, dependency-free embedder (feature hashing of words and trigrams).
+
+    Good enough to rank menu items offline and stable across runs, which also
+    makes it the embedder to use in tests.
+    """
+
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def _features(self, text):
+        for token in tokenize(text):
+            yield token
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3]
+
+    def __call__(self, texts):
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            vectors.append(vector)
+        return vectors
+
+
+def load_embedder(spec):
+    """Resolve MENU_EMBEDDER: 'hashing' or 'package.module:factory' for a local model."""
+    if not spec or spec == 'hashing':
+        return HashingEmbedder()
+    module_name, _, attr = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else list(vector)
+
+
+class VectorIndex:
+    """Cosine-similarity index over menu item embeddings.
+
+    `embedder` is any callable mapping a list of strings to a list of
+    vectors, so a local sentence-embedding model can be plugged in.
+    """
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self._lock = threading.Lock()
+        self._vectors = {}  # item id -> normalized vector
+        self._matrix = None  # (ids, numpy matrix) cache, dropped on writes
+        self.ready = False
+
+    def reset(self, items):
+        ready = items is not None
+        items = list(items or [])
+        vectors = self.embedder([item_text(item) for item in items]) if items else []
+        with self._lock:
+            self._vectors = {item.get('id'): _normalize(vector) for item, vector in zip(items, vectors)}
+            self._matrix = None
+            self.ready = ready
+
+    def upsert(self, item):
+        vector = _normalize(self.embedder([item_text(item)])[0])
+        with self._lock:
+            self._vectors[item.get('id')] = vector
+            self._matrix = None
+
+    def remove(self, item_id):
+        with self._lock:
+            if self._vectors.pop(item_id, None) is not None:
+                self._matrix = None
+
+    def search(self, query, k):
+        if not tokenize(query):
+            return []
+        query_vector = _normalize(self.embedder([query])[0])
+        with self._lock:
+            if not self._vectors:
+                return []
+            if np is not None:
+                if self._matrix is None:
+                    ids = list(self._vectors)
+                    self._matrix = (ids, np.array([self._vectors[item_id] for item_id in ids]))
+                ids, matrix = self._matrix
+                similarities = matrix @ np.array(query_vector)
+                order = np.argsort(-similarities)[:k]
+                return [ids[i] for i in order if similarities[i] > 0]
+            scores = [
+                (sum(a * b for a, b in zip(vector, query_vector)), item_id)
+                for item_id, vector in self._vectors.items()
+            ]
+        scores.sort(key=lambda pair: pair[0], reverse=True)
+        return [item_id for score, item_id in scores[:k] if score > 0]
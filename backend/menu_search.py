@@ -0,0 +1,268 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+
+from local_recommender import parse_price
+from menu_index import tokenize
+
+# Matches in the name count most; description words least
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'subcategory': 2.0, 'description': 1.0}
+# A prefix or one-typo match is worth less than the exact word
+EXACT, PREFIX, TYPO = 1.0, 0.7, 0.5
+TYPO_MIN_LENGTH = 4  # shorter words must match exactly (or as a prefix)
+PREFIX_MIN_LENGTH = 2
+MAX_EXPANSIONS = 50  # vocabulary words a single prefix may stand for
+
+# `price<15`, `price >= 9.50`, `price=12` inside the query text
+PRICE_FILTER_RE = re.compile(r'\bprice\s*(<=|>=|<|>|=)\s*\$?\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+def parse_query(text):
+    """Split a search string into its words and `(operator, price)` filters."""
+    filters = [(op, float(value)) for op, value in PRICE_FILTER_RE.findall(text or '')]
+    return PRICE_FILTER_RE.sub(' ', text or ''), filters
+
+
+def _deletes(term):
+    # The term with each single character removed (symmetric-delete typo matching)
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (
+            i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+    return a[i:] == b[i + 1:]
+
+
+class MenuSearchIndex:
+    """In-memory search over menu items, kept in sync with the menu snapshot.
+
+    An inverted index maps every word of an item's name, category,
+    subcategory and description to the items containing it. Query words
+    match exactly, as a prefix (the last word, for search-as-you-type) or
+    with one typo. A price list sorted with bisect answers range filters.
+    Items are added, replaced and removed one at a time as the menu changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}  # item id -> item
+        self._terms = {}  # item id -> {term: field weight}
+        self._postings = {}  # term -> {item id: field weight}
+        self._vocabulary = []  # sorted terms, for prefix lookups
+        self._typos = {}  # term with one character deleted -> terms
+        self._prices = []  # sorted (price, item id)
+        self._price_of = {}  # item id -> price
+        self._names = {}  # item id -> lowercased name, the tie-breaker
+        self._by_name = []  # sorted (name, item id): listings without query words, tie-breaks
+        self._rank = None  # item id -> position in _by_name, rebuilt on the first search after a write
+        self.ready = False
+
+    def reset(self, items):
+        with self._lock:
+            self._items, self._terms, self._postings = {}, {}, {}
+            self._typos, self._prices, self._price_of = {}, [], {}
+            self._names, self._by_name, self._rank = {}, [], None
+            for item in items or []:
+                self._add(item, index_vocabulary=False)
+            self._vocabulary = sorted(self._postings)
+            for term in self._vocabulary:
+                self._add_typos(term)
+            self._prices.sort()
+            self._by_name.sort()
+            self.ready = items is not None
+
+    def upsert(self, item):
+        with self._lock:
+            self._remove(item.get('id'))
+            self._add(item)
+
+    def remove(self, item_id):
+        with self._lock:
+            self._remove(item_id)
+
+    def _add(self, item, index_vocabulary=True):
+        item_id = item.get('id')
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(str(item.get(field) or '')):
+                terms[term] = max(terms.get(term, 0.0), weight)
+        self._items[item_id] = item
+        self._terms[item_id] = terms
+        name = self._names[item_id] = str(item.get('name') or '').lower()
+        self._rank = None
+        if index_vocabulary:
+            bisect.insort(self._by_name, (name, item_id))
+        else:
+            self._by_name.append((name, item_id))
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if index_vocabulary:
+                    bisect.insort(self._vocabulary, term)
+                    self._add_typos(term)
+            postings[item_id] = weight
+        price = parse_price(item.get('price'))
+        if price is not None:
+            self._price_of[item_id] = price
+            if index_vocabulary:
+                bisect.insort(self._prices, (price, item_id))
+            else:
+                self._prices.append((price, item_id))
+
+    def _add_typos(self, term):
+        if len(term) >= TYPO_MIN_LENGTH:
+            for variant in _deletes(term):
+                self._typos.setdefault(variant, set()).add(term)
+
+    def _remove(self, item_id):
+        terms = self._terms.pop(item_id, None)
+        if terms is None:
+            return
+        del self._items[item_id]
+        name = self._names.pop(item_id)
+        self._rank = None
+        del self._by_name[bisect.bisect_left(self._by_name, (name, item_id))]
+        for term in terms:
+            postings = self._postings[term]
+            del postings[item_id]
+            if not postings:
+                # Last item using the word; drop it from the vocabulary too
+                del self._postings[term]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, term)]
+                if len(term) >= TYPO_MIN_LENGTH:
+                    for variant in _deletes(term):
+                        self._typos[variant].discard(term)
+                        if not self._typos[variant]:
+                            del self._typos[variant]
+        price = self._price_of.pop(item_id, None)
+        if price is not None:
+            del self._prices[bisect.bisect_left(self._prices, (price, item_id))]
+
+    def _expand(self, word, prefix):
+        """Vocabulary terms the query word stands for, with how well each matches."""
+        matches = {}
+        if word in self._postings:
+            matches[word] = EXACT
+        if prefix and len(word) >= PREFIX_MIN_LENGTH:
+            start = bisect.bisect_left(self._vocabulary, word)
+            for term in self._vocabulary[start:start + MAX_EXPANSIONS]:
+                if not term.startswith(word):
+                    break
+                matches.setdefault(term, PREFIX)
+        if len(word) >= TYPO_MIN_LENGTH:
+            candidates = set(self._typos.get(word, ()))  # one letter too many in the query
+            for variant in _deletes(word) | {word}:
+                candidates.update(self._typos.get(variant, ()))
+                if variant in self._postings:
+                    candidates.add(variant)  # one letter missing from the query
+            for term in candidates:
+                if term not in matches and within_one_edit(word, term):
+                    matches[term] = TYPO
+        return matches
+
+    def _ranks(self):
+        if self._rank is None:
+            self._rank = {item_id: position for position, (_, item_id) in enumerate(self._by_name)}
+        return self._rank
+
+    def _price_range(self, filters):
+        """`(start, end)` slice of the sorted price list the filters allow."""
+        low, high, low_inclusive, high_inclusive = None, None, True, True
+        for op, value in filters:
+            if op in ('>', '>=', '=') and (low is None or value >= low):
+                low, low_inclusive = value, op != '>'
+            if op in ('<', '<=', '=') and (high is None or value <= high):
+                high, high_inclusive = value, op != '<'
+        price = lambda entry: entry[0]
+        start, end = 0, len(self._prices)
+        if low is not None:
+            start = (bisect.bisect_left if low_inclusive else bisect.bisect_right)(self._prices, low, key=price)
+        if high is not None:
+            end = (bisect.bisect_right if high_inclusive else bisect.bisect_left)(self._prices, high, key=price)
+        return start, end
+
+    def _word_scores(self, word, prefix):
+        matches = self._expand(word, prefix)
+        if len(matches) == 1:
+            (term, quality), = matches.items()
+            postings = self._postings[term]
+            # Common case: one exact term, whose postings already are the scores (read only)
+            return postings if quality == EXACT else {item_id: quality * weight for item_id, weight in postings.items()}
+        scores = {}
+        for term, quality in matches.items():
+            for item_id, weight in self._postings[term].items():
+                score = quality * weight
+                if score > scores.get(item_id, 0.0):
+                    scores[item_id] = score
+        return scores
+
+    def search(self, query, limit=20, category=None, subcategory=None, price_filters=()):
+        """Return `(items, total)`: the best `limit` items matching every query word and filter."""
+        text, filters = parse_query(query)
+        filters = list(filters) + list(price_filters)
+        words = tokenize(text)
+        with self._lock:
+            candidates = None
+            for position, word in enumerate(words):
+                # Only the last word may be unfinished
+                scores = self._word_scores(word, prefix=position == len(words) - 1)
+                if candidates is None:
+                    candidates = scores
+                else:
+                    if len(scores) > len(candidates):
+                        scores, candidates = candidates, scores
+                    candidates = {item_id: candidates[item_id] + score for item_id, score in scores.items() if item_id in candidates}
+                if not candidates:
+                    break
+            if filters:
+                start, end = self._price_range(filters)
+                if candidates is None:
+                    candidates = {item_id: 0.0 for _, item_id in self._prices[start:end]}
+                elif start > 0 or end < len(self._prices):
+                    low = self._prices[start][0] if start < end else 0.0
+                    high = self._prices[end - 1][0] if start < end else -1.0
+                    price_of = self._price_of
+                    candidates = {item_id: score for item_id, score in candidates.items() if low <= price_of.get(item_id, -1.0) <= high}
+            if candidates is None:
+                candidates = dict.fromkeys(self._items, 0.0)
+
+            if category or subcategory:
+                category, subcategory = (category or '').lower(), (subcategory or '').lower()
+                candidates = {
+                    item_id: score for item_id, score in candidates.items()
+                    if (not category or str(self._items[item_id].get('category') or '').lower() == category)
+                    and (not subcategory or str(self._items[item_id].get('subcategory') or '').lower() == subcategory)
+                }
+
+            if words:
+                rank = self._ranks()
+                # Best score first, then by name, as a single float per item. Distinct
+                # scores differ by at least 0.1, so this spread keeps them apart
+                spread = 10 * (len(rank) + 1)
+                ranked = heapq.nsmallest(limit, candidates, key=lambda item_id: rank[item_id] - candidates[item_id] * spread)
+            else:
+                # Without query words: cheapest first under a price filter, else by name.
+                # Both lists are kept sorted, so walk them until `limit` items matched
+                ordered = (item_id for _, item_id in self._prices[start:end]) if filters else (
+                    item_id for _, item_id in self._by_name)
+                ranked = list(itertools.islice((item_id for item_id in ordered if item_id in candidates), limit))
+            return [self._items[item_id] for item_id in ranked], len(candidates)
+
+    def stats(self):
+        with self._lock:
+            return {"ready": self.ready, "items": len(self._items), "terms": len(self._postings)}
@@ -0,0 +1,251 @@
+"""Process-wide metrics rendered in the Prometheus text format (no client library needed)."""
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> float
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, state):
+                yield f'{self.name}_bucket', labels + [('le', _format_value(float(bound)))], count
+            yield f'{self.name}_bucket', labels + [('le', '+Inf')], state[-1]
+            yield f'{self.name}_sum', labels, state[-2]
+            yield f'{self.name}_count', labels, state[-1]
+
+
+class Registry:
+    """Metrics plus collectors that report current values (e.g. cache stats) at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, key, collect):
+        """Register `collect()` yielding `(name, type, help, [(labels dict, value)])`; same key replaces."""
+        with self._lock:
+            self._collectors[key] = collect
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for collect in collectors:
+            for name, type, help, samples in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Request latency by route.', ('method', 'route', 'status'))
+FIRESTORE_SECONDS = REGISTRY.histogram(
+    'firestore_operation_duration_seconds', 'Firestore call latency.', ('collection', 'operation'))
+FIRESTORE_DOCUMENTS = REGISTRY.counter(
+    'firestore_documents_read_total', 'Documents returned by Firestore reads.', ('collection',))
+FIRESTORE_ERRORS = REGISTRY.counter(
+    'firestore_errors_total', 'Failed Firestore calls.', ('collection', 'operation'))
+LLM_SECONDS = REGISTRY.histogram(
+    'llm_request_duration_seconds', 'LLM call latency (streams until the last token).', ('mode',),
+    buckets=LLM_LATENCY_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    'llm_tokens_total', 'Estimated LLM tokens (~4 characters each).', ('kind',))
+LLM_FALLBACKS = REGISTRY.counter(
+    'llm_fallbacks_total', 'Recommendations answered by the local recommender, by reason.', ('reason',))
+LLM_CALL_TOKENS = REGISTRY.histogram(
+    'llm_call_tokens', 'Estimated prompt plus completion tokens per LLM call.', buckets=TOKEN_BUCKETS)
+
+
+class InstrumentedFirestore:
+    """Wraps a Firestore client, or a collection/query/document/batch from it,
+    recording latency, reads and errors per collection for every call.
+    """
+
+    TIMED = {'get', 'set', 'create', 'update', 'delete', 'commit', 'stream'}
+    CHAINED = {'document', 'where', 'order_by', 'start_at', 'start_after', 'end_at', 'end_before', 'limit', 'select', 'batch'}
+
+    def __init__(self, target, collection=None):
+        self._target = target
+        self._collection = collection
+
+    def collection(self, name):
+        return InstrumentedFirestore(self._target.collection(name), name)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or (name not in self.TIMED and name not in self.CHAINED):
+            return attr
+
+        def call(*args, **kwargs):
+            # Batches and queries want the real references, not wrappers
+            args = [arg._target if isinstance(arg, InstrumentedFirestore) else arg for arg in args]
+            if name in self.CHAINED:
+                return InstrumentedFirestore(attr(*args, **kwargs), 'batch' if name == 'batch' else self._collection)
+            collection = self._collection or 'unknown'
+            started = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+                if name == 'stream':
+                    # Streams are lazy; time them until every document has arrived
+                    result = list(result)
+                    FIRESTORE_DOCUMENTS.inc(len(result), collection=collection)
+                elif name == 'get':
+                    FIRESTORE_DOCUMENTS.inc(1, collection=collection)
+                return result
+            except Exception:
+                FIRESTORE_ERRORS.inc(collection=collection, operation=name)
+                raise
+            finally:
+                FIRESTORE_SECONDS.observe(time.perf_counter() - started, collection=collection, operation=name)
+
+        return call
+
+
+class InstrumentedAsyncFirestore(InstrumentedFirestore):
+    """InstrumentedFirestore for the async client (`firestore_async`): timed calls
+    are awaited, and `stream()` is an async iterator timed until it is exhausted.
+    """
+
+    def collection(self, name):
+        return InstrumentedAsyncFirestore(self._target.collection(name), name)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or (name not in self.TIMED and name not in self.CHAINED):
+            return attr
+
+        def unwrap(args):
+            return [arg._target if isinstance(arg, InstrumentedFirestore) else arg for arg in args]
+
+        if name in self.CHAINED:
+            return lambda *args, **kwargs: InstrumentedAsyncFirestore(
+                attr(*unwrap(args), **kwargs), 'batch' if name == 'batch' else self._collection)
+        # A batch's set/update/delete only queue writes; commit is the timed call
+        if self._collection == 'batch' and name != 'commit':
+            return lambda *args, **kwargs: attr(*unwrap(args), **kwargs)
+        collection = self._collection or 'unknown'
+
+        async def stream(*args, **kwargs):
+            started = time.perf_counter()
+            count = 0
+            try:
+                async for snapshot in attr(*unwrap(args), **kwargs):
+                    count += 1
+                    yield snapshot
+            except Exception:
+                FIRESTORE_ERRORS.inc(collection=collection, operation=name)
+                raise
+            finally:
+                FIRESTORE_DOCUMENTS.inc(count, collection=collection)
+                FIRESTORE_SECONDS.observe(time.perf_counter() - started, collection=collection, operation=name)
+
+        async def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await attr(*unwrap(args), **kwargs)
+                if name == 'get':
+                    FIRESTORE_DOCUMENTS.inc(1, collection=collection)
+                return result
+            except Exception:
+                FIRESTORE_ERRORS.inc(collection=collection, operation=name)
+                raise
+            finally:
+                FIRESTORE_SECONDS.observe(time.perf_counter() - started, collection=collection, operation=name)
+
+        return stream if name == 'stream' else call
@@ -0,0 +1,156 @@
+"""One-off migrations of uploaded files.
+
+By default, legacy `{uuid}_{filename}` uploads are moved into the blob store.
+Every legacy file is hashed into a content-addressed blob, menu items are
+rewritten to point at the blob URLs and their references are recorded. Legacy
+files that are no longer referenced by any menu item are removed afterwards.
+
+With `--rebase`, blobs stored on this host are published to the configured
+storage backend (STORAGE_BACKEND) and every asset URL on the menu is rewritten
+to the current base (ASSET_BASE_URL), e.g. after moving to a bucket or a CDN.
+
+With `--sweep`, blobs that no menu item has referenced for
+UPLOAD_ORPHAN_GRACE_SECONDS are deleted, as the asset workers do hourly
+while uploads come in.
+
+All of them operate on the default restaurant's menu and uploads, or on one
+restaurant's with `--tenant <id>`.
+
+Run from the backend directory with the same environment as app.py:
+    python migrate_uploads.py [--rebase | --sweep] [--dry-run] [--tenant <id>]
+"""
+import os
+import sys
+
+from flask import g
+
+import app as backend
+from blob_store import DERIVED_DIR, is_blob_name
+from storage_backends import tenant_path
+from tenants import UnknownTenant, is_tenant_id
+
+
+def migrate(dry_run=False):
+    if not backend.db:
+        print("Firebase not available; nothing to migrate.")
+        return
+
+    store = backend.blob_store
+    legacy_names = {}
+    for filename in sorted(os.listdir(store.root)):
+        if filename.startswith('.') or is_blob_name(filename) or os.path.isdir(store.path(filename)):
+            continue
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+        if dry_run:
+            legacy_names[filename] = None
+            continue
+        with open(store.path(filename), 'rb') as f:
+            legacy_names[filename] = store.put_stream(f, ext)
+
+    menu_ref = backend.db.collection('menu')
+    for item in backend.load_menu_items():
+        updates = {}
+        for field in backend.ASSET_URL_FIELDS:
+            url = item.get(field) or ''
+            legacy = url.rsplit('/uploads/', 1)[1] if '/uploads/' in url else None
+            if legacy in legacy_names:
+                updates[field] = backend.asset_url(legacy_names[legacy])
+        if not updates:
+            continue
+        print(f"{item.get('id')}: {updates}")
+        if not dry_run:
+            menu_ref.document(item['id']).update(updates)
+            backend.sync_asset_refs(item, {**item, **updates})
+
+    if dry_run:
+        print(f"Would migrate {len(legacy_names)} legacy uploads.")
+        return
+    for filename in legacy_names:
+        os.remove(store.path(filename))
+    print(f"Migrated {len(legacy_names)} legacy uploads into {len(set(legacy_names.values()))} blobs.")
+
+
+def rebased_url(url):
+    # "<any origin>/uploads/[tenants/<id>/]<key>" -> the current URL for <key>
+    if not isinstance(url, str) or '/uploads/' not in url:
+        return url
+    key = url.rsplit('/uploads/', 1)[1]
+    prefix = tenant_path(g.get('tenant_id'))
+    if prefix and key.startswith(prefix):
+        key = key[len(prefix):]
+    return backend.storage.url(key)
+
+
+def rebased_value(field, value):
+    if isinstance(value, dict):
+        return {key: rebased_value(field, entry) for key, entry in value.items()}
+    if field == 'imageSrcset' and isinstance(value, str):
+        # "url 320w, url 640w"
+        candidates = (candidate.strip().split(' ', 1) for candidate in value.split(',') if candidate.strip())
+        return ', '.join(' '.join([rebased_url(parts[0])] + parts[1:]) for parts in candidates)
+    return rebased_url(value)
+
+
+def rebase(dry_run=False):
+    if not backend.db:
+        print("Firebase not available; nothing to rebase.")
+        return
+
+    store = backend.blob_store
+    if backend.storage.remote:
+        derived_dir = os.path.join(store.root, DERIVED_DIR)
+        blobs = [name for name in sorted(os.listdir(store.root)) if is_blob_name(name)]
+        derived = sorted(os.listdir(derived_dir)) if os.path.isdir(derived_dir) else []
+        print(f"Publishing {len(blobs)} blobs and {len(derived)} derived files.")
+        if not dry_run:
+            for name in blobs:
+                store.publish(name, store.path(name))
+            for filename in derived:
+                # "<blob>-<variant>" is published as "<blob>/<variant>"
+                name, variant = filename.split('-', 1)
+                store.publish(f"{name}/{variant}", os.path.join(derived_dir, filename))
+
+    menu_ref = backend.db.collection('menu')
+    changed = 0
+    for item in backend.load_menu_items():
+        updates = {}
+        for field in backend.ASSET_URL_FIELDS + ('imageSrcset',):
+            if item.get(field) and rebased_value(field, item[field]) != item[field]:
+                updates[field] = rebased_value(field, item[field])
+        if not updates:
+            continue
+        changed += 1
+        print(f"{item.get('id')}: {updates}")
+        if not dry_run:
+            menu_ref.document(item['id']).update(updates)
+            backend.menu_cache.merge(item['id'], updates)
+    print(f"{'Would rewrite' if dry_run else 'Rewrote'} asset URLs of {changed} menu items.")
+
+
+def sweep(dry_run=False):
+    grace = backend.app.config['UPLOAD_ORPHAN_GRACE_SECONDS']
+    if not grace:
+        print("UPLOAD_ORPHAN_GRACE_SECONDS is 0; unreferenced uploads are kept.")
+        return
+    swept = backend.blob_store.sweep(grace, dry_run=dry_run)
+    for name in swept:
+        print(name)
+    print(f"{'Would delete' if dry_run else 'Deleted'} {len(swept)} unreferenced uploads.")
+
+
+if __name__ == '__main__':
+    tenant_id = sys.argv[sys.argv.index('--tenant') + 1] if '--tenant' in sys.argv[:-1] else None
+    if tenant_id is not None and not is_tenant_id(tenant_id):
+        sys.exit(f"Invalid restaurant id: {tenant_id}")
+    with backend.app.app_context():
+        g.tenant_id = tenant_id
+        try:
+            backend.tenant()
+        except UnknownTenant:
+            sys.exit(f"Unknown restaurant: {tenant_id}")
+        if '--rebase' in sys.argv:
+            rebase(dry_run='--dry-run' in sys.argv)
+        elif '--sweep' in sys.argv:
+            sweep(dry_run='--dry-run' in sys.argv)
+        else:
+            migrate(dry_run='--dry-run' in sys.argv)
@@ -0,0 +1,210 @@
+"""Request IDs, structured logs, the /metrics endpoint and slow-request profiling."""
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from flask import Response, current_app, g, has_app_context, request
+
+from metrics import HTTP_REQUEST_SECONDS, LLM_CALL_TOKENS, LLM_SECONDS, LLM_TOKENS, REGISTRY
+from uploads import upload_stats
+
+logger = logging.getLogger(__name__)
+
+# Incoming X-Request-Id values are kept only if they look like an ID
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+# One request is profiled at a time: since Python 3.12 cProfile hooks the whole
+# process, and a second enable() raises ValueError
+_profiling = threading.Lock()
+
+# LogRecord attributes that aren't `extra=` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        # g lives on the app context, which the ASGI routes push without a request
+        record.request_id = g.get('request_id') if has_app_context() else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as keys."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry["requestId"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(fmt='json', level='INFO'):
+    """Send every logger to stderr as JSON lines (or plain text); safe to call repeatedly."""
+    root = logging.getLogger()
+    handler = next((h for h in root.handlers if getattr(h, 'menuart', False)), None)
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.menuart = True
+        handler.addFilter(RequestIdFilter())
+        root.addHandler(handler)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+    root.setLevel(level)
+
+
+def estimate_tokens(text):
+    # Same ~4 characters per token estimate as the session history budget
+    return len(text) // 4 + 1 if text else 0
+
+
+def observe_llm_call(mode, seconds, prompt, reply, session_id):
+    """Record one LLM call; per-session totals go to the log, not metric labels."""
+    prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+    LLM_SECONDS.observe(seconds, mode=mode)
+    LLM_TOKENS.inc(prompt_tokens, kind='prompt')
+    LLM_TOKENS.inc(completion_tokens, kind='completion')
+    LLM_CALL_TOKENS.observe(prompt_tokens + completion_tokens)
+    logger.info("llm call", extra={
+        "mode": mode,
+        "sessionId": session_id,
+        "durationMs": round(seconds * 1000, 1),
+        "promptTokens": prompt_tokens,
+        "completionTokens": completion_tokens,
+    })
+
+
+def _app_collector(app):
+    state = app.extensions['menuart']
+
+    def collect():
+        # Cache metrics are labelled by restaurant ('default' for the untenanted routes)
+        tenants = [(tenant_id or 'default', tenant) for tenant_id, tenant in state.tenants.active()]
+        caches = [
+            (name, {"menu": tenant.menu_cache.stats(), "response": tenant.response_cache.stats()})
+            for name, tenant in tenants
+        ]
+        uploads = upload_stats.stats()
+        yield 'cache_hits_total', 'counter', 'Cache hits.', [
+            ({"cache": cache, "tenant": name}, stats[cache]["hits"]) for name, stats in caches for cache in stats]
+        yield 'cache_misses_total', 'counter', 'Cache misses.', [
+            ({"cache": cache, "tenant": name}, stats[cache]["misses"]) for name, stats in caches for cache in stats]
+        yield 'cache_hit_ratio', 'gauge', 'Cache hits over lookups.', [
+            ({"cache": cache, "tenant": name}, stats[cache]["hitRate"]) for name, stats in caches for cache in stats]
+        yield 'menu_cache_items', 'gauge', 'Items in the menu snapshot.', [
+            ({"tenant": name}, stats["menu"]["items"]) for name, stats in caches]
+        yield 'uploads_total', 'counter', 'Uploads by outcome.', [
+            ({"outcome": "completed"}, uploads["completed"]), ({"outcome": "rejected"}, uploads["rejected"])]
+        yield 'upload_bytes_total', 'counter', 'Bytes received in completed uploads.', [({}, uploads["bytes"])]
+        yield 'upload_seconds_total', 'counter', 'Time spent receiving completed uploads.', [({}, uploads["seconds"])]
+        yield 'upload_throughput_bytes_per_second', 'gauge', 'Average upload throughput.', [({}, uploads["bytesPerSecond"])]
+        # Coalescing is per restaurant; the counters are summed over them
+        flights = {kind: {"calls": 0, "shared": 0, "timeouts": 0} for kind in ("firestore", "llm")}
+        for _, tenant in tenants:
+            for kind, flight in (("firestore", tenant.firestore_flights), ("llm", tenant.llm_flights)):
+                stats = flight.stats()
+                for counter in flights[kind]:
+                    flights[kind][counter] += stats[counter]
+        yield 'single_flight_calls_total', 'counter', 'Calls made by the request coalescing layer.', [
+            ({"kind": kind}, stats["calls"]) for kind, stats in flights.items()]
+        yield 'single_flight_shared_total', 'counter', 'Callers served by a call another request had in flight.', [
+            ({"kind": kind}, stats["shared"]) for kind, stats in flights.items()]
+        yield 'single_flight_timeouts_total', 'counter', 'Callers that gave up waiting for a shared call.', [
+            ({"kind": kind}, stats["timeouts"]) for kind, stats in flights.items()]
+        gateway = state.llm_gateway.stats()
+        yield 'llm_gateway_running', 'gauge', 'LLM calls in progress.', [({}, gateway["running"])]
+        yield 'llm_gateway_waiting', 'gauge', 'LLM calls waiting for a slot.', [({}, gateway["waiting"])]
+        yield 'llm_gateway_shed_total', 'counter', 'LLM calls refused by the gateway.', [
+            ({"reason": reason}, count) for reason, count in gateway["shed"].items()]
+        yield 'llm_circuit_open', 'gauge', 'Whether the LLM circuit breaker is refusing calls.', [
+            ({}, int(gateway["breaker"]["state"] == 'open'))]
+        yield 'firestore_mirror_ready', 'gauge', 'Whether each mirrored collection is live.', [
+            ({"collection": collection, "tenant": name}, int(mirror.ready))
+            for name, tenant in tenants for collection, mirror in tenant.mirrors.items()]
+        registry = state.tenants.stats()
+        yield 'tenants_active', 'gauge', 'Restaurants with state in memory (besides the default).', [({}, registry["active"])]
+        yield 'tenant_evictions_total', 'counter', 'Restaurants evicted from memory.', [({}, registry["evictions"])]
+        yield 'tenant_rejected_total', 'counter', 'Requests for restaurant ids that are not registered.', [({}, registry["rejected"])]
+        yield 'tenant_memory_bytes', 'gauge', 'Estimated cache memory per restaurant, as of the last budget check.', [
+            ({"tenant": name}, size) for name, size in registry["memory"].items()]
+
+    return collect
+
+
+def init_observability(app):
+    """Install request IDs, latency metrics, slow-request profiling and GET /metrics on `app`."""
+    configure_logging(app.config['LOG_FORMAT'], app.config['LOG_LEVEL'])
+    REGISTRY.collector('app', _app_collector(app))
+
+    @app.before_request
+    def start_request():
+        incoming = request.headers.get('X-Request-Id', '')
+        g.request_id = incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        if current_app.config['PROFILE_SLOW_REQUESTS_MS'] and _profiling.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool is active in this process; skip this request
+                _profiling.release()
+            else:
+                g.profiler = profiler
+
+    @app.after_request
+    def tag_response(response):
+        response.headers['X-Request-Id'] = g.request_id
+        g.response_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        started = g.get('request_started')
+        if started is None:
+            return
+        # Streamed responses tear down after their last chunk, so this covers the whole body
+        seconds = time.perf_counter() - started
+        status = g.get('response_status', 500)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(seconds, method=request.method, route=route, status=status)
+        logger.info("request", extra={
+            "method": request.method, "path": request.path, "route": route,
+            "status": status, "durationMs": round(seconds * 1000, 1),
+        })
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.release()
+            if seconds * 1000 >= current_app.config['PROFILE_SLOW_REQUESTS_MS']:
+                dump_profile(profiler, route, seconds)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+def dump_profile(profiler, route, seconds):
+    """Write `<PROFILE_DIR>/<time>-<route>-<request id>.prof` (open with pstats or snakeviz)."""
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{g.request_id}.prof")
+    profiler.dump_stats(path)
+    logger.warning("slow request profiled", extra={"route": route, "durationMs": round(seconds * 1000, 1), "profile": path})
@@ -0,0 +1,115 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Everything except word characters, "$" and decimal points in prices
+PUNCTUATION_RE = re.compile(r"[^\w\s$.]|\.(?!\d)")
+
+
+def normalize_question(text):
+    # "What's vegetarian??" and "whats  vegetarian" should share an entry
+    text = PUNCTUATION_RE.sub(' ', (text or '').lower().replace("'", ''))
+    return ' '.join(text.split())
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """LRU/TTL cache of LLM replies keyed on the normalized question.
+
+    With a `similarity_threshold` and an `embedder`, a question that misses
+    exactly can still hit an entry whose embedding is at least that similar
+    (close paraphrases). The cache subscribes to the menu snapshot, so any
+    menu change empties it.
+    """
+
+    def __init__(self, max_entries=500, ttl=600, similarity_threshold=None, embedder=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder if similarity_threshold else None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized question -> (reply, vector, stored_at)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, question):
+        if not self.enabled:
+            return None
+        key = normalize_question(question)
+        now = time.monotonic()
+        vector = self.embedder([key])[0] if self.embedder else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if vector is not None:
+                best_key, best_score = None, self.similarity_threshold
+                for other_key, (_, other_vector, stored_at) in self._entries.items():
+                    if now - stored_at >= self.ttl:
+                        continue
+                    score = _cosine(vector, other_vector)
+                    if score >= best_score:
+                        best_key, best_score = other_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.similar_hits += 1
+                    return self._entries[best_key][0]
+            self.misses += 1
+            return None
+
+    def put(self, question, reply):
+        if not self.enabled or not reply:
+            return
+        key = normalize_question(question)
+        vector = self.embedder([key])[0] if self.embedder else None
+        with self._lock:
+            self._entries[key] = (reply, vector, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def memory_estimate(self):
+        """Rough bytes held by cached replies and their keys."""
+        with self._lock:
+            return sum(len(key) + len(entry[0]) for key, entry in self._entries.items())
+
+    # Menu snapshot listener interface: any menu change invalidates every reply
+    def reset(self, items):
+        self.clear()
+
+    def upsert(self, item):
+        self.clear()
+
+    def remove(self, item_id):
+        self.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "similarHits": self.similar_hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+            }
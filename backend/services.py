@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import time
+
+from metrics import InstrumentedAsyncFirestore, InstrumentedFirestore
+
+logger = logging.getLogger(__name__)
+
+# Prompt for the recommendation chain
+RECOMMENDATION_TEMPLATE = """You are an AI food recommender chatbot for a restaurant.
+Your goal is to help the customer choose a food item from the provided menu.
+You should be friendly, engaging, and helpful.
+
+Menu:
+{menu_context}
+Current conversation:
+{history}
+Customer: {input}
+AI:
+"""
+
+
+class Services:
+    """External clients (Firebase, the LLM and its chain), created on first use.
+
+    Importing firebase_admin, LangChain and OpenAI takes seconds, so none of
+    them is imported until a request needs it or `warm()` runs in the
+    background after startup. `status()` reports which subsystems are ready.
+
+    Clients can be injected through the FIRESTORE_CLIENT and LLM config keys
+    (e.g. the fakes in fakes.py for tests and benchmarks).
+
+    `async_db` is only used by the ASGI app (asgi.py), so it is not one of
+    the SUBSYSTEMS readiness waits for.
+    """
+
+    SUBSYSTEMS = ('firebase', 'llm', 'chain')
+
+    def __init__(self, config, get_session_history):
+        self.config = config
+        self._get_session_history = get_session_history
+        self._lock = threading.RLock()
+        self._values = {}  # subsystem -> initialized value (None when unavailable)
+        self.timings = {}  # subsystem -> seconds spent initializing
+        self._warming = None
+
+    def _get(self, name, factory):
+        if name in self._values:
+            return self._values[name]
+        with self._lock:
+            if name not in self._values:
+                started = time.perf_counter()
+                try:
+                    self._values[name] = factory()
+                except Exception:
+                    logger.exception("Error initializing %s", name)
+                    self._values[name] = None
+                self.timings[name] = time.perf_counter() - started
+            return self._values[name]
+
+    @property
+    def firebase(self):
+        """`(firestore client, storage bucket)`, or `(None, None)` if Firebase is unavailable."""
+        return self._get('firebase', self._init_firebase) or (None, None)
+
+    @property
+    def db(self):
+        return self.firebase[0]
+
+    @property
+    def bucket(self):
+        return self.firebase[1]
+
+    @property
+    def async_db(self):
+        """Async Firestore client on the same Firebase app as `db`, or None."""
+        return self._get('firestore_async', self._init_async_firestore)
+
+    def ready(self, name):
+        """Whether `name` has been initialized, so using it won't block."""
+        return name in self._values
+
+    @property
+    def llm(self):
+        return self._get('llm', self._init_llm)
+
+    @property
+    def chain(self):
+        return self._get('chain', self._init_chain)
+
+    def _init_firebase(self):
+        if self.config.get('FIRESTORE_CLIENT') is not None:
+            return InstrumentedFirestore(self.config['FIRESTORE_CLIENT']), self.config.get('BUCKET')
+
+        import firebase_admin
+        from firebase_admin import credentials, firestore, storage
+
+        key_path = self.config['FIREBASE_KEY_PATH']
+        logger.info("Looking for service account key at: %s", os.path.abspath(key_path))
+        if not os.path.exists(key_path):
+            # For demo purposes, we'll continue without Firebase
+            logger.warning("Service account key not found. Firebase will not be initialized.")
+            return None
+
+        # Initialize Firebase with your service account key file
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred, {
+                'storageBucket': self.config['FIREBASE_STORAGE_BUCKET']
+            })
+
+        # Get Firestore and Storage clients; Firestore calls are timed for /metrics
+        db = InstrumentedFirestore(firestore.client())
+        bucket = storage.bucket()
+        logger.info("Firebase initialized successfully")
+        return db, bucket
+
+    def _init_async_firestore(self):
+        if self.config.get('FIRESTORE_CLIENT') is not None:
+            from fakes import FakeAsyncFirestore
+            return InstrumentedAsyncFirestore(FakeAsyncFirestore(self.config['FIRESTORE_CLIENT']))
+        if self.db is None:
+            return None
+        from firebase_admin import firestore_async
+        return InstrumentedAsyncFirestore(firestore_async.client())
+
+    def _init_llm(self):
+        if self.config.get('LLM') is not None:
+            return self.config['LLM']
+        if self.config['LLM_PROVIDER'] == 'fake':
+            # Canned, streaming replies for local development and tests (no API key needed)
+            from fakes import fake_llm
+            logger.info("Fake LLM initialized.")
+            return fake_llm()
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            logger.warning("OpenAI API key not set. LLM will not be initialized.")
+            return None
+        from langchain_openai import OpenAI
+        logger.info("OpenAI LLM initialized.")
+        # The gateway abandons slower calls anyway; this stops the client waiting on them
+        return OpenAI(openai_api_key=openai_api_key, temperature=0.7, timeout=self.config['LLM_TIMEOUT'])
+
+    def _init_chain(self):
+        llm = self.llm
+        if not llm:
+            logger.warning("RunnableWithMessageHistory not initialized due to missing LLM.")
+            return None
+
+        from langchain_core.messages import get_buffer_string
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.runnables import ConfigurableFieldSpec, RunnablePassthrough
+        from langchain_core.runnables.history import RunnableWithMessageHistory
+
+        prompt = PromptTemplate(input_variables=["history", "input", "menu_context"], template=RECOMMENDATION_TEMPLATE)
+
+        # Define the core runnable (prompt + llm); history messages are rendered as
+        # "Customer:/AI:" lines to match the prompt
+        runnable = (
+            RunnablePassthrough.assign(history=lambda x: get_buffer_string(x["history"], human_prefix="Customer", ai_prefix="AI"))
+            | prompt
+            | llm
+        )
+
+        # Wrap the runnable with message history capability. Histories are kept
+        # per restaurant, so callers pass `tenant_id` (None for the default) along
+        # with `session_id` in the config's "configurable" section.
+        chain = RunnableWithMessageHistory(
+            runnable,
+            self._get_session_history,
+            input_messages_key="input",
+            history_messages_key="history",
+            history_factory_config=[
+                ConfigurableFieldSpec(id="session_id", annotation=str, name="Session ID", default=""),
+                ConfigurableFieldSpec(id="tenant_id", annotation=str, name="Restaurant ID", default=None),
+            ],
+        )
+        logger.info("RunnableWithMessageHistory initialized.")
+        return chain
+
+    def warm(self, on_ready=None):
+        """Initialize every subsystem now; `on_ready()` runs afterwards."""
+        self.firebase
+        self.chain
+        if on_ready:
+            on_ready()
+
+    def warm_in_background(self, on_ready=None):
+        if self._warming is None:
+            self._warming = threading.Thread(target=self.warm, args=(on_ready,), name='services-warmup', daemon=True)
+            self._warming.start()
+        return self._warming
+
+    def status(self):
+        """Readiness of each subsystem: 'cold', 'ready' or 'unavailable', plus init time."""
+        result = {}
+        for name in self.SUBSYSTEMS:
+            if name not in self._values:
+                result[name] = {"status": "cold"}
+                continue
+            available = self._values[name] is not None
+            result[name] = {
+                "status": "ready" if available else "unavailable",
+                "seconds": round(self.timings.get(name, 0.0), 3),
+            }
+        return result
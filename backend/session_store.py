@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+# How often expired sessions are purged from the SQLite table
+PURGE_INTERVAL = 60
+
+
+def message_tokens(message):
+    # ~4 characters per token is close enough for budgeting
+    return len(message.content) // 4 + 1
+
+
+class WindowedChatHistory(BaseChatMessageHistory):
+    """Chat history that keeps only the most recent messages within a token budget."""
+
+    def __init__(self, session_id, store, messages=None, updated_at=0.0):
+        self.session_id = session_id
+        self.messages = list(messages or [])
+        self.updated_at = updated_at
+        self._store = store
+
+    def add_messages(self, messages):
+        with self._store.lock:
+            self.messages.extend(messages)
+            self._trim()
+            self.updated_at = time.time()
+            self._store.save(self)
+
+    def _trim(self):
+        budget = self._store.max_history_tokens
+        total = sum(message_tokens(message) for message in self.messages)
+        # Drop the oldest messages first, but always keep the latest exchange
+        while total > budget and len(self.messages) > 2:
+            total -= message_tokens(self.messages.pop(0))
+
+    def clear(self):
+        with self._store.lock:
+            self.messages = []
+            self.updated_at = time.time()
+            self._store.save(self)
+
+
+class SessionStore:
+    """Bounded store of per-session chat histories.
+
+    Sessions live in an LRU capped at `max_sessions` and expire after `ttl`
+    seconds of inactivity; each history is windowed to `max_history_tokens`.
+    With `db_path` set, histories are also written to SQLite so they survive
+    restarts and are shared by every worker process using the same file.
+    Stores of different restaurants share the file under their own `namespace`.
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600, max_history_tokens=1000, db_path=None, namespace=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history_tokens = max_history_tokens
+        self.db_path = db_path
+        self.namespace = namespace
+        self.lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self._last_purge = 0.0
+        if db_path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS chat_sessions '
+                    '(session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)'
+                )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _db_key(self, session_id):
+        # A session id sent to another restaurant's endpoints never finds this history
+        return f"{self.namespace}:{session_id}" if self.namespace else session_id
+
+    def _expired(self, updated_at, now):
+        return self.ttl > 0 and updated_at and now - updated_at > self.ttl
+
+    def get(self, session_id):
+        """Return the history for a session, creating an empty one if needed."""
+        now = time.time()
+        with self.lock:
+            history = self._sessions.get(session_id)
+            if history is not None and self._expired(history.updated_at, now):
+                history = None
+            if self.db_path:
+                history = self._refresh_from_db(session_id, history, now)
+            if history is None:
+                history = WindowedChatHistory(session_id, self)
+            self._sessions[session_id] = history
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return history
+
+    def peek(self, session_id):
+        """Return a session's messages without creating or touching it."""
+        with self.lock:
+            history = self._sessions.get(session_id)
+            return list(history.messages) if history is not None else []
+
+    def _refresh_from_db(self, session_id, history, now):
+        # Another worker may have written to this session since we cached it
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT messages, updated_at FROM chat_sessions WHERE session_id = ?', (self._db_key(session_id),)
+            ).fetchone()
+        self._purge_expired(now)
+        if row is None or self._expired(row[1], now):
+            return history
+        if history is None or row[1] > history.updated_at:
+            return WindowedChatHistory(session_id, self, messages_from_dict(json.loads(row[0])), row[1])
+        return history
+
+    def save(self, history):
+        if not self.db_path:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT INTO chat_sessions (session_id, messages, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(session_id) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at',
+                (self._db_key(history.session_id), json.dumps(messages_to_dict(history.messages)), history.updated_at),
+            )
+
+    def _purge_expired(self, now):
+        if self.ttl <= 0 or now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with closing(self._connect()) as conn, conn:
+            conn.execute('DELETE FROM chat_sessions WHERE updated_at < ?', (now - self.ttl,))
+
+    def memory_estimate(self):
+        """Rough bytes held by the in-memory histories (message text only)."""
+        with self.lock:
+            return sum(len(message.content) for history in self._sessions.values() for message in history.messages)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self._sessions),
+                "maxSessions": self.max_sessions,
+                "ttl": self.ttl,
+                "maxHistoryTokens": self.max_history_tokens,
+                "persistent": bool(self.db_path),
+            }
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+
+
+class FlightTimeout(TimeoutError):
+    """A caller gave up waiting for a call another request had in flight."""
+
+
+class FlightAbandoned(RuntimeError):
+    """The caller running a shared call stopped before producing a result."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+    def wait(self, timeout):
+        if not self.done.wait(timeout):
+            raise FlightTimeout(f"Shared call did not finish within {timeout:g}s")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for its result (or exception) instead of starting their own.
+    Nothing is cached: once the call returns, the next caller starts a new
+    one. Waiters give up after `timeout` seconds with FlightTimeout.
+
+    Coalescing is per process. Under a multi-worker server each worker runs
+    at most one call per key at a time, and a forked worker starts with no
+    calls in flight.
+    """
+
+    def __init__(self, timeout=60.0, enabled=True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call in flight
+        self.calls = 0  # calls actually made
+        self.shared = 0  # callers served by another caller's call
+        self.timeouts = 0
+
+    def _check_fork(self):
+        # Locks and calls copied into a forked worker belong to the parent's threads
+        if self._pid != os.getpid():
+            self._reset()
+
+    def join(self, key):
+        """Return `(call, leader)`. The leader must `finish()` the call; others `wait()` on it."""
+        self._check_fork()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.calls += 1
+            return call, True
+
+    def finish(self, key, call, value=None, error=None):
+        """Publish the leader's result (or exception) to every waiter."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.value, call.error = value, error
+        call.done.set()
+
+    def wait(self, call, timeout=None):
+        try:
+            return call.wait(self.timeout if timeout is None else timeout)
+        except FlightTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def do(self, key, fn, timeout=None):
+        """Return `(fn() result, shared)`; `shared` is True when another caller's call produced it."""
+        if not self.enabled:
+            return fn(), False
+        call, leader = self.join(key)
+        if not leader:
+            return self.wait(call, timeout), True
+        try:
+            value = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        except BaseException:
+            self.finish(key, call, error=FlightAbandoned("Shared call was interrupted"))
+            raise
+        self.finish(key, call, value=value)
+        return value, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "inFlight": len(self._calls),
+                "calls": self.calls,
+                "shared": self.shared,
+                "timeouts": self.timeouts,
+            }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines sharing one event loop (the ASGI app).
+
+    Same semantics and counters as SingleFlight, but waiters await the
+    leader's result instead of blocking a thread. A leader that is cancelled
+    (its client went away) fails the call for its waiters with FlightAbandoned.
+    """
+
+    def __init__(self, timeout=60.0, enabled=True):
+        self.timeout = timeout
+        self.enabled = enabled
+        self._calls = {}  # key -> asyncio.Future in flight
+        self.calls = 0
+        self.shared = 0
+        self.timeouts = 0
+
+    def join(self, key):
+        """Return `(future, leader)`. The leader must `finish()` the call; others `wait()` on it."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            return future, False
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; don't warn about an exception no one retrieved
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.calls += 1
+        return future, True
+
+    def finish(self, key, future, value=None, error=None):
+        """Publish the leader's result (or exception) to every waiter."""
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    async def wait(self, future, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # Shielded: a waiter timing out must not cancel the leader's result
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise FlightTimeout(f"Shared call did not finish within {timeout:g}s") from None
+
+    async def do(self, key, fn, timeout=None):
+        """Return `(await fn(), shared)`, like SingleFlight.do."""
+        if not self.enabled:
+            return await fn(), False
+        future, leader = self.join(key)
+        if not leader:
+            return await self.wait(future, timeout), True
+        try:
+            value = await fn()
+        except Exception as e:
+            self.finish(key, future, error=e)
+            raise
+        except BaseException:
+            self.finish(key, future, error=FlightAbandoned("Shared call was interrupted"))
+            raise
+        self.finish(key, future, value=value)
+        return value, False
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "inFlight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+        }
@@ -0,0 +1,220 @@
+import datetime
+import os
+import re
+import tempfile
+
+from itsdangerous import URLSafeTimedSerializer
+
+# Blob URLs change whenever their content does, so they can be cached forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Direct uploads are "<32 hex chars>.<ext>" until they are finalized into blobs
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}\.[a-z0-9]+$')
+STAGING_DIR = 'staging'
+
+# Uploads of each restaurant (tenant) live under "tenants/<id>/" below the uploads root
+TENANTS_DIR = 'tenants'
+
+
+# Mode of an ordinary new file. Read once at import, as os.umask() can only be
+# read by setting it.
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+def mkstemp(directory, prefix):
+    """tempfile.mkstemp for files renamed into the uploads folder.
+
+    mkstemp creates files 0600; they get the mode `open()` would give them,
+    so a static server or CDN origin reading the folder can serve them.
+    """
+    fd, path = tempfile.mkstemp(dir=directory, prefix=prefix)
+    if hasattr(os, 'fchmod'):  # not on Windows, where the mode doesn't apply anyway
+        os.fchmod(fd, FILE_MODE)
+    return fd, path
+
+
+def tenant_path(tenant_id):
+    """Key prefix of a tenant's uploads ('' for the default, untenanted namespace)."""
+    return f"{TENANTS_DIR}/{tenant_id}/" if tenant_id else ''
+
+
+def is_upload_id(upload_id):
+    return bool(upload_id) and UPLOAD_ID_RE.match(upload_id) is not None
+
+
+class UploadNotFound(LookupError):
+    """A direct upload that was never sent, has expired or was already finalized."""
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class LocalStorage:
+    """Blobs stay in the uploads folder and are served by this app's /uploads routes.
+
+    Direct uploads are sent to `PUT /api/uploads/direct/<token>` on this app,
+    where a signed token stands in for a bucket's signed URL, so clients use
+    the same sign/upload/finalize flow with either backend.
+
+    With `tenant_id`, `root` is that tenant's folder, its URLs are
+    `/uploads/tenants/<id>/...` and its direct uploads go through
+    `/api/<id>/uploads/direct/<token>`; tokens don't carry over between tenants.
+    """
+
+    remote = False
+
+    def __init__(self, root, base_url, signing_key, tenant_id=None):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+        self.tenant_id = tenant_id
+        self.staging = os.path.join(root, STAGING_DIR)
+        self._tokens = URLSafeTimedSerializer(signing_key, salt=f"direct-upload:{tenant_id or ''}")
+        os.makedirs(self.staging, exist_ok=True)
+
+    def url(self, key):
+        return f"{self.base_url}/uploads/{tenant_path(self.tenant_id)}{key}"
+
+    def publish(self, key, path, content_type=None):
+        pass  # already in place under the uploads folder
+
+    def unpublish(self, key):
+        pass
+
+    def fetch(self, key, path):
+        raise FileNotFoundError(key)
+
+    def sign_upload(self, upload_id, content_type, max_bytes, expires_in):
+        token = self._tokens.dumps({'id': upload_id, 'type': content_type, 'max': max_bytes})
+        api_root = f"/api/{self.tenant_id}" if self.tenant_id else "/api"
+        return {"url": f"{api_root}/uploads/direct/{token}", "method": "PUT", "headers": {"Content-Type": content_type}}
+
+    def verify_token(self, token, max_age):
+        """Claims of a token from `sign_upload`; raises itsdangerous.BadSignature if forged or expired."""
+        return self._tokens.loads(token, max_age=max_age)
+
+    def receive(self, upload_id, stream, max_bytes, chunk_size=1024 * 1024):
+        """Write a direct upload's body to the staging area; returns its size."""
+        size = 0
+        # Staged under the uploads folder, so it gets a blob's mode too
+        fd, tmp_path = mkstemp(self.staging, '.direct-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"Upload is larger than {max_bytes} bytes.")
+                    out.write(chunk)
+            os.replace(tmp_path, os.path.join(self.staging, upload_id))
+            return size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def staged_size(self, upload_id):
+        try:
+            return os.path.getsize(os.path.join(self.staging, upload_id))
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id) from None
+
+    def open_staged(self, upload_id):
+        try:
+            return open(os.path.join(self.staging, upload_id), 'rb')
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id) from None
+
+    def delete_staged(self, upload_id):
+        path = os.path.join(self.staging, upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class BucketStorage:
+    """Blobs are published to a Cloud Storage bucket and downloaded from it (or a CDN in front of it).
+
+    Objects live under `uploads/` with the same names as the local blobs and
+    `Cache-Control: immutable`, so asset URLs keep the `/uploads/<blob>` shape.
+    The local uploads folder becomes a cache for the asset pipeline; a
+    replica missing a blob fetches it from the bucket. Direct uploads are
+    signed V4 PUT URLs into `staging/`. Objects must be publicly readable,
+    or served through a CDN that can read them.
+
+    `get_bucket` returns a google-cloud-storage Bucket (or fakes.FakeBucket);
+    it is called on use, so Firebase is still initialized lazily.
+
+    With `tenant_id`, objects live under `uploads/tenants/<id>/` and direct
+    uploads are staged under `staging/tenants/<id>/`.
+    """
+
+    remote = True
+
+    def __init__(self, get_bucket, base_url=None, prefix='uploads', tenant_id=None):
+        self._get_bucket = get_bucket
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.prefix = f"{prefix}/{tenant_path(tenant_id)}".rstrip('/')
+        self.staging = f"{STAGING_DIR}/{tenant_path(tenant_id)}".rstrip('/')
+        self.tenant_id = tenant_id
+
+    @property
+    def bucket(self):
+        bucket = self._get_bucket()
+        if bucket is None:
+            raise RuntimeError("Storage bucket is not available.")
+        return bucket
+
+    def _object_name(self, key):
+        return f"{self.prefix}/{key}"
+
+    def url(self, key):
+        base = self.base_url or f"https://storage.googleapis.com/{self.bucket.name}"
+        return f"{base}/{self._object_name(key)}"
+
+    def publish(self, key, path, content_type=None):
+        blob = self.bucket.blob(self._object_name(key))
+        blob.cache_control = IMMUTABLE_CACHE_CONTROL
+        blob.upload_from_filename(path, content_type=content_type)
+
+    def unpublish(self, key):
+        """Delete an object and everything derived from it (`<key>/...`)."""
+        bucket = self.bucket
+        name = self._object_name(key)
+        blobs = [bucket.blob(name)] + list(bucket.list_blobs(prefix=f"{name}/"))
+        bucket.delete_blobs(blobs, on_error=lambda blob: None)
+
+    def fetch(self, key, path):
+        blob = self.bucket.get_blob(self._object_name(key))
+        if blob is None:
+            raise FileNotFoundError(key)
+        blob.download_to_filename(path)
+
+    def sign_upload(self, upload_id, content_type, max_bytes, expires_in):
+        # Storage itself rejects bodies outside the signed length range
+        headers = {"Content-Type": content_type, "x-goog-content-length-range": f"0,{max_bytes}"}
+        url = self.bucket.blob(f"{self.staging}/{upload_id}").generate_signed_url(
+            version='v4',
+            expiration=datetime.timedelta(seconds=expires_in),
+            method='PUT',
+            content_type=content_type,
+            headers={"x-goog-content-length-range": headers["x-goog-content-length-range"]},
+        )
+        return {"url": url, "method": "PUT", "headers": headers}
+
+    def _staged(self, upload_id):
+        blob = self.bucket.get_blob(f"{self.staging}/{upload_id}")
+        if blob is None:
+            raise UploadNotFound(upload_id)
+        return blob
+
+    def staged_size(self, upload_id):
+        return self._staged(upload_id).size
+
+    def open_staged(self, upload_id):
+        return self._staged(upload_id).open('rb')
+
+    def delete_staged(self, upload_id):
+        bucket = self.bucket
+        bucket.delete_blobs([bucket.blob(f"{self.staging}/{upload_id}")], on_error=lambda blob: None)
+
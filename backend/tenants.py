@@ -0,0 +1,194 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.routing import BaseConverter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Restaurant ids as they appear in URLs (/api/<id>/menu), Firestore paths and upload folders
+TENANT_ID_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+# First path segments of the untenanted API; a restaurant can't be named like one,
+# or /api/menu/... would be ambiguous
+RESERVED_TENANT_IDS = frozenset({
+    'bootstrap', 'cache', 'categories', 'menu', 'ready', 'recommend', 'subcategories', 'upload', 'uploads',
+})
+
+# How often (at most) the memory budget is checked against every tenant's caches
+BUDGET_CHECK_INTERVAL = 5.0
+
+# Restaurant ids recently looked up (found or not), and for how long the answer is trusted
+KNOWN_IDS_SIZE = 1024
+KNOWN_IDS_TTL = 60.0
+
+
+class UnknownTenant(LookupError):
+    """No restaurant is registered under the id."""
+
+
+def is_tenant_id(value):
+    return bool(value) and TENANT_ID_RE.match(value) is not None and value not in RESERVED_TENANT_IDS
+
+
+class TenantIdConverter(BaseConverter):
+    """URL converter for restaurant ids; reserved names fall through to the untenanted routes."""
+
+    regex = r'[a-z0-9][a-z0-9_-]{0,62}'
+
+    def to_python(self, value):
+        if value in RESERVED_TENANT_IDS:
+            raise ValidationError()
+        return value
+
+
+class TenantFirestore:
+    """A Firestore client scoped to one restaurant.
+
+    `collection(name)` is the `<root>/<tenant id>/<name>` subcollection, so
+    code written against the top-level `menu`/`categories`/`subcategories`
+    collections works unchanged. Everything else (batches, transactions)
+    goes to the client itself.
+    """
+
+    def __init__(self, client, root, tenant_id):
+        self._client = client
+        self._root = root
+        self.tenant_id = tenant_id
+
+    def collection(self, name):
+        return self._client.collection(self._root).document(self.tenant_id).collection(name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class TenantRegistry:
+    """Per-restaurant state, created on first use and evicted least recently used first.
+
+    At most `max_active` tenants are kept. With `memory_budget` (bytes) set,
+    tenants are also evicted, least recently used first, while the estimated
+    size of every tenant's caches is over budget. Only tenants idle for at
+    least `min_idle` seconds are evicted for memory, so a busy restaurant
+    can't push out the others' hot data; it is bounded by its own cache
+    limits instead. The default (untenanted) state is never evicted.
+
+    `factory(tenant_id)` builds a tenant's state; it must have `last_used`,
+    `memory_estimate()` and `close()`. With `exists(tenant_id)` given, state
+    is only created for ids it confirms, so requests for made-up ids can't
+    evict real restaurants; `get()` raises UnknownTenant for the others.
+    Answers are remembered for KNOWN_IDS_TTL seconds.
+    """
+
+    def __init__(self, factory, default, max_active=50, memory_budget=0, min_idle=60.0, exists=None):
+        self._factory = factory
+        self.default = default
+        self.max_active = max_active
+        self.memory_budget = memory_budget
+        self.min_idle = min_idle
+        self._exists = exists
+        self._lock = threading.Lock()
+        self._tenants = OrderedDict()  # tenant id -> state, least recently used first
+        self._known = OrderedDict()  # tenant id -> (exists, checked at), least recently checked first
+        self._last_check = 0.0
+        self._sizes = {}  # tenant id -> bytes, as of the last budget check
+        self.created = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def is_active(self, tenant_id):
+        """Whether the tenant's state exists, so `get()` won't look the id up."""
+        return not tenant_id or tenant_id in self._tenants
+
+    def _registered(self, tenant_id):
+        now = time.monotonic()
+        with self._lock:
+            known = self._known.get(tenant_id)
+        if known is not None and now - known[1] < KNOWN_IDS_TTL:
+            return known[0]
+        # Looked up outside the lock: this may be a Firestore read
+        exists = bool(self._exists(tenant_id))
+        with self._lock:
+            self._known.pop(tenant_id, None)
+            self._known[tenant_id] = (exists, now)
+            while len(self._known) > KNOWN_IDS_SIZE:
+                self._known.popitem(last=False)
+        return exists
+
+    def get(self, tenant_id=None):
+        if not tenant_id:
+            self.default.last_used = time.monotonic()
+            return self.default
+        if self._exists is not None and tenant_id not in self._tenants and not self._registered(tenant_id):
+            with self._lock:
+                self.rejected += 1
+            raise UnknownTenant(tenant_id)
+        evicted = []
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            created = tenant is None
+            if created:
+                tenant = self._tenants[tenant_id] = self._factory(tenant_id)
+                self.created += 1
+            self._tenants.move_to_end(tenant_id)
+            tenant.last_used = time.monotonic()
+            while len(self._tenants) > self.max_active:
+                evicted.append(self._evict(next(iter(self._tenants))))
+        self._close(evicted)
+        if self.memory_budget and (created or time.monotonic() - self._last_check >= BUDGET_CHECK_INTERVAL):
+            self.enforce_budget(keep=tenant_id)
+        return tenant
+
+    def active(self):
+        """`(tenant id, state)` pairs, the default first (its id is None)."""
+        with self._lock:
+            return [(None, self.default)] + list(self._tenants.items())
+
+    def _evict(self, tenant_id):
+        # Caller holds the lock
+        self.evictions += 1
+        self._sizes.pop(tenant_id, None)
+        return tenant_id, self._tenants.pop(tenant_id)
+
+    def _close(self, evicted):
+        for tenant_id, tenant in evicted:
+            logger.info("Evicting tenant", extra={"tenant": tenant_id})
+            try:
+                tenant.close()
+            except Exception:
+                logger.exception("Error closing tenant %s", tenant_id)
+
+    def enforce_budget(self, keep=None):
+        """Evict idle tenants, least recently used first, until the caches fit `memory_budget`."""
+        self._last_check = time.monotonic()
+        # Sizes are estimated outside the lock; they only need to be roughly current
+        sizes = {tenant_id: tenant.memory_estimate() for tenant_id, tenant in self.active()}
+        total = sum(sizes.values())
+        evicted = []
+        now = time.monotonic()
+        with self._lock:
+            self._sizes = sizes
+            for tenant_id, tenant in list(self._tenants.items()):
+                if total <= self.memory_budget:
+                    break
+                if tenant_id == keep or now - tenant.last_used < self.min_idle:
+                    continue
+                total -= sizes.get(tenant_id, 0)
+                evicted.append(self._evict(tenant_id))
+        self._close(evicted)
+        if total > self.memory_budget:
+            logger.warning("Tenant caches over memory budget", extra={"bytes": total, "budgetBytes": self.memory_budget})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": len(self._tenants),
+                "maxActive": self.max_active,
+                "memoryBudget": self.memory_budget,
+                "memory": {tenant_id or 'default': size for tenant_id, size in self._sizes.items()},
+                "created": self.created,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+            }
@@ -5,6 +5,13 @@ import os
 # Base URL for the API
 BASE_URL = "http://localhost:5000"
 
+def test_readiness():
+    """Test the GET /api/ready endpoint (503 until the background warm-up finishes)"""
+    response = requests.get(f"{BASE_URL}/api/ready")
+    print("GET /api/ready Response:", response.status_code)
+    print(json.dumps(response.json(), indent=2))
+    return response.json()
+
 def test_get_menu():
     """Test the GET /api/menu endpoint"""
     response = requests.get(f"{BASE_URL}/api/menu")
@@ -82,9 +89,33 @@ def test_upload_file(file_path):
     
     return response.json()
 
+def test_model_download(model_url):
+    """Test caching, precompression and Range support on GET /uploads/<filename>"""
+    response = requests.get(model_url, headers={"Accept-Encoding": "br, gzip"})
+    print(f"GET {model_url} Response: {response.status_code}")
+    for header in ("Content-Encoding", "ETag", "Cache-Control", "Vary"):
+        print(f"  {header}: {response.headers.get(header)}")
+
+    # A resumed download must get the identity bytes back as a 206
+    range_response = requests.get(model_url, headers={"Range": "bytes=0-1023"})
+    print(f"GET {model_url} (Range: bytes=0-1023) Response: {range_response.status_code}")
+    print(f"  Content-Range: {range_response.headers.get('Content-Range')}")
+    print(f"  Received {len(range_response.content)} bytes")
+
+    # Revalidation with the strong ETag should be a 304
+    etag = response.headers.get("ETag")
+    if etag:
+        conditional_response = requests.get(model_url, headers={"If-None-Match": etag, "Accept-Encoding": "br, gzip"})
+        print(f"GET {model_url} (If-None-Match) Response: {conditional_response.status_code}")
+
+    return range_response.status_code
+
 if __name__ == "__main__":
     print("Testing AR Food Menu API...")
     
+    # Test GET /api/ready
+    test_readiness()
+    
     # Test GET /api/menu
     menu_items = test_get_menu()
     
@@ -103,6 +134,10 @@ if __name__ == "__main__":
     if "item" in new_item and "id" in new_item["item"]:
         item_id = new_item["item"]["id"]
         
+        # Test serving of the uploaded model
+        if new_item["item"].get("modelUrl"):
+            test_model_download(new_item["item"]["modelUrl"])
+        
         # Test PUT /api/menu/<item_id>
         test_update_menu_item(
             item_id,
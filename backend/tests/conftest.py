@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+# Importing app builds the default app; keep it from starting Firebase in the background
+os.environ.setdefault('WARM_ON_START', '0')
+
+import app as backend  # noqa: E402
+from fakes import FakeFirestore, fake_llm  # noqa: E402
+
+
+@pytest.fixture
+def firestore():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def make_app(firestore, tmp_path):
+    """Build an app on the fake Firestore and LLM; keyword arguments override config."""
+    apps = []
+
+    def make(**config):
+        app = backend.create_app({
+            'FIRESTORE_CLIENT': firestore,
+            'LLM': fake_llm(),
+            'WARM_ON_START': False,
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'BLOB_INDEX_PATH': str(tmp_path / 'blob_index.sqlite3'),
+            'MENU_CHANGES_DB_PATH': str(tmp_path / 'menu_changes.sqlite3'),
+            'SESSION_DB_PATH': None,
+            'LOG_LEVEL': 'WARNING',
+            **config,
+        })
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.extensions['menuart'].asset_executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+@pytest.fixture
+def add_items(firestore):
+    """Write menu items straight to Firestore, as the console would."""
+    def add(*items):
+        for item in items:
+            firestore.collection('menu').document(item['id']).set(item)
+    return add
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import app as backend
+from asgi import AsgiApp
+
+
+@pytest.fixture
+def serve(make_app):
+    """Runs `scenario(client)` against the ASGI app, all requests on one event loop."""
+
+    def run(scenario, **config):
+        async def main():
+            transport = httpx.ASGITransport(app=AsgiApp(make_app(**config)))
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await scenario(client)
+        return asyncio.run(main())
+
+    return run
+
+
+def test_menu_is_served_natively_with_etags(serve, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+
+    async def scenario(client):
+        response = await client.get('/api/menu')
+        assert response.json() == [{'id': 'a', 'name': 'Burger'}]
+        assert response.headers['Cache-Control'] == 'private, no-cache'
+        assert response.headers['X-Menu-Revision'] == '0'
+        again = await client.get('/api/menu', headers={'If-None-Match': response.headers['ETag']})
+        assert again.status_code == 304
+
+    serve(scenario, READ_CACHE_CONTROL='private, no-cache')
+
+
+def test_other_routes_fall_through_to_flask(serve, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+
+    async def scenario(client):
+        found = (await client.get('/api/menu/search', params={'q': 'burger'})).json()
+        assert [item['id'] for item in found['items']] == ['a']
+        created = await client.post('/api/menu', data={'name': 'Fries'})
+        assert created.status_code == 200
+        assert len((await client.get('/api/menu')).json()) == 2
+
+    serve(scenario)
+
+
+def test_tenant_routes(serve, firestore):
+    firestore.collection('restaurants').document('bistro').set({'name': 'Bistro'})
+    firestore.collection('restaurants/bistro/menu').document('a').set({'name': 'Soup'})
+
+    async def scenario(client):
+        assert (await client.get('/api/bistro/menu')).json() == [{'id': 'a', 'name': 'Soup'}]
+        assert (await client.get('/api/nowhere/menu')).status_code == 404
+        assert (await client.post('/api/nowhere/recommend', json={'message': 'Hi'})).status_code == 404
+
+    serve(scenario)
+
+
+def test_recommendations_are_prepared_off_the_loop(serve, add_items, monkeypatch):
+    add_items({'id': 'a', 'name': 'Burger'})
+    prepare = backend.prepare_recommendation
+    threads = []
+
+    def recording(*args):
+        threads.append(threading.current_thread())
+        return prepare(*args)
+
+    monkeypatch.setattr(backend, 'prepare_recommendation', recording)
+
+    async def scenario(client):
+        # Warm snapshot and in-memory sessions: the case that used to run inline
+        await client.get('/api/menu')
+        reply = await client.post('/api/recommend', json={'message': 'Anything?'})
+        assert reply.status_code == 200 and reply.json()['response']
+        stream = await client.post('/api/recommend/stream', json={'message': 'Something else?'})
+        assert 'event: done' in stream.text
+
+    serve(scenario)
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+def test_bad_chat_requests(serve):
+    async def scenario(client):
+        assert (await client.post('/api/recommend', json={})).status_code == 400
+        assert (await client.post('/api/recommend', content=b'x' * (65 * 1024))).status_code == 413
+
+    serve(scenario)
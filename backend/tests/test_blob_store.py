@@ -0,0 +1,97 @@
+import gzip
+import io
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from werkzeug.datastructures import Accept
+
+import blob_store
+from blob_store import BlobStore
+from storage_backends import FILE_MODE
+
+MODEL = b'glTF' + b'\0' * 64 * 1024
+
+
+def accepts(*encodings):
+    return Accept([(encoding, 1) for encoding in encodings])
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path), str(tmp_path / 'index.sqlite3'))
+    first = store.put_stream(io.BytesIO(b'photo'), 'jpg')
+    assert store.put_stream(io.BytesIO(b'photo'), 'jpg') == first
+    store.retain(first)
+    store.retain(first)
+    store.release(first)
+    assert (tmp_path / first).exists()
+    store.release(first)
+    assert not (tmp_path / first).exists()
+
+
+def test_sidecars_are_built_off_the_upload_path(tmp_path):
+    store = BlobStore(str(tmp_path), str(tmp_path / 'index.sqlite3'))
+    scheduled = []
+    store.on_placed = scheduled.append
+    name = store.put_stream(io.BytesIO(MODEL), 'glb')
+
+    # Served uncompressed until the sidecars exist
+    assert scheduled == [name]
+    assert store.encoded_variant(name, accepts('br', 'gzip')) == (name, None)
+
+    store.write_sidecars(name)
+    assert store.encoded_variant(name, accepts('gzip')) == (name + '.gz', 'gzip')
+
+
+def test_sidecars_of_a_released_blob_are_dropped(tmp_path, monkeypatch):
+    store = BlobStore(str(tmp_path), str(tmp_path / 'index.sqlite3'))
+    store.on_placed = lambda name: None
+    name = store.put_stream(io.BytesIO(MODEL), 'glb')
+    store.retain(name)
+
+    class ReleasedWhileCompressing(gzip.GzipFile):
+        def close(self):
+            super().close()
+            store.release(name)
+
+    monkeypatch.setattr(blob_store, 'brotli', None)
+    monkeypatch.setattr(gzip, 'GzipFile', ReleasedWhileCompressing)
+    store.write_sidecars(name)
+    assert not list(tmp_path.glob(name + '*'))
+
+
+def test_stored_files_are_readable_by_other_users(tmp_path):
+    store = BlobStore(str(tmp_path), str(tmp_path / 'index.sqlite3'))
+    name = store.put_stream(io.BytesIO(MODEL), 'glb')
+    derived = store.write_derived(name, '320.webp', b'variant')
+    for path in (tmp_path / name, tmp_path / (name + '.gz'), derived):
+        assert os.stat(path).st_mode & 0o777 == FILE_MODE
+
+
+def test_blobs_nobody_references_are_swept_after_the_grace_period(tmp_path, monkeypatch):
+    clock = [time.time()]
+    monkeypatch.setattr(blob_store.time, 'time', lambda: clock[0])
+    store = BlobStore(str(tmp_path), str(tmp_path / 'index.sqlite3'))
+    kept = store.put_stream(io.BytesIO(b'attached'), 'jpg')
+    store.retain(kept)
+    orphan = store.put_stream(io.BytesIO(b'abandoned'), 'jpg')
+    legacy = store.put_stream(io.BytesIO(b'from before the index'), 'jpg')
+    with closing(sqlite3.connect(tmp_path / 'index.sqlite3')) as conn, conn:
+        conn.execute('DELETE FROM blob_stored WHERE name = ?', (legacy,))
+
+    # The legacy blob is dated by the first sweep that sees it
+    clock[0] += 30
+    assert store.sweep(60) == []
+    clock[0] += 31
+    assert store.sweep(60, dry_run=True) == [orphan]
+    assert store.sweep(60) == [orphan]
+    assert sorted(os.listdir(tmp_path)) == sorted([kept, legacy, 'derived', 'index.sqlite3'])
+
+    # Uploading it again restarts its grace period
+    assert store.put_stream(io.BytesIO(b'from before the index'), 'jpg') == legacy
+    clock[0] += 40
+    assert store.sweep(60) == []
+    clock[0] += 30
+    assert store.sweep(60) == [legacy]
+    assert (tmp_path / kept).exists()
@@ -0,0 +1,78 @@
+import os
+from urllib.parse import urlsplit
+
+import pytest
+
+from fakes import FakeBucket
+from storage_backends import FILE_MODE
+
+GLB = b'glTF' + b'\0' * 1020
+
+
+def sign(client, filename='dish.glb', **extra):
+    response = client.post('/api/uploads/sign', json={'filename': filename, **extra})
+    assert response.status_code == 200
+    return response.json
+
+
+def put(client, upload, data):
+    return client.put(urlsplit(upload['url']).path, data=data, headers=upload['headers'])
+
+
+def test_sign_put_finalize(make_app, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+    app = make_app()
+    client = app.test_client()
+    upload = sign(client)
+    assert put(client, upload, GLB).json == {'uploadId': upload['uploadId'], 'size': len(GLB)}
+    staged = os.path.join(app.config['UPLOAD_FOLDER'], 'staging', upload['uploadId'])
+    assert os.stat(staged).st_mode & 0o777 == FILE_MODE
+
+    result = client.post('/api/uploads/finalize', json={'uploadId': upload['uploadId'], 'itemId': 'a'}).json
+    assert result['item']['modelUrl'] == result['url']
+    assert client.get('/api/menu').json[0]['modelUrl'] == result['url']
+    assert not os.path.exists(staged)
+
+    # Finalized once only
+    assert client.post('/api/uploads/finalize', json={'uploadId': upload['uploadId']}).status_code == 404
+
+
+def test_tampered_or_expired_tokens_are_refused(make_app):
+    app = make_app()
+    client = app.test_client()
+    upload = sign(client)
+    path = urlsplit(upload['url']).path
+    tampered = path[:-1] + ('A' if path[-1] != 'A' else 'B')
+    assert client.put(tampered, data=GLB, headers=upload['headers']).status_code == 403
+
+    app.config['UPLOAD_URL_EXPIRY'] = -1
+    assert put(client, upload, GLB).status_code == 403
+
+
+def test_limits_are_enforced_when_signing_sending_and_finalizing(make_app):
+    client = make_app(MAX_MODEL_UPLOAD_BYTES=1024).test_client()
+    assert client.post('/api/uploads/sign', json={'filename': 'dish.glb', 'size': 4096}).status_code == 413
+    assert client.post('/api/uploads/sign', json={'filename': 'notes.txt'}).status_code == 400
+    assert put(client, sign(client), GLB + b'\0').status_code == 413
+
+    upload = sign(client)
+    put(client, upload, b'<html></html>')
+    assert client.post('/api/uploads/finalize', json={'uploadId': upload['uploadId']}).status_code == 415
+
+
+@pytest.fixture
+def bucket():
+    return FakeBucket()
+
+
+def test_bucket_uploads_skip_the_app(make_app, bucket):
+    client = make_app(STORAGE_BACKEND='bucket', BUCKET=bucket).test_client()
+    upload = sign(client, size=len(GLB))
+    assert upload['url'].startswith('https://storage.fake/')
+    with pytest.raises(PermissionError):
+        bucket.put_signed(upload['url'], GLB, {**upload['headers'], 'Content-Type': 'text/html'})
+    bucket.put_signed(upload['url'], GLB, upload['headers'])
+
+    result = client.post('/api/uploads/finalize', json={'uploadId': upload['uploadId']}).json
+    assert result['url'].startswith(f'https://storage.googleapis.com/{bucket.name}/uploads/')
+    assert not any(name.startswith('staging/') for name in bucket.objects)
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from firestore_mirror import CollectionMirror
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def reset(self, items):
+        self.calls.append(('reset', None if items is None else sorted(item['id'] for item in items)))
+
+    def upsert(self, item):
+        self.calls.append(('upsert', item['id']))
+
+    def remove(self, item_id):
+        self.calls.append(('remove', item_id))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def mirror(firestore):
+    menu = firestore.collection('menu')
+    menu.document('a').set({'name': 'Burger'})
+    mirror = CollectionMirror(menu, 'menu', check_interval=0.01)
+    yield mirror
+    mirror.stop()
+
+
+def test_changes_are_applied_as_they_arrive(mirror, firestore):
+    recorder = Recorder()
+    mirror.subscribe(recorder)
+    mirror.start()
+    wait_for(lambda: mirror.ready)
+
+    firestore.collection('menu').document('b').set({'name': 'Fries'})
+    firestore.collection('menu').document('a').delete()
+    assert recorder.calls == [('reset', ['a']), ('upsert', 'b'), ('remove', 'a')]
+    assert mirror.documents() == [{'id': 'b', 'name': 'Fries'}]
+
+
+def test_resubscribes_and_resyncs_after_the_stream_dies(mirror, firestore):
+    recorder = Recorder()
+    mirror.subscribe(recorder)
+    mirror.start()
+    wait_for(lambda: mirror.ready)
+
+    # The listen stream breaks; a change made meanwhile arrives with the resync
+    with firestore.lock:
+        firestore.drop_listeners()
+        firestore.collection('menu').document('b').set({'name': 'Fries'})
+    wait_for(lambda: mirror.reconnects == 1 and mirror.ready)
+    assert recorder.calls == [('reset', ['a']), ('reset', None), ('reset', ['a', 'b'])]
+
+    # And the new listener keeps the mirror current
+    firestore.collection('menu').document('a').update({'price': '9'})
+    assert mirror.stats()['documents'] == 2
+    assert {'id': 'a', 'name': 'Burger', 'price': '9'} in mirror.documents()
+
+
+def test_a_bad_snapshot_drops_the_mirror_until_the_next_one(mirror, firestore):
+    class Failing(Recorder):
+        def upsert(self, item):
+            raise RuntimeError("listener failed")
+
+    recorder = Failing()
+    mirror.subscribe(recorder)
+    mirror.start()
+    wait_for(lambda: mirror.ready)
+
+    firestore.collection('menu').document('b').set({'name': 'Fries'})
+    assert not mirror.ready and mirror.documents() is None
+    firestore.collection('menu').document('c').set({'name': 'Cola'})
+    assert mirror.ready
+    assert recorder.calls[-2:] == [('reset', None), ('reset', ['a', 'b', 'c'])]
@@ -0,0 +1,76 @@
+import io
+import struct
+import time
+
+from PIL import Image
+
+import app as backend
+from glb_optimizer import build_lods, read_glb, write_glb
+
+
+def triangle_glb(texture_size=None):
+    """A one-triangle GLB with normals and UVs, and optionally an embedded PNG texture."""
+    positions = struct.pack('<9f', 0, 0, 0, 1, 0, 0, 0, 1, 0)
+    normals = struct.pack('<9f', 0, 0, 1, 0, 0, 1, 0, 0, 1)
+    uvs = struct.pack('<6f', 0, 0, 1, 0, 0, 1)
+    views = [positions, normals, uvs]
+    gltf = {
+        'asset': {'version': '2.0'},
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126, 'count': 3, 'type': 'VEC3', 'min': [0, 0, 0], 'max': [1, 1, 0]},
+            {'bufferView': 1, 'componentType': 5126, 'count': 3, 'type': 'VEC3'},
+            {'bufferView': 2, 'componentType': 5126, 'count': 3, 'type': 'VEC2'},
+        ],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1, 'TEXCOORD_0': 2}}]}],
+        'nodes': [{'mesh': 0}],
+        'scenes': [{'nodes': [0]}],
+    }
+    if texture_size:
+        png = io.BytesIO()
+        Image.new('RGB', (texture_size, texture_size), 'red').save(png, 'PNG')
+        views.append(png.getvalue())
+        gltf['images'] = [{'bufferView': 3, 'mimeType': 'image/png'}]
+        gltf['textures'] = [{'source': 0}]
+    binary, gltf['bufferViews'] = b'', []
+    for data in views:
+        gltf['bufferViews'].append({'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(data)})
+        binary += data + b'\0' * (-len(data) % 4)
+    gltf['buffers'] = [{'byteLength': len(binary)}]
+    return write_glb(gltf, binary)
+
+
+def texture_size(model):
+    gltf, binary = read_glb(model)
+    view = gltf['bufferViews'][gltf['images'][0]['bufferView']]
+    data = binary[view.get('byteOffset', 0):view.get('byteOffset', 0) + view['byteLength']]
+    with Image.open(io.BytesIO(data)) as texture:
+        return texture.size
+
+
+def test_levels_cap_the_texture_size():
+    lods = build_lods(triangle_glb(texture_size=2048))
+    assert [texture_size(lods[level]) for level in ('low', 'medium', 'high')] == [(256, 256), (1024, 1024), (2048, 2048)]
+    gltf, _ = read_glb(lods['low'])
+    assert 'KHR_mesh_quantization' in gltf['extensionsRequired']
+
+
+def test_levels_that_would_repeat_a_higher_one_are_left_out():
+    assert list(build_lods(triangle_glb(texture_size=512))) == ['low', 'high']
+    assert list(build_lods(triangle_glb())) == ['high']
+
+
+def test_lods_are_recorded_on_the_item(make_app):
+    app = make_app()
+    client = app.test_client()
+    data = {'name': 'Cake', 'modelFile': (io.BytesIO(triangle_glb(texture_size=512)), 'cake.glb')}
+    client.post('/api/menu', data=data, content_type='multipart/form-data')
+
+    # Built on an asset worker
+    deadline = time.monotonic() + 5
+    while not (item := client.get('/api/menu').json[0]).get('modelLods') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(item['modelLods']) == ['high', 'low']
+    with app.app_context():
+        path = backend.blob_store.local_path(backend.blob_store.name_from_url(item['modelLods']['low']))
+    with open(path, 'rb') as f:
+        assert texture_size(f.read()) == (256, 256)
@@ -0,0 +1,75 @@
+import io
+import time
+from urllib.parse import urlsplit
+
+import pytest
+from PIL import Image
+
+import image_variants
+
+
+def jpeg(size, orientation=None):
+    image = Image.new('RGB', size, 'green')
+    exif = Image.Exif()
+    if orientation:
+        exif[image_variants._ORIENTATION_TAG] = orientation
+    out = io.BytesIO()
+    image.save(out, 'JPEG', exif=exif)
+    return out.getvalue()
+
+
+def test_sideways_photos_are_rotated(tmp_path):
+    # Stored landscape, shown portrait (EXIF orientation 6: rotate 90° clockwise)
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(jpeg((400, 200), orientation=6))
+    assert image_variants.image_width(path) == 200
+    with Image.open(io.BytesIO(image_variants.render_variant(path, 100, 'jpeg'))) as variant:
+        assert variant.size == (100, 200)
+
+
+def test_variants_are_never_wider_than_the_source():
+    assert image_variants.variant_widths(700, (320, 640, 1280)) == [320, 640, 700]
+    assert image_variants.variant_widths(2000, (320, 640, 1280)) == [320, 640, 1280]
+    assert image_variants.variant_widths(200, (320, 640)) == [200]
+
+
+def test_unreadable_images_raise_image_error(tmp_path):
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(b'\xff\xd8 not really a jpeg')
+    with pytest.raises(image_variants.ImageError):
+        image_variants.image_width(path)
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(IMAGE_WIDTHS=(320, 640), IMAGE_FORMATS=('jpeg',)).test_client()
+
+
+def test_photos_get_a_srcset_after_upload(client):
+    data = {'name': 'Cake', 'imageFile': (io.BytesIO(jpeg((700, 350))), 'cake.jpg')}
+    client.post('/api/menu', data=data, content_type='multipart/form-data')
+
+    # Rendered on an asset worker
+    deadline = time.monotonic() + 5
+    while not (item := client.get('/api/menu').json[0]).get('imageSrcset') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    url = item['imageUrl']
+    assert item['imageSrcset'] == {'jpeg': f"{url}/320.jpeg 320w, {url}/640.jpeg 640w"}
+
+    response = client.get(f"{url}/320.jpeg")
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control']
+    with Image.open(io.BytesIO(response.data)) as variant:
+        assert variant.size == (320, 160)
+
+
+def test_other_widths_are_rounded_and_capped(client):
+    url = client.post('/api/upload', data={'file': (io.BytesIO(jpeg((700, 350))), 'cake.jpg')},
+                      content_type='multipart/form-data').json['url']
+    url = urlsplit(url).path
+    response = client.get(f"{url}/100.jpeg")
+    assert response.status_code == 301 and response.location == f"{url}/128.jpeg"
+    assert client.get(f"{url}/5000.jpeg").location == f"{url}/700.jpeg"
+    with Image.open(io.BytesIO(client.get(f"{url}/128.jpeg").data)) as variant:
+        assert variant.size == (128, 64)
+    assert client.get(f"{url}/320.avif").status_code == 404
@@ -0,0 +1,65 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+GLB = b'glTF' + b'\0' * 60
+
+
+@pytest.fixture
+def app(make_app):
+    # Tiny per-file limits, so "large" files are a few hundred bytes
+    return make_app(MAX_IMAGE_UPLOAD_BYTES=256, MAX_MODEL_UPLOAD_BYTES=256, MAX_IMPORT_UPLOAD_BYTES=64 * 1024)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def test_json_import_reports_bad_rows(client):
+    rows = [{'name': 'Soup', 'price': '4'}, {'price': '3'}, 'not an item', {'id': 'fries', 'name': 'Fries'}]
+    result = client.post('/api/menu/import', json=rows).json
+    assert result['imported'] == 2 and result['failed'] == 2
+    assert [error['row'] for error in result['errors']] == [2, 3]
+    assert {item['name'] for item in client.get('/api/menu').json} == {'Soup', 'Fries'}
+    assert 'fries' in result['items']
+
+
+def test_rejects_anything_but_a_list(client):
+    assert client.post('/api/menu/import', json={'name': 'Soup'}).status_code == 400
+
+
+def test_import_files_get_the_import_limit(client):
+    # Far over the image limit that would apply to a .csv anywhere else
+    csv = 'name,price\n' + ''.join(f'Dish {n},{n}\n' for n in range(100))
+    assert len(csv) > 256
+    data = {'items': (io.BytesIO(csv.encode()), 'menu.csv')}
+    result = client.post('/api/menu/import', data=data, content_type='multipart/form-data').json
+    assert result['imported'] == 100
+
+    data = {'file': (io.BytesIO(csv.encode()), 'menu.csv')}
+    assert client.post('/api/upload', data=data, content_type='multipart/form-data').status_code == 413
+
+
+def test_archive_files_keep_their_own_limits(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('dish.glb', GLB)
+        zf.writestr('huge.glb', b'glTF' + b'\0' * 1024)
+    archive.seek(0)
+    rows = [{'name': 'Dish', 'modelFile': 'dish.glb'}, {'name': 'Huge', 'modelFile': 'huge.glb'},
+            {'name': 'Missing', 'modelFile': 'missing.glb'}]
+    data = {'items': (io.BytesIO(json.dumps(rows).encode()), 'items.json'), 'models': (archive, 'models.zip')}
+    result = client.post('/api/menu/import', data=data, content_type='multipart/form-data').json
+    assert result['imported'] == 1
+    assert [error['row'] for error in result['errors']] == [2, 3]
+    item = client.get('/api/menu').json[0]
+    assert item['name'] == 'Dish' and '/uploads/' in item['modelUrl']
+
+
+def test_asset_columns_need_an_archive(client):
+    result = client.post('/api/menu/import', json=[{'name': 'Dish', 'modelFile': 'dish.glb'}]).json
+    assert result['imported'] == 0
+    assert "archive" in result['errors'][0]['error']
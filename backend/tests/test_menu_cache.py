@@ -0,0 +1,64 @@
+import pytest
+
+import app as backend
+
+
+@pytest.mark.parametrize('mirror', [True, False])
+def test_items_are_keyed_by_document_id(make_app, firestore, mirror):
+    # Documents created in the console may lack an `id` field
+    firestore.collection('menu').document('soup').set({'name': 'Soup', 'price': '4'})
+    client = make_app(FIRESTORE_MIRROR=mirror).test_client()
+
+    items = client.get('/api/menu').json
+    assert [item['id'] for item in items] == ['soup']
+
+    assert client.put('/api/menu/soup', data={'price': '5'}).status_code == 200
+    assert client.get('/api/menu').json == [{'id': 'soup', 'name': 'Soup', 'price': '5'}]
+
+
+def test_writes_update_the_snapshot_without_rereading(make_app, firestore, add_items):
+    add_items({'id': 'a', 'name': 'Burger', 'price': '9'})
+    client = make_app(FIRESTORE_MIRROR=False).test_client()
+    assert len(client.get('/api/menu').json) == 1
+    reads = firestore.reads
+
+    created = client.post('/api/menu', data={'name': 'Fries', 'price': '3'}).json['item']
+    client.put('/api/menu/a', data={'price': '10'})
+    names = {item['name']: item for item in client.get('/api/menu').json}
+    assert set(names) == {'Burger', 'Fries'}
+    assert names['Burger']['price'] == '10'
+    assert names['Fries']['id'] == created['id']
+
+    client.delete(f"/api/menu/{created['id']}")
+    assert [item['name'] for item in client.get('/api/menu').json] == ['Burger']
+    assert firestore.reads == reads
+
+
+def test_unchanged_menu_answers_304(client, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+    etag = client.get('/api/menu').headers['ETag']
+    assert client.get('/api/menu', headers={'If-None-Match': etag}).status_code == 304
+
+    client.put('/api/menu/a', data={'price': '10'})
+    assert client.get('/api/menu', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_cache_control_comes_from_the_app_config(make_app):
+    client = make_app(READ_CACHE_CONTROL='public, max-age=60').test_client()
+    assert client.get('/api/menu').headers['Cache-Control'] == 'public, max-age=60'
+    assert client.get('/api/categories').headers['Cache-Control'] == 'public, max-age=60'
+
+
+@pytest.mark.parametrize('ttl', [0, 300])
+def test_menu_writes_drop_cached_replies(make_app, ttl):
+    # With MENU_CACHE_TTL=0 and no mirror the snapshot is always cold, and writes
+    # must still reach the response cache
+    app = make_app(MENU_CACHE_TTL=ttl, FIRESTORE_MIRROR=False)
+    client = app.test_client()
+    assert client.post('/api/recommend', json={'message': 'What do you recommend?'}).status_code == 200
+    with app.app_context():
+        assert backend.state().default.response_cache.stats()['entries'] == 1
+
+    assert client.post('/api/menu', data={'name': 'Soup', 'price': '3'}).status_code == 200
+    with app.app_context():
+        assert backend.state().default.response_cache.stats()['entries'] == 0
@@ -0,0 +1,98 @@
+from menu_changes import MenuChangeLog
+
+
+def sync_point(client):
+    response = client.get('/api/menu')
+    return response.headers['X-Menu-Epoch'], int(response.headers['X-Menu-Revision'])
+
+
+def changes(client, epoch, since):
+    return client.get('/api/menu/changes', query_string={'since': since, 'epoch': epoch}).json
+
+
+def test_writes_show_up_as_deltas(client, add_items):
+    add_items({'id': 'a', 'name': 'Burger'}, {'id': 'b', 'name': 'Fries'})
+    epoch, revision = sync_point(client)
+
+    client.put('/api/menu/a', data={'price': '10'})
+    client.delete('/api/menu/b')
+    delta = changes(client, epoch, revision)
+    assert delta['resync'] is False
+    assert delta['upserts'] == [{'id': 'a', 'name': 'Burger', 'price': '10'}]
+    assert delta['deletes'] == ['b']
+
+    assert changes(client, epoch, delta['revision']) == {
+        'epoch': epoch, 'revision': delta['revision'], 'resync': False, 'upserts': [], 'deletes': []}
+
+
+def test_edits_made_elsewhere_reach_the_log_through_the_mirror(client, firestore, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+    epoch, revision = sync_point(client)
+
+    firestore.collection('menu').document('a').update({'price': '12'})
+    delta = changes(client, epoch, revision)
+    assert [item['price'] for item in delta['upserts']] == ['12']
+
+
+def test_unknown_epoch_or_revision_resyncs(client, add_items):
+    add_items({'id': 'a', 'name': 'Burger'})
+    epoch, revision = sync_point(client)
+
+    assert changes(client, 'other', revision)['resync'] is True
+    assert changes(client, epoch, revision + 1)['resync'] is True
+    assert client.get('/api/menu/changes').status_code == 400
+
+
+def test_compacted_history_resyncs(tmp_path):
+    log = MenuChangeLog(str(tmp_path / 'changes.sqlite3'), max_entries=2)
+    log.reset([{'id': str(n)} for n in range(5)])
+    for n in range(5):
+        log.upsert({'id': str(n), 'price': n})
+    assert log.changes_since(0, log.epoch)['resync'] is True
+    assert [item['id'] for item in log.changes_since(3, log.epoch)['upserts']] == ['3', '4']
+
+
+def test_workers_share_the_log(make_app, add_items):
+    add_items({'id': 'a', 'name': 'Burger'}, {'id': 'b', 'name': 'Fries'})
+    first, second = make_app().test_client(), make_app().test_client()
+    epoch, revision = sync_point(first)
+    assert sync_point(second) == (epoch, revision)
+
+    # Both mirrors see the write; it is recorded once
+    first.put('/api/menu/a', data={'price': '10'})
+    first.delete('/api/menu/b')
+    delta = changes(second, epoch, revision)
+    assert delta['revision'] == revision + 2
+    assert delta['upserts'] == [{'id': 'a', 'name': 'Burger', 'price': '10'}]
+    assert delta['deletes'] == ['b']
+    assert sync_point(second) == (epoch, revision + 2)
+
+
+def test_revision_waits_for_the_worker_to_see_the_change(tmp_path):
+    path = str(tmp_path / 'changes.sqlite3')
+    first, second = MenuChangeLog(path), MenuChangeLog(path)
+    first.reset([{'id': 'a'}, {'id': 'b'}])
+    second.reset([{'id': 'a'}, {'id': 'b'}])
+
+    first.upsert({'id': 'a', 'price': 1})
+    first.remove('b')
+    assert first.revision == 2
+    # The second worker's snapshot lacks both changes, so it must not claim them
+    assert second.revision == 0
+    second.upsert({'id': 'a', 'price': 1})
+    assert second.revision == 1
+    second.remove('b')
+    assert second.revision == 2
+    assert second.changes_since(0, second.epoch)['revision'] == 2
+
+
+def test_changes_made_while_stopped_are_recorded_on_the_next_load(tmp_path):
+    path = str(tmp_path / 'changes.sqlite3')
+    log = MenuChangeLog(path)
+    log.reset([{'id': 'a'}, {'id': 'b'}])
+
+    restarted = MenuChangeLog(path)
+    restarted.reset([{'id': 'a', 'price': 1}])
+    assert restarted.epoch == log.epoch
+    delta = restarted.changes_since(0, log.epoch)
+    assert delta['upserts'] == [{'id': 'a', 'price': 1}] and delta['deletes'] == ['b']
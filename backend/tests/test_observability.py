@@ -0,0 +1,62 @@
+import logging
+import threading
+
+import fakes
+import observability
+
+
+class ProcessWideProfile:
+    """Stands in for cProfile.Profile on Python 3.12+, where only one can be enabled per process."""
+
+    active = None
+    lock = threading.Lock()
+
+    def enable(self):
+        with self.lock:
+            if ProcessWideProfile.active is not None:
+                raise ValueError("Another profiling tool is already active")
+            ProcessWideProfile.active = self
+
+    def disable(self):
+        with self.lock:
+            ProcessWideProfile.active = None
+
+    def dump_stats(self, path):
+        open(path, 'w').close()
+
+
+def test_overlapping_requests_are_profiled_one_at_a_time(make_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(observability.cProfile, 'Profile', ProcessWideProfile)
+    app = make_app(PROFILE_SLOW_REQUESTS_MS=0.001, PROFILE_DIR=str(tmp_path / 'profiles'))
+    client = app.test_client()
+
+    # The first request is still streaming (and profiled) while the second arrives
+    response = client.post('/api/recommend/stream', json={'message': 'Hi'}, buffered=False)
+    next(response.response)
+    assert ProcessWideProfile.active is not None
+    assert client.get('/api/categories').status_code == 200
+    response.close()
+
+    assert ProcessWideProfile.active is None
+    assert len(list((tmp_path / 'profiles').iterdir())) == 1
+    assert client.get('/api/categories').status_code == 200
+    assert len(list((tmp_path / 'profiles').iterdir())) == 2
+
+
+def test_request_id_is_echoed(client):
+    assert client.get('/api/menu', headers={'X-Request-Id': 'abc-123'}).headers['X-Request-Id'] == 'abc-123'
+    assert len(client.get('/api/menu', headers={'X-Request-Id': 'bad id!'}).headers['X-Request-Id']) == 32
+
+
+def test_write_failures_are_logged_not_leaked(client, add_items, monkeypatch, caplog):
+    add_items({'id': 'a', 'name': 'Burger'})
+
+    def fail(self):
+        raise RuntimeError("credentials for projects/secret expired")
+
+    monkeypatch.setattr(fakes.FakeDocumentReference, 'delete', fail)
+    with caplog.at_level(logging.ERROR):
+        response = client.delete('/api/menu/a')
+    assert response.status_code == 500
+    assert 'secret' not in response.get_data(as_text=True)
+    assert any(record.exc_info and 'secret' in str(record.exc_info[1]) for record in caplog.records)
@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+import app as backend
+import local_recommender
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_after_failures_and_recovers_after_a_trial():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()  # the half-open trial
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_gateway_sheds_calls_beyond_its_queue():
+    gateway = LLMGateway(max_concurrency=1, max_queue=0, queue_timeout=0.1)
+    started, release = threading.Event(), threading.Event()
+    running = threading.Thread(target=gateway.invoke, args=(lambda: started.set() or release.wait(),))
+    running.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(LLMUnavailable) as shed:
+            gateway.invoke(lambda: 'reply')
+        assert shed.value.reason == 'queue_full'
+    finally:
+        release.set()
+        running.join()
+    assert gateway.invoke(lambda: 'reply') == 'reply'
+
+
+def test_gateway_times_out_slow_calls():
+    gateway = LLMGateway(call_timeout=0.05, breaker=CircuitBreaker(failure_threshold=1))
+    release = threading.Event()
+    with pytest.raises(LLMUnavailable) as shed:
+        gateway.invoke(release.wait)
+    release.set()
+    assert shed.value.reason == 'timeout'
+    with pytest.raises(LLMUnavailable) as shed:
+        gateway.invoke(lambda: 'reply')
+    assert shed.value.reason == 'circuit_open'
+
+
+def test_open_breaker_answers_from_the_menu(make_app, add_items):
+    add_items(
+        {'id': '1', 'name': 'Pizza', 'price': '12', 'popularity': '4.5', 'tags': 'vegetarian, cheesy'},
+        {'id': '2', 'name': 'Burger', 'price': '10', 'popularity': 3},
+    )
+    app = make_app(LLM_BREAKER_FAILURES=1)
+    with app.app_context():
+        backend.state().llm_gateway.breaker.record_failure()
+
+    reply = app.test_client().post('/api/recommend', json={'message': 'Something vegetarian?'}).json
+    assert reply['fallback'] is True
+    assert 'Pizza' in reply['response']
+
+
+def test_stream_falls_back_too(make_app, add_items):
+    add_items({'id': '1', 'name': 'Pizza', 'price': '12'})
+    app = make_app(LLM_BREAKER_FAILURES=1)
+    with app.app_context():
+        backend.state().llm_gateway.breaker.record_failure()
+
+    body = app.test_client().post('/api/recommend/stream', json={'message': 'Anything?'}).get_data(as_text=True)
+    assert 'Pizza' in body
+    assert 'event: done' in body
+
+
+def test_prompt_limits_come_from_the_app_config(make_app, add_items):
+    add_items(*[{'id': str(n), 'name': f'Dish {n}'} for n in range(5)])
+    app = make_app(MENU_RETRIEVAL_MIN_ITEMS=2, MENU_RETRIEVAL_TOP_K=1, MENU_CONTEXT_MAX_TOKENS=20)
+    with app.test_request_context('/api/recommend'):
+        # Over the retrieval threshold: only the best match is listed
+        assert backend.select_menu_context('Dish 3', 'session-1').count('- Name:') == 1
+        # The token cap cuts the full listing short
+        assert backend.build_menu_context(backend.load_menu_items()).endswith('more items not listed.\n')
+
+
+MENU = [
+    {'id': '1', 'name': 'Salad', 'price': '$8', 'popularity': '2', 'tags': 'vegan, light'},
+    {'id': '2', 'name': 'Steak', 'price': '25', 'popularity': '9'},
+    {'id': '3', 'name': 'Burger', 'price': 10, 'popularity': 5, 'tags': ['beef']},
+]
+
+
+def names(question):
+    return [item['name'] for item in local_recommender.recommend_items(MENU, question)]
+
+
+def test_local_recommender_tolerates_string_fields():
+    assert names('what is popular?')[0] == 'Steak'
+    assert names('anything vegan?') == ['Salad']
+    assert names('something with beef') == ['Burger']
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('up to $10', ['Burger', 'Salad']),
+    ('max $10', ['Burger', 'Salad']),
+    ('under $10', ['Salad']),
+    ('at least $10', ['Steak', 'Burger']),
+])
+def test_local_recommender_price_bounds(question, expected):
+    assert names(question) == expected
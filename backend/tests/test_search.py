@@ -0,0 +1,42 @@
+import pytest
+
+MENU = [
+    {'id': '1', 'name': 'Chicken Burger', 'price': '11.5', 'category': 'Mains', 'subcategory': 'Burgers'},
+    {'id': '2', 'name': 'Veggie Burger', 'price': '9', 'category': 'Mains', 'subcategory': 'Burgers'},
+    {'id': '3', 'name': 'Margherita Pizza', 'price': '14', 'category': 'Mains', 'subcategory': 'Pizza',
+     'description': 'Tomato, mozzarella and basil'},
+    {'id': '4', 'name': 'Chocolate Cake', 'price': '6', 'category': 'Desserts'},
+]
+
+
+@pytest.fixture(params=[300, 0], ids=['cached', 'uncached'])
+def client(request, make_app, add_items):
+    add_items(*MENU)
+    return make_app(MENU_CACHE_TTL=request.param, FIRESTORE_MIRROR=False).test_client()
+
+
+def search(client, **params):
+    response = client.get('/api/menu/search', query_string=params)
+    assert response.status_code == 200
+    return [item['id'] for item in response.json['items']]
+
+
+def test_typos_and_prefixes_match(client):
+    assert search(client, q='chiken burg') == ['1']
+    assert search(client, q='mozarella') == ['3']
+    assert sorted(search(client, q='burger')) == ['1', '2']
+
+
+def test_filters(client):
+    assert search(client, q='burger', maxPrice=10) == ['2']
+    assert search(client, q='burger price<10') == ['2']
+    assert sorted(search(client, category='Mains', minPrice=10)) == ['1', '3']
+    assert search(client, subcategory='Pizza') == ['3']
+    assert len(search(client, limit=1)) == 1
+
+
+def test_menu_writes_are_searchable(client):
+    client.post('/api/menu', data={'id': '5', 'name': 'Fish Tacos', 'price': '12'})
+    client.delete('/api/menu/4')
+    assert search(client, q='tacos') == ['5']
+    assert search(client, q='cake') == []
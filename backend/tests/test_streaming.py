@@ -0,0 +1,51 @@
+import json
+import logging
+
+import app as backend
+from fakes import FAKE_LLM_RESPONSES, fake_llm
+
+SESSION = 'session-0001'
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def history(app):
+    with app.test_request_context('/api/recommend'):
+        return backend.session_store.peek(SESSION)
+
+
+def test_reply_is_streamed_token_by_token(make_app):
+    app = make_app()
+    response = app.test_client().post('/api/recommend/stream', json={'message': 'Anything?', 'sessionId': SESSION})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    events = parse_events(response.get_data(as_text=True))
+    assert events[0] == ('session', {'sessionId': SESSION})
+    assert events[-1] == ('done', {})
+    tokens = [payload['token'] for event, payload in events[1:-1]]
+    assert len(tokens) > 1 and ''.join(tokens) == FAKE_LLM_RESPONSES[0]
+    assert [message.content for message in history(app)] == ['Anything?', FAKE_LLM_RESPONSES[0]]
+
+
+def test_client_disconnect_stops_the_stream(make_app, caplog):
+    app = make_app(LLM=fake_llm(sleep=0.01))
+    response = app.test_client().post(
+        '/api/recommend/stream', json={'message': 'Anything?', 'sessionId': SESSION}, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'event: session')
+    assert next(chunks).startswith(b'event: token')
+
+    with caplog.at_level(logging.INFO):
+        response.close()
+    assert "Client disconnected" in caplog.text
+    # The partial reply is neither kept in the history nor cached
+    assert history(app) == []
+    replay = app.test_client().post('/api/recommend/stream', json={'message': 'Anything?'}).get_data(as_text=True)
+    assert len(parse_events(replay)) > 3
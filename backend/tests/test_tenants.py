@@ -0,0 +1,92 @@
+import pytest
+
+import app as backend
+import tenants
+from tenants import TenantRegistry
+
+
+def test_only_registered_restaurants_are_served(make_app, firestore):
+    firestore.collection('restaurants').document('bistro').set({'name': 'Bistro'})
+    firestore.collection('restaurants/bistro/menu').document('a').set({'name': 'Soup'})
+    app = make_app()
+    client = app.test_client()
+
+    assert client.get('/api/bistro/menu').json == [{'id': 'a', 'name': 'Soup'}]
+    assert client.get('/api/nowhere/menu').status_code == 404
+    assert client.post('/api/nowhere/menu', data={'name': 'Soup'}).status_code == 404
+    assert 'restaurants/nowhere/menu' not in firestore.collections
+    with app.app_context():
+        stats = backend.state().tenants.stats()
+    assert stats['rejected'] == 2
+
+
+def test_allowlist_limits_the_restaurants(make_app, firestore):
+    client = make_app(TENANTS=('bistro',)).test_client()
+    assert client.get('/api/bistro/menu').status_code == 200
+    assert client.get('/api/cafe/menu').status_code == 404
+    assert not any(name.startswith('restaurants/cafe/') for name in firestore.collections)
+
+
+class Tenant:
+    def __init__(self, tenant_id, size=100):
+        self.tenant_id = tenant_id
+        self.size = size
+        self.last_used = 0.0
+        self.closed = False
+
+    def memory_estimate(self):
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tenants.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_tenants_are_evicted_past_max_active(clock):
+    registry = TenantRegistry(Tenant, Tenant(None), max_active=2)
+    a = registry.get('a')
+    registry.get('b')
+    registry.get('a')
+    registry.get('c')
+    assert [tenant_id for tenant_id, _ in registry.active()] == [None, 'a', 'c']
+    assert not a.closed and registry.stats()['evictions'] == 1
+
+
+def test_idle_tenants_are_evicted_over_the_memory_budget(clock):
+    registry = TenantRegistry(Tenant, Tenant(None, size=50), memory_budget=300, min_idle=60)
+    a, b = registry.get('a'), registry.get('b')
+    # Over budget, but nobody has been idle long enough
+    c = registry.get('c')
+    assert not (a.closed or b.closed) and registry.stats()['memory']['c'] == 100
+
+    clock[0] += 61
+    registry.get('c')
+    # Only as many as needed, least recently used first; the default is never evicted
+    assert a.closed and not b.closed
+    assert [tenant_id for tenant_id, _ in registry.active()] == [None, 'b', 'c']
+
+    clock[0] += 61
+    c.size = 400
+    registry.enforce_budget(keep='c')
+    assert b.closed and not c.closed
+
+
+def test_evicted_restaurants_are_rebuilt_on_their_next_request(make_app, firestore):
+    for tenant_id in ('bistro', 'cafe'):
+        firestore.collection('restaurants').document(tenant_id).set({'name': tenant_id})
+        firestore.collection(f'restaurants/{tenant_id}/menu').document('a').set({'name': f'{tenant_id} soup'})
+    app = make_app(TENANT_MAX_ACTIVE=1)
+    client = app.test_client()
+
+    assert client.get('/api/bistro/menu').json[0]['name'] == 'bistro soup'
+    assert client.get('/api/cafe/menu').json[0]['name'] == 'cafe soup'
+    assert client.get('/api/bistro/menu').json[0]['name'] == 'bistro soup'
+    with app.app_context():
+        stats = backend.state().tenants.stats()
+    assert stats['active'] == 1 and stats['evictions'] == 2
@@ -0,0 +1,45 @@
+import io
+import os
+
+import pytest
+
+from storage_backends import FILE_MODE
+
+GLB = b'glTF' + b'\0' * 1020
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(MAX_MODEL_UPLOAD_BYTES=4096, MAX_IMAGE_UPLOAD_BYTES=1024)
+
+
+def upload(client, data, filename):
+    return client.post('/api/upload', data={'file': (io.BytesIO(data), filename)}, content_type='multipart/form-data')
+
+
+def leftovers(app):
+    return [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.startswith('.upload-')]
+
+
+def test_uploads_are_streamed_into_readable_blobs(app):
+    client = app.test_client()
+    response = upload(client, GLB, 'dish.glb')
+    assert response.status_code == 200
+    path = os.path.join(app.config['UPLOAD_FOLDER'], response.json['filename'])
+    assert os.stat(path).st_mode & 0o777 == FILE_MODE
+    assert upload(client, GLB, 'again.glb').json['filename'] == response.json['filename']
+    assert leftovers(app) == []
+
+
+def test_limits_depend_on_the_file_type(app):
+    client = app.test_client()
+    assert upload(client, GLB + b'\0' * 4096, 'dish.glb').status_code == 413
+    assert upload(client, b'\xff' * 2048, 'photo.jpg').status_code == 413
+    assert upload(client, GLB[:1000], 'photo.jpg').status_code == 200
+    assert leftovers(app) == []
+
+
+def test_mislabeled_models_are_rejected(app):
+    response = upload(app.test_client(), b'<html>' + b'\0' * 100, 'dish.glb')
+    assert response.status_code == 415
+    assert leftovers(app) == []
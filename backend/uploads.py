@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+import time
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+from storage_backends import mkstemp
+
+MODEL_EXTENSIONS = {'glb', 'gltf'}
+IMPORT_EXTENSIONS = {'zip', 'json', 'csv'}
+# Endpoints (blueprint-qualified) whose archives/item files get the (larger) import limit
+IMPORT_ENDPOINTS = {'api.import_menu_items'}
+GLB_MAGIC = b'glTF'
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+
+
+class UploadStats:
+    """Throughput counters for multipart file uploads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size, seconds):
+        with self._lock:
+            self.completed += 1
+            self.bytes += size
+            self.seconds += seconds
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "bytes": self.bytes,
+                "seconds": round(self.seconds, 3),
+                "bytesPerSecond": (self.bytes / self.seconds) if self.seconds else 0.0,
+            }
+
+
+upload_stats = UploadStats()
+
+
+class UploadSpool:
+    """Writable temp file that a multipart file part is streamed into.
+
+    Chunks are hashed and size-checked as the parser hands them over, so an
+    oversized or mislabeled upload is rejected after its first bytes rather
+    than after the whole body has been received. The blob store adopts the
+    finished file by renaming it into place; anything not adopted is deleted
+    when the request closes its files.
+    """
+
+    def __init__(self, directory, filename, limit):
+        # Adopted as a blob by renaming, so it gets a blob's mode
+        fd, self.path = mkstemp(directory, '.upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self.ext = file_extension(filename)
+        self.limit = limit
+        self.size = 0
+        self.adopted = False
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._started = time.perf_counter()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            self._reject()
+            raise RequestEntityTooLarge(f"'.{self.ext}' uploads are limited to {self.limit / (1024 * 1024):g} MB.")
+        if self.ext == 'glb' and len(self._head) < len(GLB_MAGIC):
+            self._head += data[:len(GLB_MAGIC) - len(self._head)]
+            if not GLB_MAGIC.startswith(self._head):
+                self._reject()
+                raise UnsupportedMediaType("File is not a binary glTF (.glb) model.")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def _reject(self):
+        # The parser drops this part when write() raises, so nobody else will close it
+        upload_stats.reject()
+        self.close()
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def finish(self):
+        """Flush the spooled body to disk and record the transfer."""
+        if self.ext == 'glb' and self._head != GLB_MAGIC:
+            upload_stats.reject()
+            raise UnsupportedMediaType("File is not a binary glTF (.glb) model.")
+        self._file.flush()
+        upload_stats.record(self.size, time.perf_counter() - self._started)
+
+    def close(self):
+        self._file.close()
+        if not self.adopted and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read/seek/tell/readline etc. go to the underlying file
+        return getattr(self._file, name)
+
+
+class StreamingUploadRequest(Request):
+    """Request class that streams file parts to disk with per-type size limits.
+
+    Limits come from the MAX_MODEL_UPLOAD_BYTES / MAX_IMAGE_UPLOAD_BYTES app
+    config keys (MAX_IMPORT_UPLOAD_BYTES for bulk import files);
+    MAX_CONTENT_LENGTH should cover the largest request so that oversized
+    requests are refused from their Content-Length before any body is read.
+    """
+
+    # Plain (non-file) form fields are small; don't let them buffer megabytes
+    max_form_memory_size = 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        ext = file_extension(filename)
+        if ext in IMPORT_EXTENSIONS and self.endpoint in IMPORT_ENDPOINTS:
+            limit = config['MAX_IMPORT_UPLOAD_BYTES']
+        elif ext in MODEL_EXTENSIONS:
+            limit = config['MAX_MODEL_UPLOAD_BYTES']
+        else:
+            limit = config['MAX_IMAGE_UPLOAD_BYTES']
+        if content_length is not None and content_length > limit:
+            upload_stats.reject()
+            raise RequestEntityTooLarge()
+        return UploadSpool(config['UPLOAD_FOLDER'], filename, limit)
@@ -11,24 +11,172 @@ export interface FoodItem {
   category: string;
   subcategory: string;
   imageUrl?: string;
+  // Optimized variants built by the backend after upload, smallest first
+  modelLods?: { low?: string; medium?: string; high?: string };
+  // Resized copies of imageUrl: a srcset string per format (avif, webp, jpeg)
+  imageSrcset?: Record<string, string>;
 }
 
+// localStorage key for the last menu payload, its ETag and sync revision
+const MENU_SNAPSHOT_KEY = "menuSnapshot";
+
+interface MenuSnapshot {
+  etag: string;
+  items: FoodItem[];
+  // Change-log position of the backend process the items came from
+  epoch?: string;
+  revision?: number;
+}
+
+interface MenuChanges {
+  epoch: string;
+  revision: number;
+  resync: boolean;
+  upserts?: FoodItem[];
+  deletes?: Array<string | number>;
+}
+
+const readMenuSnapshot = (): MenuSnapshot | null => {
+  const stored = localStorage.getItem(MENU_SNAPSHOT_KEY);
+  return stored ? JSON.parse(stored) : null;
+};
+
+const writeMenuSnapshot = (snapshot: MenuSnapshot) => {
+  localStorage.setItem(MENU_SNAPSHOT_KEY, JSON.stringify(snapshot));
+};
+
+// Bring a stored snapshot up to date from the backend change log. Returns null
+// when the backend can't describe the gap and the full menu must be fetched.
+const syncMenuSnapshot = async (
+  snapshot: MenuSnapshot
+): Promise<FoodItem[] | null> => {
+  if (!snapshot.epoch || snapshot.revision === undefined) {
+    return null;
+  }
+  const params = new URLSearchParams({
+    since: String(snapshot.revision),
+    epoch: snapshot.epoch,
+  });
+  const response = await fetch(`${API_URL}/menu/changes?${params}`);
+  if (!response.ok) {
+    return null;
+  }
+  const changes: MenuChanges = await response.json();
+  if (changes.resync) {
+    return null;
+  }
+  const changed = new Set([
+    ...(changes.upserts || []).map((item) => String(item.id)),
+    ...(changes.deletes || []).map(String),
+  ]);
+  const updates = new Map(
+    (changes.upserts || []).map((item) => [String(item.id), item])
+  );
+  // Keep the stored order, replacing changed items in place and appending new ones
+  const items = snapshot.items
+    .filter((item) => !changed.has(String(item.id)) || updates.has(String(item.id)))
+    .map((item) => updates.get(String(item.id)) || item);
+  const known = new Set(snapshot.items.map((item) => String(item.id)));
+  items.push(...(changes.upserts || []).filter((item) => !known.has(String(item.id))));
+  // The ETag described the old items, so drop it
+  writeMenuSnapshot({
+    etag: "",
+    items,
+    epoch: changes.epoch,
+    revision: changes.revision,
+  });
+  return items;
+};
+
 // Get all menu items
 export const getMenuItems = async (): Promise<FoodItem[]> => {
+  const snapshot = readMenuSnapshot();
   try {
-    const response = await fetch(`${API_URL}/menu`);
+    // Returning visitors only download what changed since their last visit
+    const synced = snapshot ? await syncMenuSnapshot(snapshot) : null;
+    if (synced) {
+      return synced;
+    }
+    // Otherwise revalidate the stored copy; the backend answers 304 when nothing changed
+    const headers: HeadersInit = snapshot?.etag
+      ? { "If-None-Match": snapshot.etag }
+      : {};
+    const response = await fetch(`${API_URL}/menu`, { headers });
+    const epoch = response.headers.get("X-Menu-Epoch") || undefined;
+    const revisionHeader = response.headers.get("X-Menu-Revision");
+    const revision = revisionHeader ? Number(revisionHeader) : undefined;
+    if (response.status === 304 && snapshot) {
+      writeMenuSnapshot({ ...snapshot, epoch, revision });
+      return snapshot.items;
+    }
     if (!response.ok) {
       throw new Error("Failed to fetch menu items");
     }
-    return await response.json();
+    const items: FoodItem[] = await response.json();
+    const etag = response.headers.get("ETag");
+    if (etag) {
+      writeMenuSnapshot({ etag, items, epoch, revision });
+    }
+    return items;
   } catch (error) {
     console.error("Error fetching menu items:", error);
     // Fallback to localStorage if API fails
+    if (snapshot) {
+      return snapshot.items;
+    }
     const storedItems = localStorage.getItem("foodItems");
     return storedItems ? JSON.parse(storedItems) : [];
   }
 };
 
+interface SignedUpload {
+  uploadId: string;
+  url: string;
+  method: string;
+  headers: Record<string, string>;
+}
+
+// Send a file straight to storage with a signed URL, then attach it to a menu
+// item (its model for .glb/.gltf files, its photo otherwise)
+export const uploadAssetDirect = async (
+  file: File,
+  itemId: string | number
+): Promise<FoodItem> => {
+  const signResponse = await fetch(`${API_URL}/uploads/sign`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      filename: file.name,
+      contentType: file.type || undefined,
+      size: file.size,
+    }),
+  });
+  if (!signResponse.ok) {
+    throw new Error("Failed to start upload");
+  }
+  const upload: SignedUpload = await signResponse.json();
+
+  const uploadResponse = await fetch(upload.url, {
+    method: upload.method,
+    headers: upload.headers,
+    body: file,
+  });
+  if (!uploadResponse.ok) {
+    throw new Error("Failed to upload file");
+  }
+
+  const finalizeResponse = await fetch(`${API_URL}/uploads/finalize`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ uploadId: upload.uploadId, itemId }),
+  });
+  if (!finalizeResponse.ok) {
+    throw new Error("Failed to attach uploaded file");
+  }
+  const result = await finalizeResponse.json();
+  return result.item;
+};
+
 // Add a new menu item
 export const addMenuItem = async (
   item: Partial<FoodItem>,
@@ -42,11 +190,6 @@ export const addMenuItem = async (
       formData.append(key, value?.toString() || "");
     });
 
-    // Add model file if provided
-    if (modelFile) {
-      formData.append("modelFile", modelFile);
-    }
-
     const response = await fetch(`${API_URL}/menu`, {
       method: "POST",
       body: formData,
@@ -57,6 +200,10 @@ export const addMenuItem = async (
     }
 
     const result = await response.json();
+    // The model goes straight to storage rather than through the API
+    if (modelFile) {
+      return { ...result.item, ...(await uploadAssetDirect(modelFile, result.item.id)) };
+    }
     return result.item;
   } catch (error) {
     console.error("Error adding menu item:", error);
@@ -78,11 +225,6 @@ export const updateMenuItem = async (
       formData.append(key, value?.toString() || "");
     });
 
-    // Add model file if provided
-    if (modelFile) {
-      formData.append("modelFile", modelFile);
-    }
-
     const response = await fetch(`${API_URL}/menu/${id}`, {
       method: "PUT",
       body: formData,
@@ -93,6 +235,9 @@ export const updateMenuItem = async (
     }
 
     const result = await response.json();
+    if (modelFile) {
+      return { ...result.item, ...(await uploadAssetDirect(modelFile, id)) };
+    }
     return result.item;
   } catch (error) {
     console.error("Error updating menu item:", error);
@@ -139,6 +284,42 @@ export const uploadFile = async (file: File): Promise<string> => {
   }
 };
 
+export interface MenuBootstrap {
+  items: Partial<FoodItem>[];
+  nextCursor: string | null;
+  // Only on the first page (no cursor)
+  categories?: string[];
+  subcategories?: { [key: string]: string[] };
+  epoch?: string;
+  revision?: number;
+}
+
+export interface MenuBootstrapOptions {
+  // Item fields to return (id is always included), e.g. ["name", "price"]
+  fields?: (keyof FoodItem)[];
+  category?: string;
+  subcategory?: string;
+  limit?: number;
+  cursor?: string;
+}
+
+// Fetch menu items, categories and subcategories in a single request
+export const getMenuBootstrap = async (
+  options: MenuBootstrapOptions = {}
+): Promise<MenuBootstrap> => {
+  const params = new URLSearchParams();
+  if (options.fields?.length) params.set("fields", options.fields.join(","));
+  if (options.category) params.set("category", options.category);
+  if (options.subcategory) params.set("subcategory", options.subcategory);
+  if (options.limit) params.set("limit", String(options.limit));
+  if (options.cursor) params.set("cursor", options.cursor);
+  const response = await fetch(`${API_URL}/bootstrap?${params}`);
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+  return response.json();
+};
+
 // Fetch all categories
 export const getCategories = async (): Promise<string[]> => {
   const response = await fetch(`${API_URL}/categories`);
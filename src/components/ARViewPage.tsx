@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useContext } from "react";
+import React, { useEffect, useState, useContext, useRef } from "react";
 import { useParams, Link } from "react-router-dom";
 import { FoodItemsContext } from "./AdminPanel";
 import Navigation from "./Navigation";
@@ -13,9 +13,30 @@ const ARViewPage: React.FC = () => {
   const foodItem = foodItems.find((item) => item.id.toString() === id);
 
   // Determine the correct model URL based on whether it's a relative path
-  const modelSourceUrl = foodItem?.modelUrl.startsWith("/uploads")
-    ? `http://localhost:5000${foodItem.modelUrl}`
-    : foodItem?.modelUrl;
+  const resolveModelUrl = (url?: string) =>
+    url?.startsWith("/uploads") ? `http://localhost:5000${url}` : url;
+  const fullModelUrl = resolveModelUrl(
+    foodItem?.modelLods?.high ?? foodItem?.modelUrl
+  );
+  const previewModelUrl = resolveModelUrl(foodItem?.modelLods?.low);
+
+  // Show the low-detail LOD first, then swap in the full model once it's on screen
+  const modelViewerRef = useRef<HTMLElement>(null);
+  const [modelSourceUrl, setModelSourceUrl] = useState<string | undefined>();
+
+  useEffect(() => {
+    setModelSourceUrl(previewModelUrl ?? fullModelUrl);
+  }, [previewModelUrl, fullModelUrl]);
+
+  useEffect(() => {
+    const modelViewer = modelViewerRef.current;
+    if (!modelViewer || !fullModelUrl || modelSourceUrl === fullModelUrl) {
+      return;
+    }
+    const handleLoad = () => setModelSourceUrl(fullModelUrl);
+    modelViewer.addEventListener("load", handleLoad);
+    return () => modelViewer.removeEventListener("load", handleLoad);
+  }, [modelViewerLoaded, modelSourceUrl, fullModelUrl]);
 
   // Find related items (same category)
   const relatedItems = foodItems
@@ -122,6 +143,7 @@ const ARViewPage: React.FC = () => {
               <div className="h-96 bg-black flex items-center justify-center">
                 {modelViewerLoaded ? (
                   <model-viewer
+                    ref={modelViewerRef}
                     src={modelSourceUrl}
                     alt={foodItem.name}
                     auto-rotate
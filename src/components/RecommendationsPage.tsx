@@ -6,6 +6,9 @@ interface Message {
   text: string;
 }
 
+// The backend keys conversation history by this id
+const CHAT_SESSION_KEY = "chatSessionId";
+
 const RecommendationsPage: React.FC = () => {
   const [messages, setMessages] = useState<Message[]>([
     {
@@ -24,29 +27,74 @@ const RecommendationsPage: React.FC = () => {
     setInputText("");
     setIsLoading(true);
 
-    try {
-      const response = await fetch("http://localhost:5000/api/recommend", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ message: newUserMessage.text }),
+    // Append streamed text to the AI message at the end of the chat
+    const appendToReply = (token: string) =>
+      setMessages((prevMessages) => {
+        const last = prevMessages[prevMessages.length - 1];
+        return [...prevMessages.slice(0, -1), { ...last, text: last.text + token }];
       });
 
-      if (!response.ok) {
+    let replyStarted = false;
+    try {
+      const response = await fetch(
+        "http://localhost:5000/api/recommend/stream",
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({
+            message: newUserMessage.text,
+            sessionId: localStorage.getItem(CHAT_SESSION_KEY) ?? undefined,
+          }),
+        }
+      );
+
+      if (!response.ok || !response.body) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const data = await response.json();
-      const aiResponse: Message = { sender: "ai", text: data.response };
-      setMessages((prevMessages) => [...prevMessages, aiResponse]);
+      // Read Server-Sent Events ("event: ...\ndata: {...}\n\n") as they arrive
+      setMessages((prevMessages) => [...prevMessages, { sender: "ai", text: "" }]);
+      replyStarted = true;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const rawEvent of events) {
+          const fields = Object.fromEntries(
+            rawEvent.split("\n").map((line) => {
+              const separator = line.indexOf(": ");
+              return [line.slice(0, separator), line.slice(separator + 2)];
+            })
+          );
+          const data = fields.data ? JSON.parse(fields.data) : {};
+          if (fields.event === "session") {
+            localStorage.setItem(CHAT_SESSION_KEY, data.sessionId);
+          } else if (fields.event === "token") {
+            appendToReply(data.token);
+          } else if (fields.event === "error") {
+            throw new Error(data.error);
+          }
+        }
+      }
     } catch (error) {
       console.error("Error sending message to backend:", error);
       const errorMessage: Message = {
         sender: "ai",
         text: "Sorry, something went wrong. Please try again.",
       };
-      setMessages((prevMessages) => [...prevMessages, errorMessage]);
+      setMessages((prevMessages) =>
+        // Replace the partial reply, if one was started
+        replyStarted
+          ? [...prevMessages.slice(0, -1), errorMessage]
+          : [...prevMessages, errorMessage]
+      );
     } finally {
       setIsLoading(false);
     }